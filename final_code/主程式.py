@@ -1,47 +1,88 @@
-from 計算蒸氣壓 import calculate_vapor_pressure
-from 計算比濕度 import calculate_specific_humidity
-from 計算可降水量 import calculate_precipitable_water
+import os
+import re
+import sys
+
+if __name__ == "__main__":
+    # 直接執行時才把上層目錄 (核心引擎使用的 pw_module 所在) 加入模組搜尋路徑
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from 核心引擎 import PWInput, compute_precipitable_water, stream_precipitable_water  # noqa: E402
+
+_TOKEN = re.compile(r"\S+")
+
+
+def iter_points(line):
+    """
+    逐一產生 "p1,c1 p2,c2 ..." 格式中的 (p, c)，不另外建立列表。
+    """
+    for match in _TOKEN.finditer(line):
+        p, c = map(float, match.group().split(","))
+        yield p, c
+
+
+def compute_line(line, h1=None, h2=None):
+    """
+    計算一行 "p1,c1 p2,c2 ..." 資料的可降水量；各層依序串流進核心引擎，
+    查表、比濕度與積分在同一次走訪中完成。h1, h2 省略時積分整條剖面。
+    壓力不是單調排列時改為排序後計算 (與互動模式相同)；資料不足 2 筆或格式錯誤時丟出 ValueError。
+    """
+    try:
+        _, W_p = stream_precipitable_water(iter_points(line), h1, h2)
+        return W_p
+    except ValueError:
+        data_points = list(iter_points(line))
+        if len(data_points) < 2:
+            raise
+    if h1 is None or h2 is None:
+        pressures = [p for p, _ in data_points]
+        h1, h2 = max(pressures), min(pressures)
+    return compute_precipitable_water(PWInput(data_points, h1, h2), detail=False).W_p
+
+
+def run_file(path, h1=None, h2=None):
+    """
+    非互動模式：逐行讀取檔案，每行一條剖面 (格式同互動輸入)，算完立即輸出 W_p。
+    無法計算的行輸出錯誤訊息後繼續處理下一行。
+    """
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            try:
+                W_p = compute_line(line, h1, h2)
+            except ValueError as exc:
+                print(f"{lineno}\t錯誤：{exc}", flush=True)
+                continue
+            print(f"{lineno}\t{W_p:.2f}", flush=True)
+
 
 # 主程式
 def main():
     # Step 1: 輸入壓力和溫度數據
     print("請輸入壓力 p 和對應溫度 c (格式: p1,c1 p2,c2 ...)，以空格分隔:")
     input_data = input()
-    data_points = input_data.split()
-    
-    pressures = []
-    temperatures = []
-    
-    for point in data_points:
-        p, c = map(float, point.split(","))
-        pressures.append(p)
-        temperatures.append(c)
-    
-    # 計算蒸氣壓
-    vapor_pressures = calculate_vapor_pressure(pressures, temperatures)
-    
-    # 計算比濕度
-    specific_humidity = calculate_specific_humidity(vapor_pressures, pressures)
-    
-    # 計算壓力差
-    pressure_differences = [abs(pressures[i] - pressures[i + 1]) for i in range(len(pressures) - 1)]
-    
-    # 計算平均比濕度
-    average_specific_humidity = [(specific_humidity[i] + specific_humidity[i + 1]) / 2 for i in range(len(specific_humidity) - 1)]
-    
-    # 計算可降水量
-    precipitable_water = calculate_precipitable_water(pressure_differences, average_specific_humidity)
-    
+    data_points = list(iter_points(input_data))
+    pressures = [p for p, _ in data_points]
+
+    # Step 2: 以核心引擎計算 (積分範圍為整條剖面；沒有資料時與原本相同，輸出 W_p = 0)
+    h1, h2 = (max(pressures), min(pressures)) if pressures else (0.0, 0.0)
+    result = compute_precipitable_water(PWInput(data_points, h1, h2))
+
     # 顯示結果
     print("\n計算結果:")
-    for i, (p, c, e, H) in enumerate(zip(pressures, temperatures, vapor_pressures, specific_humidity), start=1):
+    for i, (p, c, e, H) in enumerate(result.data_details, start=1):
         print(f"點{i}: 壓力={p}mb, 溫度={c}°C, 蒸氣壓={e:.2f}mb, 比濕度={H:.2f}g/kg")
-    
-    for i, (p_diff, H_avg) in enumerate(zip(pressure_differences, average_specific_humidity), start=1):
-        print(f"壓力差{i}={p_diff}mb, 平均比濕度{i}={H_avg:.2f}g/kg")
-    
-    print(f"\n可降水量 W_p={precipitable_water:.2f} mm")
+
+    for i, seg in enumerate(result.segment_details, start=1):
+        print(f"壓力差{i}={seg['Δp']}mb, 平均比濕度{i}={seg['mean_H_s']:.2f}g/kg")
+
+    print(f"\n可降水量 W_p={result.W_p:.2f} mm")
 
 # 執行主程式
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # python 主程式.py 資料檔 [h1 h2] -> 非互動模式
+    if len(sys.argv) > 1:
+        h1, h2 = (float(sys.argv[2]), float(sys.argv[3])) if len(sys.argv) >= 4 else (None, None)
+        run_file(sys.argv[1], h1, h2)
+    else:
+        main()
@@ -0,0 +1,11 @@
+# final_code 只是核心引擎的前端：與上層目錄的模組共用同一份對照表與計算程式。
+# 上層目錄必須在模組搜尋路徑上 (直接執行 主程式.py 時由它加入，或設定 PYTHONPATH)；
+# import 本模組不會修改 sys.path。
+from pw_module import (
+    TEMP_VAPOR_TABLE,
+    PWInput,
+    calc_mixing_ratio,
+    compute_precipitable_water,
+    interpolate_vapor_pressure,
+    stream_precipitable_water,
+)
@@ -1,3 +1,5 @@
+from 核心引擎 import calc_mixing_ratio
+
 # 模組3: 計算比濕度
 def calculate_specific_humidity(vapor_pressures, pressures):
     """
@@ -6,7 +8,4 @@ def calculate_specific_humidity(vapor_pressures, pressures):
     pressures: 壓力列表 (hPa)
     返回: 比濕度列表
     """
-    specific_humidity = []
-    for e, p in zip(vapor_pressures, pressures):
-        specific_humidity.append(622 * e / p)
-    return specific_humidity
\ No newline at end of file
+    return [calc_mixing_ratio(e, p) for e, p in zip(vapor_pressures, pressures)]
\ No newline at end of file
@@ -1,5 +1,52 @@
+import io
+import queue
+import threading
+from tkinter import filedialog
+
 import customtkinter as ctk
-from 主要計算程式 import PWInput, compute_precipitable_water
+from 主要計算程式 import PWInput
+from 結果快取 import ResultCache
+from 讀取探空檔案 import read_soundings
+
+# 背景工作完成後，主執行緒多久檢查一次結果 (毫秒)
+POLL_INTERVAL_MS = 50
+
+
+def parse_profile_text(source):
+    """
+    解析整段剖面文字或檔案 (格式見 讀取探空檔案.py)，回傳第一條剖面的 (p, c) 列表。
+    """
+    for input_data in read_soundings(source):
+        return input_data.data_points
+    return []
+
+
+def format_points(points):
+    return "".join(f"p={p_val}, c={c_val}\n" for p_val, c_val in points)
+
+
+def format_result(result, h1_val, h2_val):
+    """
+    將 PWOutput 組成要顯示的完整文字 (在背景執行緒中執行，不碰任何元件)。
+    """
+    lines = ["\n每筆 (p, c) 對應 '水氣壓(e)' 與 '比濕度(H_s)'"]
+    for (p_i, c_i, e_i, hs_i) in result.data_details:
+        lines.append(f"壓力 {p_i:7.2f} hPa, 溫度 {c_i:6.2f} °C, 水氣壓 {e_i:7.3f} hPa, 比濕度 {hs_i:7.3f} g/kg")
+
+    lines.append("\n分段積分詳情")
+    for i, seg in enumerate(result.segment_details, 1):
+        lines.append(f"段 {i}: 壓力 {seg['p1']:.2f}, {seg['p2']:.2f},"
+                     f" 比濕度 {seg['H_s1']:.3f}, {seg['H_s2']:.3f},"
+                     f" 平均比濕度 {seg['mean_H_s']:.3f},"
+                     f" 壓力差 {seg['Δp']:.2f}, 面積 {seg['area']:.3f}")
+
+    lines.append("\n最終結果")
+    lines.append(f"在壓力 {h1_val:.2f} hPa 與 {h2_val:.2f} hPa 之間，")
+    lines.append(f"總積分 {result.total_integral:.4f} (H_s×hPa)")
+    lines.append(f"可降水量 {result.W_p:.4f} mm")
+    lines.append("=================================\n")
+    return "\n".join(lines)
+
 
 class PWApp(ctk.CTk):
     def __init__(self):
@@ -8,6 +55,11 @@ class PWApp(ctk.CTk):
         self.geometry("800x400")  # 調整視窗大小
 
         self.data_points = []
+        # 資料點與積分範圍不變時，再按一次計算直接使用先前的結果
+        self.result_cache = ResultCache(maxsize=64)
+        # 背景執行緒只把結果放進佇列，元件一律由主執行緒更新 (Tk 不是 thread-safe)
+        self.results = queue.Queue()
+        self.busy = False
 
         self.create_widgets()
 
@@ -33,6 +85,16 @@ class PWApp(ctk.CTk):
         self.button_clear = ctk.CTkButton(button_frame, text="清除資料", command=self.clear_data)
         self.button_clear.pack(side="left", padx=5)
 
+        # 整條剖面的匯入：讀檔或貼上剪貼簿內容
+        import_frame = ctk.CTkFrame(self.frame_left)
+        import_frame.pack(pady=5)
+
+        self.button_import = ctk.CTkButton(import_frame, text="匯入檔案", command=self.import_file)
+        self.button_import.pack(side="left", padx=5)
+
+        self.button_paste = ctk.CTkButton(import_frame, text="貼上剖面", command=self.paste_profile)
+        self.button_paste.pack(side="left", padx=5)
+
         self.label_data_points = ctk.CTkLabel(self.frame_left, text="目前資料點：")
         self.label_data_points.pack(pady=10)
 
@@ -69,6 +131,7 @@ class PWApp(ctk.CTk):
 
     def add_data_point(self):
         lines = self.entry_pc.get().strip().split('\n')
+        text = []
         for line in lines:
             if not line:
                 continue
@@ -77,12 +140,87 @@ class PWApp(ctk.CTk):
                 p_val = float(p_str)
                 c_val = float(c_str)
                 self.data_points.append((p_val, c_val))
-                self.text_data_points.insert(ctk.END, f"p={p_val}, c={c_val}\n")
-            except:
-                self.text_data_points.insert(ctk.END, "[警告] 格式錯誤，請再試一次。\n")
+                text.append(format_points([(p_val, c_val)]))
+            except ValueError:
+                text.append("[警告] 格式錯誤，請再試一次。\n")
+        self.text_data_points.insert(ctk.END, "".join(text))
         self.entry_pc.delete(0, ctk.END)
 
+    # ---------------------------------------------
+    # 背景工作
+    # ---------------------------------------------
+
+    def run_in_background(self, job, on_done):
+        """
+        在背景執行緒執行 job()，完成後由主執行緒呼叫 on_done(結果, 例外)。
+        """
+        if self.busy:
+            return
+        self.set_busy(True)
+
+        def worker():
+            try:
+                self.results.put((on_done, job(), None))
+            except Exception as exc:
+                self.results.put((on_done, None, exc))
+
+        threading.Thread(target=worker, daemon=True).start()
+        self.after(POLL_INTERVAL_MS, self.poll_results)
+
+    def poll_results(self):
+        try:
+            on_done, value, error = self.results.get_nowait()
+        except queue.Empty:
+            self.after(POLL_INTERVAL_MS, self.poll_results)
+            return
+        self.set_busy(False)
+        on_done(value, error)
+
+    def set_busy(self, busy):
+        self.busy = busy
+        state = "disabled" if busy else "normal"
+        for button in (self.button_calculate, self.button_import, self.button_paste):
+            button.configure(state=state)
+
+    # ---------------------------------------------
+    # 匯入整條剖面
+    # ---------------------------------------------
+
+    def import_file(self):
+        if self.busy:
+            return
+        path = filedialog.askopenfilename(
+            title="選擇探空檔",
+            filetypes=[("探空資料", "*.csv *.txt *.dat"), ("所有檔案", "*.*")],
+        )
+        if path:
+            self.run_in_background(lambda: parse_profile_text(path), self.on_profile_loaded)
+
+    def paste_profile(self):
+        if self.busy:
+            return
+        try:
+            text = self.clipboard_get()
+        except Exception:
+            self.text_data_points.insert(ctk.END, "[警告] 剪貼簿沒有文字資料。\n")
+            return
+        self.run_in_background(lambda: parse_profile_text(io.StringIO(text)), self.on_profile_loaded)
+
+    def on_profile_loaded(self, points, error):
+        if error is not None:
+            self.text_data_points.insert(ctk.END, f"[警告] 無法讀取剖面：{error}\n")
+            return
+        self.data_points.extend(points)
+        self.text_data_points.insert(ctk.END, format_points(points))
+
+    # ---------------------------------------------
+    # 計算
+    # ---------------------------------------------
+
     def calculate(self):
+        # Enter 鍵不受停用的按鈕限制：背景工作進行中時不動任何元件
+        if self.busy:
+            return
         if len(self.data_points) < 2:
             self.text_result.insert(ctk.END, "[警告] 至少需要 2 筆 (p, c) 資料才能進行積分，程式終止。\n")
             return
@@ -92,31 +230,29 @@ class PWApp(ctk.CTk):
             h1_str, h2_str = h_input.split()
             h1_val = float(h1_str)
             h2_val = float(h2_str)
-        except:
+        except ValueError:
             self.text_result.insert(ctk.END, "[警告] 格式錯誤，請確認輸入，如：1000 500\n")
             return
 
-        input_data = PWInput(data_points=self.data_points, h1=h1_val, h2=h2_val)
-        result = compute_precipitable_water(input_data)
+        # 複製一份資料點，背景計算期間使用者仍可繼續新增
+        input_data = PWInput(data_points=list(self.data_points), h1=h1_val, h2=h2_val)
 
-        self.text_result.delete("1.0", ctk.END)  # 清空之前的結果
-        self.text_result.insert(ctk.END, "\n每筆 (p, c) 對應 '水氣壓(e)' 與 '比濕度(H_s)'\n")
-        for (p_i, c_i, e_i, hs_i) in result.data_details:
-            self.text_result.insert(ctk.END, f"壓力 {p_i:7.2f} hPa, 溫度 {c_i:6.2f} °C, 水氣壓 {e_i:7.3f} hPa, 比濕度 {hs_i:7.3f} g/kg\n")
+        def job():
+            result = self.result_cache.compute(input_data)
+            return format_result(result, h1_val, h2_val)
 
-        self.text_result.insert(ctk.END, "\n分段積分詳情\n")
-        for i, seg in enumerate(result.segment_details, 1):
-            self.text_result.insert(ctk.END, f"段 {i}: 壓力 {seg['p1']:.2f}, {seg['p2']:.2f},"
-                                             f" 比濕度 {seg['H_s1']:.3f}, {seg['H_s2']:.3f},"
-                                             f" 平均比濕度 {seg['mean_H_s'] if 'mean_H_s' in seg else (seg['H_s1']+seg['H_s2'])/2.0:.3f},"
-                                             f" 壓力差 {seg['Δp']:.2f}, 面積 {seg['area']:.3f}\n")
+        self.text_result.delete("1.0", ctk.END)
+        self.text_result.insert(ctk.END, "計算中...\n")
+        self.run_in_background(job, self.on_calculated)
 
-        self.text_result.insert(ctk.END, "\n最終結果\n")
-        self.text_result.insert(ctk.END, f"在壓力 {h1_val:.2f} hPa 與 {h2_val:.2f} hPa 之間，\n")
-        self.text_result.insert(ctk.END, f"總積分 {result.total_integral:.4f} (H_s×hPa)\n")
-        self.text_result.insert(ctk.END, f"可降水量 {result.W_p:.4f} mm\n")
-        self.text_result.insert(ctk.END, "=================================\n")
+    def on_calculated(self, text, error):
+        # 整份結果一次寫入文字框
+        self.text_result.delete("1.0", ctk.END)
+        if error is not None:
+            self.text_result.insert(ctk.END, f"[警告] 計算失敗：{error}\n")
+            return
+        self.text_result.insert(ctk.END, text)
 
 if __name__ == "__main__":
     app = PWApp()
-    app.mainloop()
\ No newline at end of file
+    app.mainloop()
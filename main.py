@@ -12,13 +12,25 @@ main.py
 說明：
     - 同目錄下需有 pw_module.py
     - 在終端機 (command line) 中執行：  python main.py
+    - 批次模式：  python main.py batch profiles.jsonl --workers 8 --chunksize 256
+      依總層數選擇 scalar / vectorized / parallel (門檻見 後端選擇.py)，也可用 --backend 指定
+      輸入每行一條剖面的 JSON，例如 {"data_points": [[1000, 25], [850, 15]], "h1": 1000, "h2": 850}，
+      省略檔名時從標準輸入讀取；依輸入順序每行輸出一個 W_p (mm)
+    - 探空檔模式：  python main.py file soundings.csv --h1 1000 --h2 500
+      串流讀取 CSV / 空白分隔的探空檔 (格式見 讀取探空檔案.py)，
+      每算完一條剖面就輸出一行 "鍵值<Tab>W_p"；也可直接讀取二進位剖面庫 (二進位剖面庫.py)
+    - 轉檔：  python main.py convert soundings.csv soundings.pws --dtype float32
+    - 常駐服務：  python main.py serve --port 8765 --workers 4 (HTTP/JSON，見 計算服務.py)
+    - batch / file 加上 --output results.csv (或 .pwr / .parquet) 時改為分批寫入結果檔 (見 結果輸出.py)，
+      --levels / --segments 一併輸出每層 e、H_s 與每個分段的面積 (在目前行程中計算明細)
 """
-from 封裝過後的資料格式 import PWInput
-from 主要計算程式 import (
-    compute_precipitable_water
-)
+import argparse
+import sys
+from itertools import tee
 
-def main():
+from pw_module import PWInput, compute_precipitable_water
+
+def interactive():
     print("===== 輸入多筆 (p, c) 資料 =====")
     print("請輸入壓力 (hPa) 與溫度 (°C)，例如：900 25")
     print("直接按 Enter (不輸任何值) 表示結束輸入。")
@@ -33,7 +45,7 @@ def main():
             p_val = float(p_str)
             c_val = float(c_str)
             data_points.append((p_val, c_val))
-        except:
+        except ValueError:
             print("[警告] 格式錯誤，請再試一次。")
             continue
 
@@ -48,7 +60,7 @@ def main():
         h1_str, h2_str = h_input.split()
         h1_val = float(h1_str)
         h2_val = float(h2_str)
-    except:
+    except ValueError:
         print("[警告] 格式錯誤，請確認輸入，如：1000 500")
         return
 
@@ -78,5 +90,200 @@ def main():
     print(f"  可降水量 W_p = {result.W_p:.4f} mm")
     print("=================================\n")
 
+def read_jsonl_inputs(stream):
+    """
+    逐行讀取 JSON 格式的剖面，產生 PWInput (略過空白行)。
+    """
+    import json
+
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        data_points = [(float(p), float(c)) for p, c in record["data_points"]]
+        yield PWInput(data_points=data_points, h1=float(record["h1"]), h2=float(record["h2"]))
+
+
+def run_batch(args):
+    stream = open(args.input, encoding="utf-8") if args.input != "-" else sys.stdin
+    try:
+        inputs = read_jsonl_inputs(stream)
+        if wants_detail(args):
+            results = (compute_precipitable_water(input_data, stats=args.stats) for input_data in inputs)
+        else:
+            from 後端選擇 import iter_precipitable_water_many
+
+            # 逐批選擇後端：少量剖面直接在目前行程計算，不會啟動行程池
+            results = iter_precipitable_water_many(inputs, args.backend, args.workers, args.chunksize,
+                                                   stats=args.stats)
+        if args.output:
+            write_results(args, results)
+        else:
+            for result in results:
+                print(f"{result.W_p:.6f}")
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    print_stats(args.stats)
+
+
+def print_stats(stats):
+    # 各階段統計輸出到 stderr，不影響標準輸出的結果
+    if stats is not None:
+        print(stats.report(), file=sys.stderr)
+
+
+def print_results(results):
+    for key, result in results:
+        label = ",".join(key) if isinstance(key, tuple) else str(key)
+        print(f"{label}\t{result.W_p:.6f}", flush=True)
+
+
+def wants_detail(args):
+    # 輸出每層或每個分段的明細時需要 detail=True 的結果
+    return bool(args.output) and (args.levels or args.segments)
+
+
+def write_results(args, results):
+    """
+    將結果串流 (PWOutput 或 (key, PWOutput)) 分批寫入 args.output。
+    """
+    from 結果輸出 import open_result_sink
+
+    with open_result_sink(args.output, args.format, args.levels, args.segments) as sink:
+        count = sink.write_all(results)
+    print(f"已寫入 {count} 條剖面的結果到 {args.output}", file=sys.stderr)
+
+
+def emit_results(args, results):
+    if args.output:
+        write_results(args, results)
+    else:
+        print_results(results)
+
+
+def run_file(args):
+    from 讀取探空檔案 import iter_sounding_records
+    from 二進位剖面庫 import ProfileStore, is_profile_store
+
+    if args.input != "-" and is_profile_store(args.input):
+        # 剖面庫已記錄每條剖面的 h1, h2，不需再解析文字
+        if wants_detail(args):
+            with ProfileStore(args.input) as store:
+                emit_results(args, (
+                    (store.key(i), compute_precipitable_water(store[i], stats=args.stats))
+                    for i in range(len(store))
+                ))
+        else:
+            emit_results(args, iter_store_backend(args))
+        print_stats(args.stats)
+        return
+
+    stream = open(args.input, encoding="utf-8") if args.input != "-" else sys.stdin
+    try:
+        records = iter_sounding_records(stream, args.h1, args.h2, args.delimiter)
+        if wants_detail(args):
+            results = (
+                (key, compute_precipitable_water(input_data, stats=args.stats))
+                for key, input_data in records
+            )
+        else:
+            from 後端選擇 import iter_precipitable_water_many
+
+            # 鍵值與計算結果依相同順序產生，tee 只暫存尚未輸出的鍵值
+            key_records, input_records = tee(records)
+            keys = (key for key, _ in key_records)
+            inputs = (input_data for _, input_data in input_records)
+            results = zip(keys, iter_precipitable_water_many(inputs, args.backend, args.workers, args.chunksize,
+                                                             stats=args.stats))
+
+        emit_results(args, results)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    print_stats(args.stats)
+
+
+def iter_store_backend(args):
+    """
+    依剖面庫的總層數選擇後端，回傳 (key, PWOutput) 的迭代器；parallel 時子行程直接讀取對映檔案。
+    """
+    from 二進位剖面庫 import ProfileStore, iter_store_results, iter_store_results_vectorized
+    from 後端選擇 import choose_backend
+
+    with ProfileStore(args.input) as store:
+        backend = choose_backend(store.n_levels, len(store), args.workers, args.backend)
+    if backend == "vectorized":
+        # 直接以 np.frombuffer 檢視對映檔案，不複製成 list of tuple
+        return iter_store_results_vectorized(args.input, stats=args.stats)
+    # scalar 在目前行程逐條計算，parallel 的子行程各自對映檔案
+    workers = args.workers if backend == "parallel" else 1
+    return iter_store_results(args.input, workers, args.chunksize, args.stats)
+
+
+def run_convert(args):
+    from 二進位剖面庫 import convert_text_to_store
+
+    count = convert_text_to_store(args.input, args.output, args.h1, args.h2, args.delimiter, args.dtype)
+    print(f"已寫入 {count} 條剖面到 {args.output}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="可降水量 (W_p) 計算")
+    subparsers = parser.add_subparsers(dest="command")
+    batch = subparsers.add_parser("batch", help="以多個行程批次計算 JSON lines 格式的剖面")
+    batch.add_argument("input", nargs="?", default="-", help="輸入檔 (預設為標準輸入)")
+    batch.add_argument("--workers", type=int, default=None, help="子行程數 (預設為 CPU 核心數)")
+    batch.add_argument("--chunksize", type=int, default=256, help="每次送給子行程的剖面數")
+    sounding = subparsers.add_parser("file", help="串流讀取探空檔並逐條輸出 W_p")
+    sounding.add_argument("input", nargs="?", default="-", help="探空檔 (預設為標準輸入)")
+    sounding.add_argument("--h1", type=float, default=None, help="積分區間一端 (預設為剖面最大壓力)")
+    sounding.add_argument("--h2", type=float, default=None, help="積分區間另一端 (預設為剖面最小壓力)")
+    sounding.add_argument("--delimiter", default=None, help="欄位分隔字元 (預設自動判斷)")
+    sounding.add_argument("--workers", type=int, default=1, help="子行程數 (預設 1，auto 不使用行程池)")
+    sounding.add_argument("--chunksize", type=int, default=256, help="每次送給子行程的剖面數")
+    convert = subparsers.add_parser("convert", help="將文字探空檔轉換成二進位剖面庫")
+    convert.add_argument("input", help="文字探空檔")
+    convert.add_argument("output", help="輸出的剖面庫檔案")
+    convert.add_argument("--h1", type=float, default=None, help="積分區間一端 (預設為剖面最大壓力)")
+    convert.add_argument("--h2", type=float, default=None, help="積分區間另一端 (預設為剖面最小壓力)")
+    convert.add_argument("--delimiter", default=None, help="欄位分隔字元 (預設自動判斷)")
+    convert.add_argument("--dtype", choices=["float32", "float64"], default="float64", help="p, c 欄位的數值型態")
+    service = subparsers.add_parser("serve", help="啟動本機 HTTP/JSON 計算服務")
+    service.add_argument("--host", default="127.0.0.1", help="監聽位址 (預設只接受本機連線)")
+    service.add_argument("--port", type=int, default=8765, help="監聽埠")
+    service.add_argument("--workers", type=int, default=None, help="行程池大小 (預設為 CPU 核心數)")
+    service.add_argument("--chunksize", type=int, default=256, help="/batch 每個子工作的剖面數")
+    for sub in (batch, sounding):
+        sub.add_argument("--backend", choices=["auto", "scalar", "vectorized", "parallel"], default="auto",
+                         help="計算後端 (預設 auto：依總層數選擇，少量剖面不啟動行程池；門檻見 後端選擇.py)")
+        sub.add_argument("--profile-stages", action="store_true", help="結束時在 stderr 輸出各階段時間與計數")
+        sub.add_argument("--output", default=None, help="結果檔 (.csv / .pwr / .parquet)，省略時輸出到標準輸出")
+        sub.add_argument("--format", choices=["csv", "columnar", "parquet"], default=None,
+                         help="結果檔格式 (預設依副檔名判斷)")
+        sub.add_argument("--levels", action="store_true", help="結果檔一併輸出每層的 p, c, e, H_s")
+        sub.add_argument("--segments", action="store_true", help="結果檔一併輸出每個積分分段的面積")
+    args = parser.parse_args(argv)
+    if getattr(args, "profile_stages", False):
+        from 效能統計 import ComputeStats
+
+        args.stats = ComputeStats()
+    else:
+        args.stats = None
+
+    if args.command == "batch":
+        run_batch(args)
+    elif args.command == "file":
+        run_file(args)
+    elif args.command == "convert":
+        run_convert(args)
+    elif args.command == "serve":
+        from 計算服務 import serve
+
+        serve(args.host, args.port, args.workers, args.chunksize)
+    else:
+        interactive()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
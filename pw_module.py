@@ -1,124 +1,86 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-
-
-from 封裝過後的資料格式 import PWInput, PWOutput
-from 比濕度 import calc_mixing_ratio
-from 查表獲得最近的水氣壓 import interpolate_vapor_pressure
-from 內插法 import interpolate_point
-from 梯形積分 import integrate_Hs_over_p
 """
 pw_module.py
 
-本檔案提供可降水量 (W_p) 計算的模組：
-1. 資料結構：
-   - PWInput: 儲存 (p, c) 清單 + h1, h2 (壓力範圍)
-   - PWOutput: 儲存「每筆資料對應的水氣壓、比濕度」及「積分分段資訊」與「最終可降水量」等
+可降水量 (W_p) 計算的單一進入點。
 
-2. 功能函式：
-   - interpolate_vapor_pressure: 根據溫度內插飽和水氣壓
+1. 核心 (只使用標準函式庫，import 時直接載入)：
+   - PWInput / PWOutput / PWBatchOutput: 資料結構
+   - interpolate_vapor_pressure, get_vapor_lookup: 根據溫度內插飽和水氣壓
    - calc_mixing_ratio: 計算比濕度
-   - integrate_Hs_over_p: 對 [h1, h2] 區間的 (p, H_s) 做梯形積分
+   - integrate_Hs_over_p / integrate_Hs_over_p_columns: 對 [h1, h2] 區間的 (p, H_s) 做梯形積分
    - compute_precipitable_water: 將上述步驟整合，產生 PWOutput
+   - stream_precipitable_water: 逐層串流、不保留中間列表的單次走訪版本
+
+2. 其他功能在第一次使用時才載入對應的模組 (NumPy 只有批次 API 才需要)：
+   - compute_precipitable_water_batch, compute_precipitable_water_grid (向量化計算，需要 NumPy)
+   - integrate_scheme, level_weights (積分方法：ln p 梯形、Simpson、依對照表精確積分，需要 NumPy)
+   - clean_profiles (品質控制：缺值、重複與異常層的陣列化處理，需要 NumPy)
+   - get_dense_vapor_lookup (密集水氣壓表)
+   - PWProfile (分層積分索引)、IncrementalProfile (逐層更新剖面)
+   - StationSeries, compute_precipitable_water_series (時間序列計算，需要 NumPy)
+   - compute_precipitable_water_parallel, iter_precipitable_water_parallel (平行批次計算)
+   - compute_precipitable_water_auto, compute_precipitable_water_many, iter_precipitable_water_many
+     (後端選擇：依大小選 scalar / vectorized / parallel)
+   - read_soundings, iter_sounding_records (讀取探空檔案)
+   - ProfileStore, convert_text_to_store (二進位剖面庫)
+   - open_result_sink, read_columnar_results (結果輸出：CSV / 二進位欄位格式 / Parquet)
+   - ResultCache (結果快取)、ComputeStats (效能統計)、ComputeService (計算服務)
+
+    import pw_module
+    result = pw_module.compute_precipitable_water(pw_module.PWInput(points, 1000, 500))
 """
+import importlib
 
-
-def integrate_Hs_over_p(data_points, h1, h2):
-    """
-    利用梯形公式，對在 [h1, h2] 區間的 (p, H_s) 做數值積分。
-    data_points: 內部元素為 (p, H_s)，p 單位hPa, H_s 單位g/kg
-
-    回傳:
-      total_integral (float): ∫(H_s dP)
-      segment_detail (list of dict): 每分段的詳細資訊
-    """
-    # 確保 h1, h2 誰大都可
-    p_upper = max(h1, h2)
-    p_lower = min(h1, h2)
-
-    # 依 p 遞減排序
-    data_sorted = sorted(data_points, key=lambda x: x[0], reverse=True)
-
-    clipped = []
-    for i in range(len(data_sorted) - 1):
-        p_a, hs_a = data_sorted[i]
-        p_b, hs_b = data_sorted[i+1]
-
-        hi_local = max(p_a, p_b)
-        lo_local = min(p_a, p_b)
-
-        if hi_local < p_lower or lo_local > p_upper:
-            # 無交集
-            continue
-
-        seg_upper = min(hi_local, p_upper)
-        seg_lower = max(lo_local, p_lower)
-
-        def get_Hs_at(p_target):
-            # 若正好 == p_a or p_b，使用現有值；否則線性內插
-            if abs(p_target - p_a) < 1e-9:
-                return hs_a
-            elif abs(p_target - p_b) < 1e-9:
-                return hs_b
-            else:
-                return interpolate_point(p_target, p_a, p_b, hs_a, hs_b)
-
-        hs_u = get_Hs_at(seg_upper)
-        hs_l = get_Hs_at(seg_lower)
-
-        clipped.append((seg_upper, hs_u))
-        clipped.append((seg_lower, hs_l))
-
-    # 去重
-    clipped = list(set(clipped))
-    # 依 p 遞減
-    clipped_sorted = sorted(clipped, key=lambda x: x[0], reverse=True)
-
-    total_integral = 0.0
-    segment_detail = []
-    for i in range(len(clipped_sorted) - 1):
-        p1, hs1 = clipped_sorted[i]
-        p2, hs2 = clipped_sorted[i+1]
-        dp = abs(p1 - p2)
-        mean_hs = (hs1 + hs2) / 2.0
-        area = mean_hs * dp
-        total_integral += area
-        segment_detail.append({
-            "p1": p1,
-            "p2": p2,
-            "H_s1": hs1,
-            "H_s2": hs2,
-            "mean_H_s": mean_hs,
-            "Δp": dp,
-            "area": area
-        })
-
-    return total_integral, segment_detail
-
-def compute_precipitable_water(input_data: PWInput) -> PWOutput:
-    """
-    核心函式：綜合應用內插水氣壓、計算比濕度、在 [h1, h2] 間做梯形積分，最後算出W_p。
-    回傳封裝好的 PWOutput。
-    """
-    # 1. 先把 (p, c) -> (p, e, H_s)
-    data_details = []
-    for (p_i, c_i) in input_data.data_points:
-        e_i = interpolate_vapor_pressure(c_i)
-        hs_i = calc_mixing_ratio(e_i, p_i)
-        data_details.append((p_i, c_i, e_i, hs_i))
-
-    # 2. 用 (p, H_s) 做梯形積分
-    data_for_integration = [(p, hs) for (p, c, e, hs) in data_details]
-    total_integral, seg_detail = integrate_Hs_over_p(data_for_integration, input_data.h1, input_data.h2)
-
-    # 3. W_p = 0.01 * total_integral
-    W_p = 0.01 * total_integral
-
-    # 4. 封裝結果
-    output_data = PWOutput(
-        data_details=data_details,
-        segment_details=seg_detail,
-        total_integral=total_integral,
-        W_p=W_p
-    )
-    return output_data
\ No newline at end of file
+from 封裝過後的資料格式 import PWInput, PWOutput, PWBatchOutput
+from 比濕度 import calc_mixing_ratio
+from 查表獲得最近的水氣壓 import TEMP_VAPOR_TABLE, get_vapor_lookup, interpolate_vapor_pressure
+from 梯形積分 import integrate_Hs_over_p, integrate_Hs_over_p_columns
+from 主要計算程式 import compute_precipitable_water, stream_precipitable_water
+
+# 延遲載入的名稱 -> 所在模組
+_LAZY_ATTRIBUTES = {
+    "interpolate_vapor_pressure_array": "向量化計算",
+    "integrate_Hs_over_p_array": "向量化計算",
+    "compute_precipitable_water_batch": "向量化計算",
+    "compute_precipitable_water_grid": "向量化計算",
+    "integrate_scheme": "積分方法",
+    "level_weights": "積分方法",
+    "clean_profiles": "品質控制",
+    "get_dense_vapor_lookup": "密集水氣壓表",
+    "UniformVaporPressureLookup": "密集水氣壓表",
+    "PWProfile": "分層積分索引",
+    "IncrementalProfile": "逐層更新剖面",
+    "StationSeries": "時間序列計算",
+    "compute_precipitable_water_series": "時間序列計算",
+    "compute_precipitable_water_parallel": "平行批次計算",
+    "iter_precipitable_water_parallel": "平行批次計算",
+    "compute_precipitable_water_auto": "後端選擇",
+    "compute_precipitable_water_many": "後端選擇",
+    "iter_precipitable_water_many": "後端選擇",
+    "read_soundings": "讀取探空檔案",
+    "iter_sounding_records": "讀取探空檔案",
+    "ProfileStore": "二進位剖面庫",
+    "convert_text_to_store": "二進位剖面庫",
+    "write_profile_store": "二進位剖面庫",
+    "open_result_sink": "結果輸出",
+    "read_columnar_results": "結果輸出",
+    "ResultCache": "結果快取",
+    "ComputeStats": "效能統計",
+    "ComputeService": "計算服務",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    # 之後直接從模組字典取得，不再經過 __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
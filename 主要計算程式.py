@@ -2,11 +2,14 @@
 # -*- coding: utf-8 -*-
 
 
-from 封裝過後的資料格式 import PWInput, PWOutput
+from array import array
+from time import perf_counter
+
+from 封裝過後的資料格式 import PWInput, PWOutput, LevelColumns
 from 比濕度 import calc_mixing_ratio
-from 查表獲得最近的水氣壓 import interpolate_vapor_pressure
+from 查表獲得最近的水氣壓 import TEMP_VAPOR_TABLE, get_vapor_lookup, interpolate_vapor_pressure
 from 內插法 import interpolate_point
-from 梯形積分 import integrate_Hs_over_p
+from 梯形積分 import clipped_segment_area, integrate_Hs_over_p, integrate_Hs_over_p_columns, trapezoid_level_weights
 """
 pw_module.py
 
@@ -19,34 +22,112 @@ pw_module.py
    - interpolate_vapor_pressure: 根據溫度內插飽和水氣壓
    - calc_mixing_ratio: 計算比濕度
    - integrate_Hs_over_p: 對 [h1, h2] 區間的 (p, H_s) 做梯形積分
+   - integrate_Hs_over_p_columns: 同上，分段資訊以平行陣列回傳 (或完全不記錄)
    - compute_precipitable_water: 將上述步驟整合，產生 PWOutput
+   - stream_precipitable_water: 逐層串流的單次走訪版本，只回傳積分值與 W_p
 """
 
 
-def compute_precipitable_water(input_data: PWInput) -> PWOutput:
+def compute_precipitable_water(input_data: PWInput, detail=True, table=TEMP_VAPOR_TABLE, stats=None,
+                               gradient=False) -> PWOutput:
     """
     核心函式：綜合應用內插水氣壓、計算比濕度、在 [h1, h2] 間做梯形積分，最後算出W_p。
     回傳封裝好的 PWOutput。
+    detail=False 時不保留每筆資料與每個分段的明細，只計算 total_integral 與 W_p。
+    table: 溫度與飽和水氣壓對照表，或已編譯好的查表物件
+    stats: 效能統計.ComputeStats，傳入時記錄各階段時間與計數 (預設不記錄)
+    gradient=True 時一併算出 dW_dT[k] = ∂W_p/∂T_k：查表、比濕度與梯形積分都是分段線性，
+    因此 ∂W_p/∂T_k = 0.01 * weights_k * 622 * (de/dT)_k / p_k，不需重複計算 n 次。
     """
-    # 1. 先把 (p, c) -> (p, e, H_s)
-    data_details = []
+    if stats is not None:
+        t_start = perf_counter()
+    lookup = get_vapor_lookup(table)
+
+    # 1. 先把 (p, c) -> (p, H_s)，需要明細時一併記錄 (p, c, e, H_s)
+    levels = LevelColumns() if detail else None
+    data_for_integration = []
+    # gradient 時記錄 ∂H_s/∂T = 622 * (de/dT) / p
+    dhs_dT = array("d") if gradient else None
     for (p_i, c_i) in input_data.data_points:
-        e_i = interpolate_vapor_pressure(c_i)
+        e_i = lookup.lookup(c_i)
         hs_i = calc_mixing_ratio(e_i, p_i)
-        data_details.append((p_i, c_i, e_i, hs_i))
+        data_for_integration.append((p_i, hs_i))
+        if detail:
+            levels.append(p_i, c_i, e_i, hs_i)
+        if gradient:
+            dhs_dT.append(calc_mixing_ratio(lookup.derivative(c_i), p_i))
+
+    if stats is not None:
+        stats.levels += len(data_for_integration)
+        stats.count_clamps((c for _, c in input_data.data_points), lookup)
+        stats.add_time("lookup", perf_counter() - t_start)
 
     # 2. 用 (p, H_s) 做梯形積分
-    data_for_integration = [(p, hs) for (p, c, e, hs) in data_details]
-    total_integral, seg_detail = integrate_Hs_over_p(data_for_integration, input_data.h1, input_data.h2)
+    total_integral, segments = integrate_Hs_over_p_columns(
+        data_for_integration, input_data.h1, input_data.h2, detail=detail, stats=stats
+    )
+    if stats is not None:
+        t_start = perf_counter()
 
     # 3. W_p = 0.01 * total_integral
     W_p = 0.01 * total_integral
 
+    # 每層溫度的敏感度 ∂W_p/∂T
+    dW_dT = None
+    if gradient:
+        weights = trapezoid_level_weights(
+            [p for p, _ in data_for_integration], input_data.h1, input_data.h2
+        )
+        dW_dT = array("d", (0.01 * w * d for w, d in zip(weights, dhs_dT)))
+
     # 4. 封裝結果
     output_data = PWOutput(
-        data_details=data_details,
-        segment_details=seg_detail,
         total_integral=total_integral,
-        W_p=W_p
+        W_p=W_p,
+        levels=levels,
+        segments=segments,
+        dW_dT=dW_dT,
     )
-    return output_data
\ No newline at end of file
+    if stats is not None:
+        stats.add_time("package", perf_counter() - t_start)
+        stats.finish_call()
+    return output_data
+
+
+def stream_precipitable_water(levels, h1=None, h2=None, table=TEMP_VAPOR_TABLE):
+    """
+    單次走訪的串流版本：每讀入一層 (p, c) 就完成查表、比濕度與相鄰分段的截斷梯形積分，
+    不保留任何中間列表，記憶體用量與層數無關。levels 可以是任意可迭代物件 (包含 generator)。
+
+    各層需依壓力單調排列 (遞增或遞減皆可)，否則引發 ValueError；重複的壓力依輸入順序相鄰。
+    h1, h2 省略時積分整條剖面。壓力遞減 (或沒有重複壓力) 時，
+    結果與 compute_precipitable_water 相同 (遞增時只差加總順序造成的捨入誤差)。
+
+    回傳:
+        (total_integral, W_p)
+    """
+    lookup = get_vapor_lookup(table)
+    p_lower = min(h1, h2) if h1 is not None and h2 is not None else float("-inf")
+    p_upper = max(h1, h2) if h1 is not None and h2 is not None else float("inf")
+
+    total_integral = 0.0
+    direction = 0
+    count = 0
+    p_prev = hs_prev = None
+    for p_i, c_i in levels:
+        hs_i = calc_mixing_ratio(lookup.lookup(c_i), p_i)
+        count += 1
+        if p_prev is not None:
+            step = (p_i > p_prev) - (p_i < p_prev)
+            if step and direction and step != direction:
+                raise ValueError("各層壓力必須單調排列才能串流積分")
+            direction = direction or step
+            if p_prev >= p_i:
+                total_integral += clipped_segment_area(p_prev, hs_prev, p_i, hs_i, p_lower, p_upper)
+            else:
+                total_integral += clipped_segment_area(p_i, hs_i, p_prev, hs_prev, p_lower, p_upper)
+        p_prev, hs_prev = p_i, hs_i
+
+    if count < 2:
+        raise ValueError("至少需要 2 筆 (p, c) 資料才能進行積分")
+    return total_integral, 0.01 * total_integral
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+二進位剖面庫.py
+
+大量探空資料的二進位存檔格式。數學部分已經很快之後，解析上百萬行 "p c" 文字反而成為瓶頸；
+轉成這個格式之後，讀取端以 mmap 直接對映檔案，不需解析也不需複製，
+只有實際讀到的剖面所在的頁面才會載入記憶體。
+
+檔案結構 (little-endian，各區段對齊 8 bytes)：
+   - 標頭: magic "PWSTORE1", 版本, 數值型態 (f4 / f8), 剖面數, 總層數, metadata 長度
+   - offsets: uint64[剖面數 + 1]，第 i 條剖面為第 offsets[i] ~ offsets[i+1]-1 層
+   - bounds: float64[剖面數 * 2]，每條剖面的 (h1, h2)
+   - p, c: 所有剖面依序串接的壓力 (hPa) 與溫度 (°C) 欄位
+   - metadata: UTF-8 JSON，每條剖面的鍵值 (例如 [測站, 時間])
+
+   - write_profile_store: 將 (key, PWInput) 串流寫成剖面庫
+   - convert_text_to_store: 由文字探空檔 (讀取探空檔案.py 的格式) 轉換
+   - ProfileStore: 以 mmap 讀取剖面庫 (is_profile_store 判斷檔案是否為剖面庫)
+   - iter_store_results: 以行程池計算剖面庫中所有剖面的 W_p，子行程各自對映檔案
+   - iter_store_results_vectorized: 以 np.frombuffer 直接檢視對映檔案，
+     連續且層數相同的剖面不經複製組成 (m, n) 陣列交給 向量化計算 (需要 NumPy)
+"""
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import time
+from array import array
+from collections import deque
+from multiprocessing import Pool
+
+from 封裝過後的資料格式 import PWInput, PWOutput
+from 主要計算程式 import compute_precipitable_water
+from 效能統計 import ComputeStats
+
+# iter_store_results_vectorized 每次交給批次計算的最多剖面數
+DEFAULT_BATCH_PROFILES = 65536
+MAGIC = b"PWSTORE1"
+VERSION = 1
+HEADER = struct.Struct("<8sI4sQQQ")
+DTYPES = {"float32": (b"f4", "f"), "float64": (b"f8", "d")}
+
+
+def _padding(size):
+    return -size % 8
+
+
+def write_profile_store(path, records, dtype="float64"):
+    """
+    將 (key, PWInput) 串流寫成剖面庫；p, c 欄位先寫到暫存檔，
+    記憶體中只保留每條剖面的 offset、(h1, h2) 與鍵值。
+
+    參數:
+        path: 輸出檔案路徑
+        records: (key, PWInput) 的可迭代物件，例如 iter_sounding_records(...)
+        dtype: p, c 欄位的數值型態，"float32" 或 "float64"
+
+    回傳:
+        寫入的剖面數
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"未知的數值型態：{dtype}")
+    code, typecode = DTYPES[dtype]
+
+    offsets = array("Q", [0])
+    bounds = array("d")
+    keys = []
+    with tempfile.TemporaryFile() as p_tmp, tempfile.TemporaryFile() as c_tmp:
+        for key, input_data in records:
+            array(typecode, (p for p, _ in input_data.data_points)).tofile(p_tmp)
+            array(typecode, (c for _, c in input_data.data_points)).tofile(c_tmp)
+            offsets.append(offsets[-1] + len(input_data.data_points))
+            bounds.append(input_data.h1)
+            bounds.append(input_data.h2)
+            keys.append(key)
+
+        metadata = json.dumps(keys, ensure_ascii=False).encode("utf-8")
+        n_profiles = len(keys)
+        n_levels = offsets[-1]
+
+        # 先寫暫存檔再改名，避免其他行程讀到一半的檔案
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, code, n_profiles, n_levels, len(metadata)))
+            offsets.tofile(f)
+            bounds.tofile(f)
+            for column in (p_tmp, c_tmp):
+                column.seek(0)
+                shutil.copyfileobj(column, f)
+                f.write(b"\0" * _padding(n_levels * struct.calcsize(typecode)))
+            f.write(metadata)
+        os.replace(tmp_path, path)
+    return n_profiles
+
+
+def convert_text_to_store(source, path, h1=None, h2=None, delimiter=None, dtype="float64"):
+    """
+    由文字探空檔 (CSV / 空白分隔) 轉換成剖面庫，回傳剖面數。
+    h1, h2, delimiter 的意義與 讀取探空檔案.iter_sounding_records 相同。
+    """
+    from 讀取探空檔案 import iter_sounding_records
+
+    return write_profile_store(path, iter_sounding_records(source, h1, h2, delimiter), dtype)
+
+
+def is_profile_store(path):
+    """
+    檢查檔案開頭是否為剖面庫的 magic。
+    """
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class ProfileStore:
+    """
+    以 mmap 讀取的剖面庫。
+    - len(store): 剖面數
+    - store[i]: 第 i 條剖面的 PWInput (只讀取該剖面的資料)
+    - store.key(i): 第 i 條剖面的鍵值 (metadata 在第一次使用時才解析)
+    - store.columns(i): 第 i 條剖面的 (p, c) memoryview，不複製資料
+    - store.arrays(): 整個檔案的 offsets, bounds, p, c 的 NumPy 檢視 (np.frombuffer，不複製資料)
+    store[i] 會把資料複製成 list of (p, c)，只供逐條計算的 scalar API 使用。
+    可當作 context manager 使用，離開時關閉對映。
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._mmap)
+
+        magic, version, code, n_profiles, n_levels, meta_len = HEADER.unpack_from(buf)
+        if magic != MAGIC or version != VERSION:
+            buf.release()
+            self._mmap.close()
+            raise ValueError(f"{path} 不是剖面庫檔案")
+        typecode = {c: t for c, t in DTYPES.values()}[code.rstrip(b"\0")]
+        itemsize = struct.calcsize(typecode)
+
+        pos = HEADER.size
+        self.offsets = buf[pos:pos + (n_profiles + 1) * 8].cast("Q")
+        pos += (n_profiles + 1) * 8
+        self.bounds = buf[pos:pos + n_profiles * 16].cast("d")
+        pos += n_profiles * 16
+        column_size = n_levels * itemsize
+        self.p = buf[pos:pos + column_size].cast(typecode)
+        pos += column_size + _padding(column_size)
+        self.c = buf[pos:pos + column_size].cast(typecode)
+        pos += column_size + _padding(column_size)
+        self._meta = buf[pos:pos + meta_len]
+        self._buf = buf
+        self._keys = None
+        self.dtype = "float32" if typecode == "f" else "float64"
+        self.n_levels = n_levels
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError("剖面索引超出範圍")
+        i %= len(self)
+        p, c = self.columns(i)
+        return PWInput(
+            data_points=list(zip(p, c)),
+            h1=self.bounds[2 * i],
+            h2=self.bounds[2 * i + 1],
+        )
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def columns(self, i):
+        """
+        第 i 條剖面的 (p, c)，為指向對映檔案的 memoryview。
+        """
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        return self.p[start:stop], self.c[start:stop]
+
+    def arrays(self):
+        """
+        回傳 (offsets, bounds, p, c) 四個指向對映檔案的唯讀 NumPy 陣列 (np.frombuffer，不複製資料)；
+        bounds 的形狀為 (剖面數, 2)。這些陣列必須在 close() 之前釋放，否則無法關閉對映。
+        """
+        import numpy as np
+
+        return (
+            np.frombuffer(self.offsets, dtype=np.uint64),
+            np.frombuffer(self.bounds, dtype=np.float64).reshape(-1, 2),
+            np.frombuffer(self.p, dtype=self.p.format),
+            np.frombuffer(self.c, dtype=self.c.format),
+        )
+
+    def key(self, i):
+        if self._keys is None:
+            self._keys = json.loads(bytes(self._meta).decode("utf-8"))
+        key = self._keys[i]
+        return tuple(key) if isinstance(key, list) else key
+
+    def close(self):
+        """
+        釋放所有 memoryview 並關閉對映。
+        """
+        if self._mmap.closed:
+            return
+        for view in (self.offsets, self.bounds, self.p, self.c, self._meta, self._buf):
+            view.release()
+        self._mmap.close()
+
+
+def _run_range(task):
+    """
+    子行程執行的工作：自行對映剖面庫，計算第 start ~ stop-1 條剖面，
+    回傳 (list of (total_integral, W_p), ComputeStats 或 None)。
+    """
+    path, start, stop, instrument = task
+    stats = ComputeStats() if instrument else None
+    with ProfileStore(path) as store:
+        results = []
+        for i in range(start, stop):
+            out = compute_precipitable_water(store[i], detail=False, stats=stats)
+            results.append((out.total_integral, out.W_p))
+    return results, stats
+
+
+def iter_store_results(path, workers=1, chunksize=256, stats=None):
+    """
+    依序產生剖面庫中每條剖面的 (key, PWOutput)。
+    workers > 1 時以行程池計算，每個工作只傳送 (檔名, 起, 訖)，資料由子行程直接從對映檔案讀取。
+    stats: 效能統計.ComputeStats，傳入時合併各子行程的統計
+    """
+    if chunksize < 1:
+        raise ValueError("chunksize 必須大於 0")
+    workers = workers or os.cpu_count() or 1
+    with ProfileStore(path) as store:
+        n = len(store)
+        tasks = (
+            (path, start, min(start + chunksize, n), stats is not None)
+            for start in range(0, n, chunksize)
+        )
+
+        def emit(start, chunk_result):
+            results, chunk_stats = chunk_result
+            if stats is not None:
+                stats.merge(chunk_stats)
+            for i, (total_integral, W_p) in enumerate(results, start):
+                yield store.key(i), PWOutput(total_integral=total_integral, W_p=W_p)
+
+        if workers == 1:
+            for task in tasks:
+                yield from emit(task[1], _run_range(task))
+            return
+
+        with Pool(workers) as pool:
+            pending = deque()
+            for task in tasks:
+                pending.append((task[1], pool.apply_async(_run_range, (task,))))
+                if len(pending) >= 2 * workers:
+                    start, result = pending.popleft()
+                    yield from emit(start, result.get())
+            while pending:
+                start, result = pending.popleft()
+                yield from emit(start, result.get())
+
+
+def _iter_runs(lengths, max_profiles):
+    """
+    將剖面依序切成層數相同的連續區段 (每段最多 max_profiles 條)，產生 (起, 訖, 層數)。
+    """
+    import numpy as np
+
+    if not len(lengths):
+        return
+    edges = np.concatenate(([0], np.flatnonzero(np.diff(lengths)) + 1, [len(lengths)])).tolist()
+    for run_start, run_stop in zip(edges[:-1], edges[1:]):
+        n_levels = int(lengths[run_start])
+        for start in range(run_start, run_stop, max_profiles):
+            yield start, min(start + max_profiles, run_stop), n_levels
+
+
+def _vectorized_range(columns, start, stop, n_levels, table, lookup, stats):
+    """
+    以批次計算第 start ~ stop-1 條剖面 (層數皆為 n_levels)，回傳 list of (total_integral, W_p)。
+    指向對映檔案的切片只存在於此函式中，回傳後即釋放。
+    """
+    import numpy as np
+
+    from 向量化計算 import compute_precipitable_water_batch
+
+    offsets, bounds, p, c = columns
+    lo, hi = int(offsets[start]), int(offsets[stop])
+    p_rows = p[lo:hi].reshape(stop - start, n_levels)
+    c_rows = c[lo:hi].reshape(stop - start, n_levels)
+    began = time.perf_counter()
+    batch = compute_precipitable_water_batch(p_rows, c_rows, bounds[start:stop, 0], bounds[start:stop, 1], table)
+    if stats is not None:
+        stats.add_time("batch", time.perf_counter() - began)
+        stats.levels += hi - lo
+        stats.clamps_below += int(np.count_nonzero(c_rows < lookup.t_min))
+        stats.clamps_above += int(np.count_nonzero(c_rows > lookup.t_max))
+    return list(zip(batch.total_integral.tolist(), batch.W_p.tolist()))
+
+
+def iter_store_results_vectorized(path, table=None, stats=None, batch_profiles=DEFAULT_BATCH_PROFILES):
+    """
+    依序產生剖面庫中每條剖面的 (key, PWOutput)，以 向量化計算.compute_precipitable_water_batch 計算。
+    p, c 欄位以 np.frombuffer 直接檢視對映檔案；連續且層數相同的剖面 (例如固定標準層的剖面庫)
+    只是同一段記憶體的 reshape，不經過 Python list / tuple，也不複製資料。
+    層數各不相同的剖面庫會切成許多小批次，此時 iter_store_results 通常較快。
+    stats 只記錄剖面數、層數、超出對照表範圍的次數，時間整批記在 "batch" 階段。
+    """
+    import numpy as np
+
+    from 查表獲得最近的水氣壓 import TEMP_VAPOR_TABLE, get_vapor_lookup
+
+    if batch_profiles < 1:
+        raise ValueError("batch_profiles 必須大於 0")
+    table = TEMP_VAPOR_TABLE if table is None else table
+    lookup = get_vapor_lookup(table)
+    with ProfileStore(path) as store:
+        columns = store.arrays()
+        try:
+            for start, stop, n_levels in _iter_runs(np.diff(columns[0]), batch_profiles):
+                results = _vectorized_range(columns, start, stop, n_levels, table, lookup, stats)
+                for i, (total_integral, W_p) in enumerate(results, start):
+                    if stats is not None:
+                        stats.finish_call()
+                    yield store.key(i), PWOutput(total_integral=total_integral, W_p=W_p)
+        finally:
+            # 先釋放指向對映檔案的陣列，store 才能關閉
+            columns = None
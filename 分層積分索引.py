@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分層積分索引.py
+
+同一條剖面要計算許多壓力層的可降水量時 (例如 地面~850、850~700、700~500、
+每 50 hPa 的滑動視窗 ...)，先建立一次 PWProfile：
+   - 每筆 (p, c) 只做一次查表內插與比濕度計算
+   - 依壓力由小到大預先算好梯形面積的累積和 (prefix sum)
+之後任何 (h1, h2) 的查詢只需兩次二分搜尋與一次相減，成本為 O(log n)。
+
+結果與 integrate_Hs_over_p 的逐段積分相同 (只差浮點數捨入誤差)。
+"""
+from bisect import bisect_right
+
+from 比濕度 import calc_mixing_ratio
+from 查表獲得最近的水氣壓 import TEMP_VAPOR_TABLE, get_vapor_lookup
+from 梯形積分 import sort_by_pressure_desc
+
+
+class PWProfile:
+    """
+    單一剖面的分層積分索引。
+    - pressures: 由小到大排列的壓力 (hPa)
+    - H_s: 對應的比濕度 (g/kg)
+    - cumulative: cumulative[i] 為從 pressures[0] 積分到 pressures[i] 的面積 (H_s × Δp)
+    - data_details: List[ (p, c, e, H_s) ]，順序與輸入相同
+    超出剖面範圍的部分沒有資料，不計入面積 (與 integrate_Hs_over_p 相同)。
+    """
+    def __init__(self, data_points, table=TEMP_VAPOR_TABLE):
+        if len(data_points) < 2:
+            raise ValueError("至少需要 2 筆 (p, c) 資料才能進行積分")
+
+        # 1. (p, c) -> (p, c, e, H_s)
+        lookup = get_vapor_lookup(table)
+        self.data_details = []
+        for (p_i, c_i) in data_points:
+            e_i = lookup.lookup(c_i)
+            self.data_details.append((p_i, c_i, e_i, calc_mixing_ratio(e_i, p_i)))
+
+        # 2. 依壓力由小到大排列 (重複壓力的相鄰關係與 integrate_Hs_over_p 相同)，
+        #    並算出每段斜率與累積面積
+        rows = sort_by_pressure_desc([(p, hs) for (p, c, e, hs) in self.data_details])[::-1]
+        self.pressures = [float(p) for p, _ in rows]
+        self.H_s = [float(hs) for _, hs in rows]
+        self.slopes = []
+        self.cumulative = [0.0]
+        for p_a, p_b, hs_a, hs_b in zip(self.pressures, self.pressures[1:], self.H_s, self.H_s[1:]):
+            dp = p_b - p_a
+            # 重複壓力的分段沒有寬度，也就沒有面積
+            self.slopes.append((hs_b - hs_a) / dp if dp > 0 else 0.0)
+            self.cumulative.append(self.cumulative[-1] + (hs_a + hs_b) / 2.0 * dp)
+        self.p_min = self.pressures[0]
+        self.p_max = self.pressures[-1]
+
+    def __len__(self):
+        return len(self.pressures)
+
+    @classmethod
+    def from_input(cls, input_data, table=TEMP_VAPOR_TABLE):
+        """
+        由 PWInput 建立索引 (只使用 data_points，h1, h2 留到查詢時再給)。
+        """
+        return cls(input_data.data_points, table)
+
+    def cumulative_at(self, p):
+        """
+        從剖面最低壓力積分到壓力 p 的面積；p 超出剖面範圍時取邊界值。
+        """
+        if p <= self.p_min:
+            return 0.0
+        if p >= self.p_max:
+            return self.cumulative[-1]
+
+        i = bisect_right(self.pressures, p) - 1
+        p_i = self.pressures[i]
+        hs_i = self.H_s[i]
+        hs_p = hs_i + self.slopes[i] * (p - p_i)
+        return self.cumulative[i] + (hs_i + hs_p) / 2.0 * (p - p_i)
+
+    def total_integral(self, h1, h2):
+        """
+        [h1, h2] 間的 ∫(H_s dP)，h1, h2 的順序不拘。
+        """
+        return abs(self.cumulative_at(h1) - self.cumulative_at(h2))
+
+    def W_p(self, h1, h2):
+        """
+        [h1, h2] 間的可降水量 (mm) = 0.01 * total_integral。
+        """
+        return 0.01 * self.total_integral(h1, h2)
+
+    def layers(self, bounds):
+        """
+        依序計算相鄰邊界之間各層的可降水量。
+        例如 bounds=[1000, 850, 700, 500] 回傳 3 層的 W_p 列表。
+        """
+        cum = [self.cumulative_at(p) for p in bounds]
+        return [0.01 * abs(a - b) for a, b in zip(cum, cum[1:])]
+
+    def W_p_array(self, h1, h2):
+        """
+        陣列版的 W_p，一次查詢多個 (h1, h2)。
+        h1, h2: 純量或任意形狀 (可互相廣播) 的陣列 (hPa)
+        回傳: 廣播後形狀的 NumPy 陣列 (mm)
+        """
+        import numpy as np
+
+        return 0.01 * np.abs(self.cumulative_array(h1) - self.cumulative_array(h2))
+
+    def cumulative_array(self, p):
+        """
+        陣列版的 cumulative_at。
+        """
+        import numpy as np
+
+        if not hasattr(self, "_arrays"):
+            self._arrays = (
+                np.array(self.pressures),
+                np.array(self.H_s),
+                np.array(self.slopes + [0.0]),
+                np.array(self.cumulative),
+            )
+        table_p, table_hs, table_slope, table_cum = self._arrays
+
+        p = np.clip(np.asarray(p, dtype=float), self.p_min, self.p_max)
+        i = np.searchsorted(table_p, p, side="right") - 1
+        dp = p - table_p[i]
+        hs_p = table_hs[i] + table_slope[i] * dp
+        return table_cum[i] + (table_hs[i] + hs_p) / 2.0 * dp
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成剖面.py
+
+以固定亂數種子產生可重現的合成剖面，供效能測試 (效能測試.py) 與後端門檻校正 (後端選擇.calibrate) 使用。
+壓力由 1050 hPa 遞減到 10 hPa，溫度大致依標準大氣遞減並加上隨機擾動。
+
+    profiles = list(synthetic_profiles(1000, 50))      # 1000 條 50 層的 PWInput
+"""
+import math
+import random
+
+from 封裝過後的資料格式 import PWInput
+
+SEED = 20240101
+
+
+def synthetic_profile(n_levels, rng):
+    """
+    產生一條 n_levels 層的剖面 list of (p, c)，rng 為 random.Random。
+    """
+    if n_levels < 2:
+        raise ValueError("至少需要 2 層")
+    surface_t = rng.uniform(5.0, 35.0)
+    points = []
+    for i in range(n_levels):
+        p = 1050.0 - (1040.0 * i) / (n_levels - 1)
+        # 溫度約與 ln(p) 成正比遞減，平流層附近不再下降
+        c = max(surface_t - 45.0 * math.log(1050.0 / p), -75.0) + rng.gauss(0.0, 0.5)
+        points.append((p, c))
+    return points
+
+
+def synthetic_profiles(n_profiles, n_levels, seed=SEED):
+    """
+    產生 n_profiles 條 PWInput (generator)，積分區間為 1000 ~ 300 hPa。
+    """
+    rng = random.Random(seed)
+    for _ in range(n_profiles):
+        yield PWInput(data_points=synthetic_profile(n_levels, rng), h1=1000.0, h2=300.0)
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+向量化計算.py
+
+以 NumPy 陣列一次處理整條 (或多條) 剖面的可降水量計算，
+結果與 主要計算程式.compute_precipitable_water 的逐點計算相同：
+   - interpolate_vapor_pressure_array: 陣列版的查表內插 (超出範圍取邊界值)
+   - integrate_Hs_over_p_array: 陣列版的 [h1, h2] 截斷梯形積分
+   - compute_precipitable_water_batch: 整合上述步驟，回傳 PWBatchOutput
+   - compute_precipitable_water_grid: 模式網格 (氣壓層, 緯度, 經度) 的 W_p 分布圖，逐區塊計算
+
+批次與網格計算都可以用 scheme 選擇積分方法 (見 積分方法.SCHEMES)，預設為梯形積分；
+批次計算以 qc=True 在同一條陣列路徑上處理缺值與異常層 (見 品質控制)。
+
+precision="float32" 時溫度、e、H_s 與輸出都以 float32 儲存 (記憶體與頻寬減半)，
+壓力維持輸入的精度 (要省記憶體可直接傳入 float32 的壓力)，積分的加總仍以 float64 進行；
+對相同的輸入，W_p 與 float64 路徑的差距不超過 FLOAT32_MAX_RELATIVE_ERROR * W_p
+(梯形與 ln p 梯形積分，權重皆為非負，每層的相對誤差直接成為總和的相對誤差上限)。
+
+輸入可以是一條剖面 (形狀 (n,)) 或多條剖面 (形狀 (m, n))；
+壓力也可以只給一條 (n,) 向量，由所有剖面共用 (例如模式的固定氣壓層)。
+"""
+import numpy as np
+
+from 封裝過後的資料格式 import PWBatchOutput
+from 比濕度 import calc_mixing_ratio
+from 查表獲得最近的水氣壓 import TEMP_VAPOR_TABLE, get_vapor_lookup
+from 積分方法 import LINEAR_SCHEMES, check_scheme, integrate_scheme, level_weights
+from 品質控制 import clean_profiles
+
+# 可選的儲存精度
+PRECISIONS = {"float64": np.float64, "float32": np.float32}
+# float32 模式下 W_p 相對於 float64 路徑的誤差上限 (float32 的 ulp 為 2^-24 ≈ 6e-8)：
+# 溫度捨入 (|T| <= 128°C 時 <= 3.8e-6°C) 乘上 d ln e / dT (<= 0.3/°C) 約 1.1e-6，
+# 查表內插約 3 ulp、比濕度 2 ulp、輸出 1 ulp，合計約 1.5e-6
+FLOAT32_MAX_RELATIVE_ERROR = 2e-6
+
+
+def precision_dtype(precision):
+    """
+    "float64" / "float32" -> 對應的 NumPy 型別。
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision 必須是 {' 或 '.join(PRECISIONS)}")
+    return PRECISIONS[precision]
+
+
+def interpolate_vapor_pressure_array(temps, table=TEMP_VAPOR_TABLE, dtype=float):
+    """
+    陣列版的 interpolate_vapor_pressure。
+    temps: 任意形狀的溫度陣列 (°C)
+    table: 對照表或已編譯好的查表物件
+    dtype: 計算與回傳的浮點型別
+    回傳: 相同形狀的飽和水氣壓陣列 (hPa)，超出表格範圍時取邊界值
+    """
+    return get_vapor_lookup(table).lookup_array(temps, dtype=dtype)
+
+
+def integrate_Hs_over_p_array(pressures, hs, h1, h2):
+    """
+    陣列版的 integrate_Hs_over_p，只回傳積分總面積。
+
+    參數:
+        pressures: 壓力陣列 (hPa)，形狀 (n,) 或 (m, n)，不需事先排序
+        hs: 比濕度陣列 (g/kg)，形狀需與 pressures 相同
+        h1, h2: 積分區間的上下界限 (hPa)，可為純量或長度 m 的陣列
+
+    回傳:
+        total_integral: ∫(H_s dP)，1 維輸入回傳純量陣列，2 維輸入回傳形狀 (m,)
+    """
+    p = np.asarray(pressures, dtype=float)
+    hs = np.asarray(hs, dtype=float)
+
+    # 每條剖面的積分上下限 (加一維以便與各分段廣播)
+    p_upper = np.maximum(h1, h2)[..., np.newaxis]
+    p_lower = np.minimum(h1, h2)[..., np.newaxis]
+
+    # 依壓力由大到小做 stable 排序後反轉成由小到大：
+    # 重複壓力的相鄰關係與 梯形積分.sort_by_pressure_desc 相同
+    order = np.argsort(-p, axis=-1, kind="stable")[..., ::-1]
+    p = np.take_along_axis(p, order, axis=-1)
+    hs = np.take_along_axis(hs, order, axis=-1)
+
+    # 相鄰兩點構成的分段
+    p_a, p_b = p[..., :-1], p[..., 1:]
+    hs_a, hs_b = hs[..., :-1], hs[..., 1:]
+
+    # 每段與 [p_lower, p_upper] 的交集
+    seg_lower = np.maximum(p_a, p_lower)
+    seg_upper = np.minimum(p_b, p_upper)
+    dp = seg_upper - seg_lower
+    overlap = dp > 0
+
+    # 交集端點的比濕度：與原資料點重合時直接使用原值，否則線性內插
+    width = p_b - p_a
+    slope = np.divide(hs_b - hs_a, width, out=np.zeros_like(width), where=width != 0)
+    hs_l = np.where(seg_lower == p_a, hs_a, hs_a + slope * (seg_lower - p_a))
+    hs_u = np.where(seg_upper == p_b, hs_b, hs_a + slope * (seg_upper - p_a))
+
+    area = np.where(overlap, (hs_l + hs_u) / 2.0 * dp, 0.0)
+    return area.sum(axis=-1)
+
+
+def compute_precipitable_water_batch(pressures, temperatures, h1, h2, table=TEMP_VAPOR_TABLE,
+                                     scheme="trapezoid", error=False, gradient=False,
+                                     qc=False, mask=None, gaps="skip", precision="float64"):
+    """
+    陣列版的 compute_precipitable_water。
+
+    參數:
+        pressures: 壓力 (hPa)，形狀 (n,) 或 (m, n)；(n,) 時由所有剖面共用
+        temperatures: 溫度 (°C)，形狀 (n,) 或 (m, n)
+        h1, h2: 積分區間的上下界限 (hPa)，可為純量或長度 m 的陣列
+        table: 溫度與飽和水氣壓對照表，或已編譯好的查表物件
+        scheme: 積分方法 (積分方法.SCHEMES 之一)
+        error: 是否一併估計誤差 (存於 W_p_error)
+        gradient: 是否一併計算每層溫度的敏感度 ∂W_p/∂T (存於 dW_dT，exact_e 不支援)
+        qc: 是否先做品質控制 (品質控制.clean_profiles)，結果存於 qc；給定 mask 時自動啟用
+        mask: 與 temperatures 同形狀的布林陣列，True 表示該層溫度缺值
+        gaps: 缺少溫度的層 "skip" (略過) 或 "interpolate" (內插)
+        precision: "float64" 或 "float32" (輸入、e、H_s 與輸出的儲存精度，加總一律為 float64)
+
+    回傳:
+        PWBatchOutput，其中 e, H_s 與 temperatures 同形狀，
+        total_integral, W_p (以及 W_p_error) 為每條剖面一個值
+    """
+    check_scheme(scheme)
+    if gradient and scheme not in LINEAR_SCHEMES:
+        raise ValueError(f"{scheme!r} 不支援 gradient")
+    dtype = precision_dtype(precision)
+    report = None
+    if qc or mask is not None or np.ma.isMaskedArray(temperatures):
+        report = clean_profiles(pressures, temperatures, mask=mask, gaps=gaps)
+        pressures, temperatures = report.pressures, report.temperatures
+    c = np.asarray(temperatures, dtype=dtype)
+    # 壓力維持輸入的精度：積分權重對壓力的捨入很敏感 (誤差約 ulp(p) / Δp)
+    p = np.asarray(pressures)
+    if p.dtype.kind != "f":
+        p = p.astype(float)
+    p = np.broadcast_to(p, c.shape)
+    if p.shape[-1] < 2:
+        raise ValueError("至少需要 2 筆 (p, c) 資料才能進行積分")
+
+    # 1. (p, c) -> (e, H_s)
+    e = interpolate_vapor_pressure_array(c, table, dtype=dtype)
+    hs = calc_mixing_ratio(e, p.astype(dtype, copy=False))
+
+    # 2. 積分 (預設的梯形積分不需要誤差估計時走原本的路徑)
+    estimate = None
+    if scheme == "trapezoid" and not error:
+        total_integral = integrate_Hs_over_p_array(p, hs, h1, h2)
+    else:
+        total_integral, estimate = integrate_scheme(p, c, h1, h2, scheme, table, error=error, hs=hs)
+
+    # 有效層少於 2 層的剖面無法積分
+    if report is not None:
+        usable = report.levels >= 2
+        total_integral = np.where(usable, total_integral, np.nan)
+        if estimate is not None:
+            estimate = np.where(usable, estimate, np.nan)
+
+    # 3. W_p = 0.01 * total_integral
+    total_integral = np.asarray(total_integral, dtype=dtype)[()]
+    W_p = 0.01 * total_integral
+    W_p_error = None if estimate is None else np.asarray(0.01 * estimate, dtype=dtype)[()]
+
+    # 4. ∂W_p/∂T = 0.01 * weights * 622 * (de/dT) / p (每層權重與積分使用相同的方法)
+    dW_dT = None
+    if gradient:
+        de_dT = get_vapor_lookup(table).derivative_array(c)
+        dW_dT = np.asarray(0.01 * level_weights(p, h1, h2, scheme) * calc_mixing_ratio(de_dT, p), dtype=dtype)
+
+    return PWBatchOutput(e=e, H_s=hs, total_integral=total_integral, W_p=W_p,
+                         W_p_error=W_p_error, dW_dT=dW_dT, qc=report)
+
+
+def trapezoid_weights(pressures, h1, h2):
+    """
+    固定氣壓層的積分權重：對任意比濕度剖面 hs，
+    integrate_Hs_over_p_array(pressures, hs, h1, h2) == weights @ hs (只差捨入誤差)。
+
+    參數:
+        pressures: 壓力向量 (hPa)，形狀 (n,)，不需事先排序
+        h1, h2: 積分區間的上下界限 (hPa)，純量
+
+    回傳:
+        weights: 形狀 (n,)，順序與 pressures 相同
+    """
+    p = np.asarray(pressures, dtype=float)
+    p_upper = max(h1, h2)
+    p_lower = min(h1, h2)
+
+    # 重複壓力的相鄰關係與 integrate_Hs_over_p_array 相同
+    order = np.argsort(-p, kind="stable")[::-1]
+    p_sorted = p[order]
+    p_a, p_b = p_sorted[:-1], p_sorted[1:]
+
+    # 每段與 [p_lower, p_upper] 的交集，以及交集端點在分段內的相對位置 t
+    seg_lower = np.maximum(p_a, p_lower)
+    seg_upper = np.minimum(p_b, p_upper)
+    dp = np.where(seg_upper > seg_lower, seg_upper - seg_lower, 0.0)
+    width = p_b - p_a
+    t_l = np.divide(seg_lower - p_a, width, out=np.zeros_like(width), where=width != 0)
+    t_u = np.divide(seg_upper - p_a, width, out=np.zeros_like(width), where=width != 0)
+
+    # 梯形面積 (hs_l + hs_u) / 2 * dp 拆成分段兩端點 hs_a, hs_b 的係數
+    weights_sorted = np.zeros_like(p_sorted)
+    weights_sorted[:-1] += dp * ((1.0 - t_l) + (1.0 - t_u)) / 2.0
+    weights_sorted[1:] += dp * (t_l + t_u) / 2.0
+
+    weights = np.empty_like(weights_sorted)
+    weights[order] = weights_sorted
+    return weights
+
+
+def scheme_weights(pressures, h1, h2, scheme="trapezoid"):
+    """
+    固定氣壓層在指定積分方法下的每層權重；梯形積分使用 trapezoid_weights。
+    """
+    if scheme not in LINEAR_SCHEMES:
+        check_scheme(scheme)
+        raise ValueError(f"{scheme!r} 無法化為每層權重，請改用 compute_precipitable_water_batch")
+    if scheme == "trapezoid":
+        return trapezoid_weights(pressures, h1, h2)
+    return level_weights(pressures, h1, h2, scheme)
+
+
+def compute_precipitable_water_grid(pressures, temperatures, h1, h2, table=TEMP_VAPOR_TABLE,
+                                    level_axis=0, block_size=65536, scheme="trapezoid",
+                                    precision="float64"):
+    """
+    模式網格版的可降水量：所有格點共用同一組氣壓層，一次算出整張 W_p 分布圖。
+
+    因為氣壓層固定，積分可先化為每層一個權重 (scheme_weights)，
+    W_p = 0.01 * Σ_k weights_k * 622 * e_k / p_k，
+    之後每次只取 block_size 個格點的溫度做查表與加權總和，記憶體用量與網格大小無關，
+    temperatures 也可以是 np.load(..., mmap_mode="r") 或 np.memmap 等記憶體對映陣列。
+
+    參數:
+        pressures: 氣壓層 (hPa)，形狀 (n,)
+        temperatures: 溫度 (°C)，在 level_axis 軸上長度為 n，例如 (n, ny, nx)
+        h1, h2: 積分區間的上下界限 (hPa)，純量
+        table: 溫度與飽和水氣壓對照表，或已編譯好的查表物件
+        level_axis: temperatures 中代表氣壓層的軸
+        block_size: 每次處理的格點數
+        scheme: 可化為每層權重的積分方法 (積分方法.LINEAR_SCHEMES 之一)
+        precision: "float64" 或 "float32"；float32 時查表在 float32 進行，
+                   加權總和仍為 float64，回傳 float32 的 W_p
+
+    回傳:
+        W_p: 去掉 level_axis 之後形狀的陣列 (mm)，例如 (ny, nx)
+    """
+    p = np.asarray(pressures, dtype=float)
+    if p.ndim != 1 or p.shape[0] < 2:
+        raise ValueError("pressures 必須是長度至少為 2 的一維陣列")
+    if block_size < 1:
+        raise ValueError("block_size 必須大於 0")
+    dtype = precision_dtype(precision)
+
+    level_axis = level_axis % temperatures.ndim
+    n = temperatures.shape[level_axis]
+    if n != p.shape[0]:
+        raise ValueError("temperatures 的氣壓層數與 pressures 不符")
+    grid_shape = temperatures.shape[:level_axis] + temperatures.shape[level_axis + 1:]
+
+    # 將溫度整理成 (n, 格點數)；氣壓層在第一軸或最後一軸時只是 view，不會複製資料
+    if level_axis == 0:
+        columns = temperatures.reshape(n, -1)
+    elif level_axis == temperatures.ndim - 1:
+        columns = temperatures.reshape(-1, n).T
+    else:
+        columns = np.moveaxis(temperatures, level_axis, 0).reshape(n, -1)
+
+    lookup = get_vapor_lookup(table)
+    # 0.01 * 622 * weights / p：對 e 的加權係數
+    coef = 0.01 * calc_mixing_ratio(scheme_weights(p, h1, h2, scheme), p)
+
+    ncols = columns.shape[1]
+    W_p = np.empty(ncols, dtype=dtype)
+    for start in range(0, ncols, block_size):
+        stop = min(start + block_size, ncols)
+        e = lookup.lookup_array(columns[:, start:stop], dtype=dtype)
+        W_p[start:stop] = coef @ e
+    return W_p.reshape(grid_shape)
+
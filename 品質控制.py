@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+品質控制.py
+
+實際探空資料中的缺值 (NaN)、重複的氣壓層、順序異常與超絕熱的雜訊，
+全部以陣列運算處理，不需先用 Python 逐筆清理：
+   - clean_profiles: 標記並整理 (n,) 或 (m, n) 的剖面，回傳 PWQualityReport
+   - 向量化計算.compute_precipitable_water_batch(..., qc=True) 直接使用整理後的剖面計算
+
+處理順序：
+   1. 缺值：壓力或溫度為 NaN / 被 mask / 不合理 (壓力 <= 0，溫度超出 [T_MIN, T_MAX])
+   2. 順序異常：依相鄰層多數的方向判斷剖面方向，前後有效層彼此順序正確、本層卻與其中一側不符的層 (預設捨棄)；
+      反覆檢查，連續數層的雜訊會逐層剔除，其後正常的層不受影響
+   3. 重複壓力：合併為一層，溫度取平均
+   4. 超絕熱：由下往上，位溫比下方最近一個「保留的」層低超過門檻 (K) 的層，溫度視為缺值；
+      若該層與再下方一層 (或上方一層) 一致，則改為剔除夾在中間的過暖層
+   5. 缺少溫度的層：gaps="skip" 直接略過 (積分跨過缺口)，
+      gaps="interpolate" 以上下最近的有效層對 ln p 線性內插 (剖面頭尾的缺口仍略過)
+"""
+import numpy as np
+
+from 封裝過後的資料格式 import PWQualityReport
+
+# 每一層的品質旗標 (位元)
+QC_MISSING = 1
+QC_NONMONOTONIC = 2
+QC_DUPLICATE = 4
+QC_SUPERADIABATIC = 8
+QC_INTERPOLATED = 16
+QC_FLAGS = {
+    "missing": QC_MISSING,
+    "nonmonotonic": QC_NONMONOTONIC,
+    "duplicate": QC_DUPLICATE,
+    "superadiabatic": QC_SUPERADIABATIC,
+    "interpolated": QC_INTERPOLATED,
+}
+
+# 合理的溫度範圍 (°C)
+T_MIN = -120.0
+T_MAX = 70.0
+# 位溫比下方的層低超過此值 (K) 時視為超絕熱雜訊
+SUPERADIABATIC_THRESHOLD = 5.0
+# R_d / c_p
+KAPPA = 0.2857
+GAP_MODES = ("skip", "interpolate")
+
+
+def _take(a, order):
+    return np.take_along_axis(a, order, axis=1)
+
+
+def _shift(a, k):
+    # a[:, j - k] (k > 0 往右移、k < 0 往左移)，移出範圍的位置為 NaN
+    out = np.full(a.shape, np.nan)
+    if k > 0:
+        out[:, k:] = a[:, :-k]
+    else:
+        out[:, :k] = a[:, -k:]
+    return out
+
+
+def _isolated_glitches(q, ok):
+    """
+    q 應遞減 (相等為重複層，不算異常)。只看有效層 (ok) 之間的相鄰關係：
+    前後兩層彼此順序正確、但本層與任一側順序不符的層為異常層；頭尾層只看單側。
+    每次剔除後重新檢查，直到沒有新的異常層。
+    """
+    m, n = q.shape
+    rows = np.arange(m)[:, np.newaxis]
+    cols = np.arange(n)
+    glitch = np.zeros((m, n), dtype=bool)
+    while True:
+        keep = ok & ~glitch
+        # 保留的層移到前面，相鄰的有效層就是陣列中相鄰的元素
+        order = np.argsort(~keep, axis=1, kind="stable")
+        qs = np.where(cols < keep.sum(axis=1)[:, np.newaxis], _take(q, order), np.nan)
+        prev, prev2 = _shift(qs, 1), _shift(qs, 2)
+        nxt, nxt2 = _shift(qs, -1), _shift(qs, -2)
+        with np.errstate(invalid="ignore"):
+            inner = (prev > nxt) & ((qs > prev) | (qs < nxt))
+            head = np.isnan(prev) & (nxt > nxt2) & (qs < nxt)
+            tail = np.isnan(nxt) & (prev > prev2) & (qs > prev)
+        suspect = inner | head | tail
+        # 相鄰兩層互相判定為異常時 (例如兩層對調)，這一輪只剔除前一層，下一輪再重新檢查
+        new = suspect.copy()
+        new[:, 1:] &= ~suspect[:, :-1]
+        if not new.any():
+            return glitch
+        glitch[rows, order] |= new
+
+
+def clean_profiles(pressures, temperatures, mask=None, gaps="skip",
+                   superadiabatic=SUPERADIABATIC_THRESHOLD, drop_nonmonotonic=True):
+    """
+    品質控制並整理剖面。
+
+    參數:
+        pressures: 壓力 (hPa)，形狀 (n,) 或 (m, n)；(n,) 時由所有剖面共用，可為 masked array
+        temperatures: 溫度 (°C)，形狀 (n,) 或 (m, n)，可為 masked array
+        mask: 與 temperatures 同形狀的布林陣列，True 表示該層溫度缺值
+        gaps: "skip" 或 "interpolate"
+        superadiabatic: 超絕熱的位溫門檻 (K)，None 表示不檢查
+        drop_nonmonotonic: 是否捨棄順序異常的層 (False 時只標記，仍依壓力排序後使用)
+
+    回傳:
+        PWQualityReport，形狀與輸入相同 ((n,) 輸入時 levels 與各計數為純量)
+    """
+    if gaps not in GAP_MODES:
+        raise ValueError(f"gaps 必須是 {' 或 '.join(GAP_MODES)}")
+
+    # masked array 的遮罩併入缺值
+    if np.ma.isMaskedArray(temperatures):
+        extra = np.ma.getmaskarray(temperatures)
+        mask = extra if mask is None else (np.asarray(mask, dtype=bool) | extra)
+        temperatures = temperatures.filled(np.nan)
+    if np.ma.isMaskedArray(pressures):
+        pressures = pressures.astype(float).filled(np.nan)
+
+    single = np.ndim(temperatures) == 1
+    c = np.array(temperatures, dtype=float, ndmin=2)
+    m, n = c.shape
+    p = np.array(np.broadcast_to(np.asarray(pressures, dtype=float), c.shape))
+    rows = np.arange(m)[:, np.newaxis]
+    row_index = np.broadcast_to(rows, (m, n))
+    cols = np.arange(n)
+    flags = np.zeros((m, n), dtype=np.uint8)
+
+    # 1. 缺值
+    p_ok = np.isfinite(p) & (p > 0)
+    c_ok = np.isfinite(c) & (c >= T_MIN) & (c <= T_MAX)
+    if mask is not None:
+        c_ok &= ~np.broadcast_to(np.asarray(mask, dtype=bool), (m, n))
+    flags[~(p_ok & c_ok)] |= QC_MISSING
+
+    # 2. 順序異常：以相鄰有效層多數的方向決定剖面方向，q = ±p 應遞減
+    order = np.argsort(~p_ok, axis=1, kind="stable")
+    step = np.diff(np.where(cols < p_ok.sum(axis=1)[:, np.newaxis], _take(p, order), np.nan), axis=1)
+    direction = np.where((step < 0).sum(axis=1) >= (step > 0).sum(axis=1), 1.0, -1.0)[:, np.newaxis]
+    glitch = _isolated_glitches(p * direction, p_ok)
+    flags[glitch] |= QC_NONMONOTONIC
+    if drop_nonmonotonic:
+        p_ok &= ~glitch
+
+    # 3. 依壓力遞減排序 (可用的層在前)，重複壓力合併為一組
+    order = np.argsort(np.where(p_ok, -p, np.inf), axis=1, kind="stable")
+    p_sorted = _take(p, order)
+    c_sorted = _take(np.where(c_ok, c, np.nan), order)
+    ok_sorted = _take(p_ok, order)
+    duplicate = np.zeros((m, n), dtype=bool)
+    duplicate[:, 1:] = ok_sorted[:, 1:] & ok_sorted[:, :-1] & (p_sorted[:, 1:] == p_sorted[:, :-1])
+    flags[row_index[duplicate], order[duplicate]] |= QC_DUPLICATE
+
+    run = np.cumsum(~duplicate, axis=1) - 1
+    has_c = np.isfinite(c_sorted)
+    c_sum = np.zeros((m, n))
+    c_count = np.zeros((m, n))
+    np.add.at(c_sum, (row_index, run), np.where(has_c, c_sorted, 0.0))
+    np.add.at(c_count, (row_index, run), has_c)
+    P = np.full((m, n), np.nan)
+    P[row_index, run] = p_sorted
+    OK = np.zeros((m, n), dtype=bool)
+    OK[row_index, run] = ok_sorted
+    OK &= cols < (run[:, -1] + 1)[:, np.newaxis]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        C = np.where(c_count > 0, c_sum / c_count, np.nan)
+    HAVE = OK & np.isfinite(C)
+    group_flags = np.zeros((m, n), dtype=np.uint8)
+
+    # 4. 超絕熱：由下往上逐層與下方最近一個保留的層比較位溫 (每層一次向量運算，涵蓋所有剖面)
+    if superadiabatic is not None:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            theta = np.where(HAVE, (C + 273.15) * (1000.0 / P) ** KAPPA, np.nan)
+        # 上方最近的有溫度層的位溫 (判斷誰是異常層用)
+        above = np.minimum.accumulate(np.where(HAVE, cols, n)[:, ::-1], axis=1)[:, ::-1]
+        above = np.concatenate([above[:, 1:], np.full((m, 1), n)], axis=1)
+        theta_above = np.where(above < n, theta[rows, np.minimum(above, n - 1)], np.nan)
+
+        unstable = np.zeros((m, n), dtype=bool)
+        ref = np.full(m, np.nan)          # 下方最近保留層的位溫
+        ref_index = np.zeros(m, dtype=int)
+        ref_below = np.full(m, np.nan)    # 再下方一個保留層的位溫
+        with np.errstate(invalid="ignore"):
+            for j in range(n):
+                t = theta[:, j]
+                have = HAVE[:, j]
+                drop = have & (t < ref - superadiabatic)
+                # 本層與再下方一層 (沒有時與上方一層) 一致：過暖的是下方保留層
+                agrees = np.where(np.isnan(ref_below),
+                                  theta_above[:, j] >= t - superadiabatic,
+                                  t >= ref_below - superadiabatic)
+                warm = drop & agrees
+                unstable[warm, ref_index[warm]] = True
+                unstable[drop & ~warm, j] = True
+                accept = have & ~drop
+                ref_below = np.where(accept, ref, ref_below)
+                ref = np.where(accept | warm, t, ref)
+                ref_index = np.where(accept | warm, j, ref_index)
+        group_flags[unstable] |= QC_SUPERADIABATIC
+        HAVE &= ~unstable
+
+    # 5. 缺少溫度的層：以上下最近的有溫度層對 ln p 內插
+    if gaps == "interpolate":
+        upper = np.maximum.accumulate(np.where(HAVE, cols, -1), axis=1)
+        lower = np.minimum.accumulate(np.where(HAVE, cols, n)[:, ::-1], axis=1)[:, ::-1]
+        fill = OK & ~HAVE & (upper >= 0) & (lower < n)
+        i0 = np.clip(upper, 0, n - 1)
+        i1 = np.clip(lower, 0, n - 1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            log_p = np.log(P)
+            t = (log_p - log_p[rows, i0]) / (log_p[rows, i1] - log_p[rows, i0])
+            C = np.where(fill, C[rows, i0] + t * (C[rows, i1] - C[rows, i0]), C)
+        group_flags[fill] |= QC_INTERPOLATED
+        HAVE |= fill
+
+    # 合併組的旗標回填到每個原始層
+    member_flags = np.where(ok_sorted, group_flags[row_index, run], 0).astype(np.uint8)
+    flags[row_index, order] |= member_flags
+
+    # 6. 有效層移到前面，其後以最後一個有效層補齊 (Δp = 0)
+    order = np.argsort(~HAVE, axis=1, kind="stable")
+    P = _take(P, order)
+    C = _take(C, order)
+    levels = HAVE.sum(axis=1)
+    last = np.maximum(levels - 1, 0)[:, np.newaxis]
+    pad = cols >= levels[:, np.newaxis]
+    P = np.where(pad, _take(P, last), P)
+    C = np.where(pad, _take(C, last), C)
+    empty = levels == 0
+    P[empty] = np.nan
+    C[empty] = np.nan
+
+    counts = {name: ((flags & bit) != 0).sum(axis=1) for name, bit in QC_FLAGS.items()}
+    if single:
+        return PWQualityReport(
+            pressures=P[0], temperatures=C[0], levels=levels[0], flags=flags[0],
+            counts={name: value[0] for name, value in counts.items()},
+        )
+    return PWQualityReport(pressures=P, temperatures=C, levels=levels, flags=flags, counts=counts)
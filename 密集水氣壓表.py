@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+密集水氣壓表.py
+
+由飽和水氣壓公式產生「等間距」的密集對照表 (例如 -90°C ~ +60°C，每 0.01°C 一筆)，
+查表時直接以 (temp - t_min) / step 算出索引，不需要搜尋。
+
+   - magnus / goff_gratch: 飽和水氣壓公式 (對水面，單位 hPa)
+   - UniformVaporPressureLookup: 等間距查表物件，介面與 VaporPressureLookup 相同，
+     可直接當作 table 參數傳給 interpolate_vapor_pressure 或批次計算
+   - get_dense_vapor_lookup: 產生 (或從磁碟快取載入) 密集對照表
+
+第一次產生的表格會以二進位檔存到快取目錄 (預設 ~/.cache/precipitable_water，
+可用環境變數 PW_CACHE_DIR 指定)，之後的程式啟動直接載入，不必重新計算。
+"""
+import math
+import os
+from array import array
+from functools import lru_cache
+
+
+# ---------------------------------------------
+# 飽和水氣壓公式
+# ---------------------------------------------
+
+def magnus(temp):
+    """
+    Magnus 公式 (Alduchov & Eskridge, 1996)。
+    temp: 溫度 (°C)
+    回傳: 飽和水氣壓 (hPa)
+    """
+    return 6.1094 * math.exp(17.625 * temp / (temp + 243.04))
+
+
+def goff_gratch(temp):
+    """
+    Goff-Gratch 公式 (對水面)。
+    temp: 溫度 (°C)
+    回傳: 飽和水氣壓 (hPa)
+    """
+    t = temp + 273.15
+    ts = 373.16
+    log10_e = (
+        -7.90298 * (ts / t - 1.0)
+        + 5.02808 * math.log10(ts / t)
+        - 1.3816e-7 * (10.0 ** (11.344 * (1.0 - t / ts)) - 1.0)
+        + 8.1328e-3 * (10.0 ** (-3.49149 * (ts / t - 1.0)) - 1.0)
+        + math.log10(1013.246)
+    )
+    return 10.0 ** log10_e
+
+
+VAPOR_FORMULAS = {
+    "magnus": magnus,
+    "goff_gratch": goff_gratch,
+}
+
+
+# ---------------------------------------------
+# 等間距查表物件
+# ---------------------------------------------
+
+class UniformVaporPressureLookup:
+    """
+    等間距的飽和水氣壓查表物件。
+    - t_min, step: 第 i 筆資料對應溫度 t_min + i * step
+    - values: 各溫度的飽和水氣壓 (hPa)
+    查表為直接索引 + 線性內插，成本為 O(1)；超出範圍時回傳邊界值。
+    derivative / derivative_array 回傳 de/dT (所在區段的斜率)。
+    """
+    def __init__(self, t_min, step, values):
+        if len(values) < 2:
+            raise ValueError("對照表至少需要 2 筆資料")
+        if step <= 0:
+            raise ValueError("step 必須大於 0")
+        self.t_min = float(t_min)
+        self.step = float(step)
+        self.values = values if isinstance(values, array) else array("d", values)
+        self.t_max = self.t_min + self.step * (len(self.values) - 1)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __call__(self, temp):
+        return self.lookup(temp)
+
+    def lookup(self, temp):
+        """
+        根據溫度 temp (°C) 回傳飽和水氣壓 (hPa)。
+        """
+        values = self.values
+        if temp <= self.t_min:
+            return values[0]
+        if temp >= self.t_max:
+            return values[-1]
+
+        x = (temp - self.t_min) / self.step
+        i = min(int(x), len(values) - 2)
+        e1 = values[i]
+        return e1 + (values[i + 1] - e1) * (x - i)
+
+    def _table_array(self, dtype=float):
+        # 第一次使用陣列版查詢時才建立 (float64 版與 values 共用記憶體的) NumPy 陣列
+        import numpy as np
+
+        dtype = np.dtype(dtype)
+        if not hasattr(self, "_array"):
+            self._array = {np.dtype(np.float64): np.frombuffer(self.values, dtype=np.float64)}
+        if dtype not in self._array:
+            self._array[dtype] = self._array[np.dtype(np.float64)].astype(dtype)
+        return self._array[dtype]
+
+    def lookup_array(self, temps, dtype=float):
+        """
+        陣列版的 lookup，temps 可為任意形狀，回傳相同形狀的 NumPy 陣列。
+        dtype: 計算與回傳的浮點型別 (預設 float64；np.float32 可減少一半的記憶體用量)
+        """
+        import numpy as np
+
+        table_e = self._table_array(dtype)
+
+        temps = np.asarray(temps, dtype=dtype)
+        x = np.clip((temps - self.t_min) / self.step, 0.0, len(table_e) - 1)
+        # NaN 溫度的索引取 0，結果仍會是 NaN
+        i = np.minimum(np.nan_to_num(x).astype(np.intp), len(table_e) - 2)
+        e = table_e[i] + (table_e[i + 1] - table_e[i]) * (x - i.astype(x.dtype))
+        e = np.where(temps <= self.t_min, table_e[0], e)
+        e = np.where(temps >= self.t_max, table_e[-1], e)
+        return e
+
+    def derivative(self, temp):
+        """
+        飽和水氣壓對溫度的導數 de/dT (hPa/°C)，落在斷點時取右側區段，超出表格範圍時為 0。
+        """
+        values = self.values
+        if temp < self.t_min or temp >= self.t_max:
+            return 0.0
+        i = min(int((temp - self.t_min) / self.step), len(values) - 2)
+        return (values[i + 1] - values[i]) / self.step
+
+    def derivative_array(self, temps):
+        """
+        陣列版的 derivative。
+        """
+        import numpy as np
+
+        table_e = self._table_array()
+        temps = np.asarray(temps, dtype=float)
+        x = np.clip((temps - self.t_min) / self.step, 0.0, len(table_e) - 1)
+        i = np.minimum(np.nan_to_num(x).astype(np.intp), len(table_e) - 2)
+        slope = (table_e[i + 1] - table_e[i]) / self.step
+        inside = (temps >= self.t_min) & (temps < self.t_max)
+        return np.where(inside, slope, 0.0)
+
+    def to_table(self):
+        """
+        轉回 list of (t, e) 形式的對照表。
+        """
+        return [(self.t_min + i * self.step, e) for i, e in enumerate(self.values)]
+
+
+# ---------------------------------------------
+# 產生與快取
+# ---------------------------------------------
+
+def default_cache_dir():
+    """
+    密集對照表的快取目錄，可用環境變數 PW_CACHE_DIR 覆寫。
+    """
+    return os.environ.get("PW_CACHE_DIR") or os.path.join(
+        os.path.expanduser("~"), ".cache", "precipitable_water"
+    )
+
+
+def build_dense_vapor_table(formula="magnus", t_min=-90.0, t_max=60.0, step=0.01):
+    """
+    以公式產生等間距對照表 (不使用快取)。
+    回傳: UniformVaporPressureLookup
+    """
+    func = VAPOR_FORMULAS[formula]
+    n = int(round((t_max - t_min) / step)) + 1
+    values = array("d", (func(t_min + i * step) for i in range(n)))
+    return UniformVaporPressureLookup(t_min, step, values)
+
+
+def _cache_path(cache_dir, formula, t_min, t_max, step):
+    name = f"svp_{formula}_{t_min:g}_{t_max:g}_{step:g}.f64"
+    return os.path.join(cache_dir, name)
+
+
+@lru_cache(maxsize=8)
+def get_dense_vapor_lookup(formula="magnus", t_min=-90.0, t_max=60.0, step=0.01, cache_dir=None, use_cache=True):
+    """
+    取得密集等間距對照表。
+    use_cache=True 時先嘗試從磁碟快取載入，找不到才以公式產生並寫入快取；
+    同一組參數在同一個行程中只會建立一次。
+
+    參數:
+        formula: "magnus" 或 "goff_gratch"
+        t_min, t_max, step: 表格的溫度範圍與間距 (°C)
+        cache_dir: 快取目錄，預設為 default_cache_dir()
+        use_cache: 是否使用磁碟快取
+    """
+    if formula not in VAPOR_FORMULAS:
+        raise ValueError(f"未知的公式：{formula}")
+    if not use_cache:
+        return build_dense_vapor_table(formula, t_min, t_max, step)
+
+    cache_dir = cache_dir or default_cache_dir()
+    path = _cache_path(cache_dir, formula, t_min, t_max, step)
+    n = int(round((t_max - t_min) / step)) + 1
+
+    # 1. 嘗試載入快取
+    try:
+        values = array("d")
+        with open(path, "rb") as f:
+            values.fromfile(f, n)
+        return UniformVaporPressureLookup(t_min, step, values)
+    except (OSError, EOFError):
+        pass
+
+    # 2. 產生表格並寫入快取 (先寫暫存檔再改名，避免其他行程讀到一半的檔案)
+    lookup = build_dense_vapor_table(formula, t_min, t_max, step)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            lookup.values.tofile(f)
+        os.replace(tmp_path, path)
+    except OSError:
+        # 快取目錄無法寫入時仍回傳記憶體中的表格
+        pass
+    return lookup
@@ -1,24 +1,181 @@
+from array import array
+
+
 class PWInput:
     """
     封裝『使用者輸入的原始資料』
     - data_points: List[ (p, c) ]，其中 p=壓力(hPa)，c=溫度(°C)
     - h1, h2: 欲計算可降水量的壓力上下邊界 (hPa)
     """
+    __slots__ = ("data_points", "h1", "h2")
+
     def __init__(self, data_points=None, h1=None, h2=None):
         self.data_points = data_points if data_points else []
         self.h1 = h1
         self.h2 = h2
 
+class LevelColumns:
+    """
+    以平行陣列 (array('d')) 儲存『每筆輸入資料的計算結果』
+    - p, c, e, H_s: 壓力(hPa)、溫度(°C)、水氣壓(hPa)、比濕度(g/kg)
+    需要時再以 to_tuples() 轉成 List[ (p, c, e, H_s) ]。
+    """
+    __slots__ = ("p", "c", "e", "H_s")
+
+    def __init__(self):
+        self.p = array("d")
+        self.c = array("d")
+        self.e = array("d")
+        self.H_s = array("d")
+
+    def __len__(self):
+        return len(self.p)
+
+    def append(self, p, c, e, hs):
+        self.p.append(p)
+        self.c.append(c)
+        self.e.append(e)
+        self.H_s.append(hs)
+
+    @classmethod
+    def from_rows(cls, rows):
+        columns = cls()
+        for row in rows:
+            columns.append(*row)
+        return columns
+
+    def to_tuples(self):
+        return list(zip(self.p, self.c, self.e, self.H_s))
+
+class SegmentColumns:
+    """
+    以平行陣列 (array('d')) 儲存『梯形積分的各分段資訊』
+    - p1, p2: 分段左右端點氣壓 (hPa)
+    - H_s1, H_s2: 分段左右端點比濕度 (g/kg)
+    - area: 分段積分值
+    平均比濕度與氣壓差可由上述欄位算出，需要時再以 to_dicts() 轉成 list of dict。
+    """
+    __slots__ = ("p1", "p2", "H_s1", "H_s2", "area")
+
+    def __init__(self):
+        self.p1 = array("d")
+        self.p2 = array("d")
+        self.H_s1 = array("d")
+        self.H_s2 = array("d")
+        self.area = array("d")
+
+    def __len__(self):
+        return len(self.p1)
+
+    def append(self, p1, p2, hs1, hs2, area):
+        self.p1.append(p1)
+        self.p2.append(p2)
+        self.H_s1.append(hs1)
+        self.H_s2.append(hs2)
+        self.area.append(area)
+
+    @classmethod
+    def from_dicts(cls, segments):
+        columns = cls()
+        for seg in segments:
+            columns.append(seg["p1"], seg["p2"], seg["H_s1"], seg["H_s2"], seg["area"])
+        return columns
+
+    def to_dicts(self):
+        return [
+            {
+                "p1": p1,
+                "p2": p2,
+                "H_s1": hs1,
+                "H_s2": hs2,
+                "mean_H_s": (hs1 + hs2) / 2.0,
+                "Δp": p1 - p2,
+                "area": area,
+            }
+            for p1, p2, hs1, hs2, area in zip(self.p1, self.p2, self.H_s1, self.H_s2, self.area)
+        ]
+
 class PWOutput:
     """
     封裝『計算後要輸出的結果』
-    - data_details: List[ (p, c, e, H_s) ]，每筆輸入對應的水氣壓/比濕度
-    - segment_details: 梯形積分的各分段詳細資訊 (供輸出用)
+    - levels: LevelColumns，每筆輸入對應的水氣壓/比濕度 (detail=False 時為 None)
+    - segments: SegmentColumns，梯形積分的各分段資訊 (detail=False 時為 None)
     - total_integral: 在 [h1, h2] 間積分後的總面積 (H_s × Δp)
     - W_p: 0.01 * total_integral -> 最終可降水量(mm)
+    - dW_dT: 每層溫度的敏感度 ∂W_p/∂T (mm/°C)，順序與輸入相同 (只在 gradient=True 時計算)
+
+    data_details (List[ (p, c, e, H_s) ]) 與 segment_details (list of dict)
+    只在讀取時才由 levels / segments 轉換產生。
     """
-    def __init__(self, data_details=None, segment_details=None, total_integral=0.0, W_p=0.0):
-        self.data_details = data_details if data_details else []
-        self.segment_details = segment_details if segment_details else []
+    __slots__ = ("levels", "segments", "total_integral", "W_p", "dW_dT")
+
+    def __init__(self, data_details=None, segment_details=None, total_integral=0.0, W_p=0.0,
+                 levels=None, segments=None, dW_dT=None):
+        self.levels = levels
+        self.segments = segments
+        self.dW_dT = dW_dT
+        if data_details:
+            self.data_details = data_details
+        if segment_details:
+            self.segment_details = segment_details
         self.total_integral = total_integral
-        self.W_p = W_p
\ No newline at end of file
+        self.W_p = W_p
+
+    @property
+    def data_details(self):
+        return self.levels.to_tuples() if self.levels is not None else []
+
+    @data_details.setter
+    def data_details(self, rows):
+        self.levels = LevelColumns.from_rows(rows)
+
+    @property
+    def segment_details(self):
+        return self.segments.to_dicts() if self.segments is not None else []
+
+    @segment_details.setter
+    def segment_details(self, segments):
+        self.segments = SegmentColumns.from_dicts(segments)
+
+class PWBatchOutput:
+    """
+    封裝『陣列化批次計算的結果』(由 向量化計算.compute_precipitable_water_batch 產生)
+    - e: 每層的水氣壓 (hPa)，形狀與輸入溫度相同
+    - H_s: 每層的比濕度 (g/kg)，形狀與輸入溫度相同
+    - total_integral: 每條剖面在 [h1, h2] 間的積分面積 (H_s × Δp)
+    - W_p: 0.01 * total_integral -> 每條剖面的可降水量(mm)
+    - W_p_error: W_p 的誤差估計 (mm)，只有要求誤差估計時才有值 (見 積分方法)
+    - dW_dT: 每層溫度的敏感度 ∂W_p/∂T (mm/°C)，形狀與輸入溫度相同 (只在 gradient=True 時計算)
+    - qc: PWQualityReport (只在 qc=True 時產生)；此時 e, H_s, dW_dT 的每一層
+      對應 qc.pressures / qc.temperatures 中整理過的層，而不是原始輸入的位置
+    """
+    __slots__ = ("e", "H_s", "total_integral", "W_p", "W_p_error", "dW_dT", "qc")
+
+    def __init__(self, e=None, H_s=None, total_integral=None, W_p=None, W_p_error=None, dW_dT=None,
+                 qc=None):
+        self.e = e
+        self.H_s = H_s
+        self.total_integral = total_integral
+        self.W_p = W_p
+        self.W_p_error = W_p_error
+        self.dW_dT = dW_dT
+        self.qc = qc
+
+
+class PWQualityReport:
+    """
+    封裝『品質控制的結果』(由 品質控制.clean_profiles 產生，形狀皆為 (m, n) 或 (m,))
+    - pressures, temperatures: 整理後的各層 (壓力遞減)，每條剖面的有效層排在前面，
+      其後以最後一個有效層補齊 (Δp = 0，不影響積分)
+    - levels: 每條剖面的有效層數，少於 2 層的剖面 W_p 為 NaN
+    - flags: 每個輸入層的品質旗標 (品質控制.QC_* 的位元組合)，位置與原始輸入相同
+    - counts: {旗標名稱: 每條剖面被標記的層數}
+    """
+    __slots__ = ("pressures", "temperatures", "levels", "flags", "counts")
+
+    def __init__(self, pressures=None, temperatures=None, levels=None, flags=None, counts=None):
+        self.pressures = pressures
+        self.temperatures = temperatures
+        self.levels = levels
+        self.flags = flags
+        self.counts = counts if counts is not None else {}
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+平行批次計算.py
+
+大量互相獨立的剖面 (例如多年、多測站的探空資料) 以多個行程平行計算：
+   - iter_precipitable_water_parallel: 依輸入順序逐一產生 PWOutput (generator)
+   - compute_precipitable_water_parallel: 同上，一次回傳整個 list
+
+輸入會先切成 chunk，每個 chunk 只以純 tuple 傳給子行程 (不逐筆傳送 PWInput 物件)，
+子行程算完整個 chunk 後一次傳回 (total_integral, W_p)，減少行程間傳遞的次數與資料量。
+"""
+import os
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+
+from 封裝過後的資料格式 import PWInput, PWOutput
+from 主要計算程式 import compute_precipitable_water
+from 效能統計 import ComputeStats
+
+# 每個 chunk 預設的剖面數
+DEFAULT_CHUNKSIZE = 256
+
+
+def _chunked(inputs, chunksize):
+    """
+    將 PWInput 序列切成 list of (data_points, h1, h2)，每份最多 chunksize 筆。
+    """
+    it = iter(inputs)
+    while True:
+        chunk = [(item.data_points, item.h1, item.h2) for item in islice(it, chunksize)]
+        if not chunk:
+            return
+        yield chunk
+
+
+def _run_chunk(chunk, instrument=False):
+    """
+    子行程執行的工作：計算一個 chunk，回傳 (list of (total_integral, W_p), ComputeStats 或 None)。
+    """
+    stats = ComputeStats() if instrument else None
+    results = []
+    for data_points, h1, h2 in chunk:
+        out = compute_precipitable_water(PWInput(data_points, h1, h2), detail=False, stats=stats)
+        results.append((out.total_integral, out.W_p))
+    return results, stats
+
+
+def _unpack(chunk_result, stats):
+    results, chunk_stats = chunk_result
+    if stats is not None:
+        stats.merge(chunk_stats)
+    for total_integral, W_p in results:
+        yield PWOutput(total_integral=total_integral, W_p=W_p)
+
+
+def iter_precipitable_water_parallel(inputs, workers=None, chunksize=DEFAULT_CHUNKSIZE, stats=None):
+    """
+    以行程池計算多條剖面的可降水量，依輸入順序逐一產生 PWOutput (不含明細)。
+    inputs 可以是任意的 PWInput 可迭代物件 (包含 generator)，會逐 chunk 讀取。
+
+    參數:
+        inputs: PWInput 的可迭代物件
+        workers: 子行程數，預設為 CPU 核心數；1 表示在目前行程中直接計算
+        chunksize: 每次送給子行程的剖面數
+        stats: 效能統計.ComputeStats，傳入時合併各子行程的統計
+    """
+    if chunksize < 1:
+        raise ValueError("chunksize 必須大於 0")
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunked(inputs, chunksize)
+    instrument = stats is not None
+
+    if workers == 1:
+        for chunk in chunks:
+            yield from _unpack(_run_chunk(chunk, instrument), stats)
+        return
+
+    with Pool(workers) as pool:
+        # 最多同時送出 2 * workers 個 chunk，依送出順序取回結果，
+        # 讓 generator 形式的輸入不會被一次全部讀進記憶體
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(_run_chunk, (chunk, instrument)))
+            if len(pending) >= 2 * workers:
+                yield from _unpack(pending.popleft().get(), stats)
+        while pending:
+            yield from _unpack(pending.popleft().get(), stats)
+
+
+def compute_precipitable_water_parallel(inputs, workers=None, chunksize=DEFAULT_CHUNKSIZE, stats=None):
+    """
+    iter_precipitable_water_parallel 的 list 版本，回傳與 inputs 同順序的 PWOutput 列表。
+    """
+    return list(iter_precipitable_water_parallel(inputs, workers, chunksize, stats))
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+後端選擇.py
+
+依輸入大小與 CPU 核心數，在三種實作之間自動選擇：
+   - "scalar":     主要計算程式.compute_precipitable_water (純 Python，短剖面最快，不需 NumPy)
+   - "vectorized": 向量化計算.compute_precipitable_water_batch (長剖面或大量剖面，需要 NumPy)
+   - "parallel":   平行批次計算.iter_precipitable_water_parallel (非常大量的剖面，使用行程池)
+
+門檻 (層數) 由內建的微基準測試 calibrate() 量測，依機器存成 JSON
+(預設為 ~/.cache/precipitable_water/backend-<主機>-<架構>.json，可用環境變數 PW_BACKEND_THRESHOLDS 指定)；
+尚未校正時使用 DEFAULT_THRESHOLDS。
+呼叫端也可以用 backend= 指定後端。選到 scalar 時完全不會載入 NumPy、multiprocessing，
+也不會建立行程池。
+只有本模組的函式會依大小分派；主要計算程式.compute_precipitable_water 本身不經過後端選擇
+(它必須產生明細，且不能依賴 NumPy)。vectorized 與 parallel 都不產生明細，
+因此 compute_precipitable_water_auto 預設 detail=False，detail=True 時一律使用 scalar。
+
+    result = compute_precipitable_water_auto(input_data)               # 單條剖面
+    results = compute_precipitable_water_many(inputs, workers=8)        # 多條剖面，依輸入順序回傳
+    for result in iter_precipitable_water_many(read_inputs(), stats=stats):   # 串流，記憶體只保留一批
+        ...
+    python 後端選擇.py --calibrate                                     # 校正並存檔
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import sys
+import time
+from itertools import chain, islice
+
+from 封裝過後的資料格式 import PWOutput
+from 主要計算程式 import compute_precipitable_water
+from 查表獲得最近的水氣壓 import TEMP_VAPOR_TABLE, get_vapor_lookup
+
+BACKENDS = ("auto", "scalar", "vectorized", "parallel")
+# 尚未校正時的門檻 (層數)；None 表示不使用該後端
+DEFAULT_THRESHOLDS = {
+    # 單條剖面的層數達到此值時改用 vectorized
+    "profile_levels": 256,
+    # 多條剖面的總層數達到此值時改用 vectorized
+    "batch_levels": 2048,
+    # 多條剖面的總層數達到此值 (且有多個核心) 時改用 parallel
+    "parallel_levels": 4_000_000,
+}
+THRESHOLDS_ENV = "PW_BACKEND_THRESHOLDS"
+# iter_precipitable_water_many 每批讀入的剖面數 (以第一批選擇後端)
+DEFAULT_BATCH_PROFILES = 65536
+
+_thresholds = None
+_have_numpy = None
+
+
+def thresholds_path():
+    """
+    此機器的門檻檔路徑。
+    """
+    path = os.environ.get(THRESHOLDS_ENV)
+    if path:
+        return os.path.expanduser(path)
+    name = f"backend-{platform.node() or 'local'}-{platform.machine() or 'unknown'}.json"
+    return os.path.join(os.path.expanduser("~"), ".cache", "precipitable_water", name)
+
+
+def load_thresholds(path=None, reload=False):
+    """
+    讀取門檻檔 (只讀一次)；檔案不存在或內容不完整時以 DEFAULT_THRESHOLDS 補齊。
+    """
+    global _thresholds
+    if _thresholds is not None and path is None and not reload:
+        return _thresholds
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    try:
+        with open(path or thresholds_path(), encoding="utf-8") as f:
+            saved = json.load(f).get("thresholds", {})
+        thresholds.update((name, saved[name]) for name in DEFAULT_THRESHOLDS if name in saved)
+    except (OSError, ValueError):
+        pass
+    if path is None:
+        _thresholds = thresholds
+    return thresholds
+
+
+def save_thresholds(thresholds, path=None):
+    """
+    將門檻 (與量測環境) 寫入門檻檔並立即生效，回傳檔案路徑。
+    """
+    global _thresholds
+    path = path or thresholds_path()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    record = {
+        "thresholds": {name: thresholds[name] for name in DEFAULT_THRESHOLDS},
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+    }
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(record, f, indent=2)
+    os.replace(tmp, path)
+    _thresholds = dict(record["thresholds"])
+    return path
+
+
+def numpy_available():
+    # 只檢查是否安裝，不實際 import
+    global _have_numpy
+    if _have_numpy is None:
+        _have_numpy = importlib.util.find_spec("numpy") is not None
+    return _have_numpy
+
+
+def choose_backend(levels, profiles=1, workers=None, backend="auto", thresholds=None):
+    """
+    依總層數與剖面數選擇後端。
+
+    參數:
+        levels: 所有剖面的總層數
+        profiles: 剖面數
+        workers: 可用的子行程數，預設為 CPU 核心數
+        backend: "auto" 或指定的後端
+        thresholds: 門檻，預設為 load_thresholds()
+
+    回傳:
+        "scalar"、"vectorized" 或 "parallel"
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的後端：{backend}，可用的後端為 {', '.join(BACKENDS)}")
+    if backend != "auto":
+        return backend
+    thresholds = thresholds or load_thresholds()
+    workers = workers or os.cpu_count() or 1
+
+    if profiles > 1:
+        limit = thresholds["parallel_levels"]
+        if workers > 1 and limit is not None and levels >= limit:
+            return "parallel"
+        limit = thresholds["batch_levels"]
+    else:
+        limit = thresholds["profile_levels"]
+    if limit is not None and levels >= limit and numpy_available():
+        return "vectorized"
+    return "scalar"
+
+
+def _vectorized_outputs(inputs, table, stats=None):
+    """
+    以 compute_precipitable_water_batch 計算，層數相同的剖面組成一個 (m, n) 陣列一起計算。
+    stats 只記錄剖面數、層數、超出對照表範圍的次數，時間整批記在 "batch" 階段 (不分 lookup / integrate)。
+    """
+    import numpy as np
+    from 向量化計算 import compute_precipitable_water_batch
+
+    lookup = get_vapor_lookup(table)
+    start = time.perf_counter()
+    groups = {}
+    for i, item in enumerate(inputs):
+        groups.setdefault(len(item.data_points), []).append(i)
+    outputs = [None] * len(inputs)
+    for n_levels, members in groups.items():
+        if n_levels < 2:
+            raise ValueError("至少需要 2 筆 (p, c) 資料才能進行積分")
+        points = np.array([inputs[i].data_points for i in members], dtype=float)
+        h1 = np.array([inputs[i].h1 for i in members], dtype=float)
+        h2 = np.array([inputs[i].h2 for i in members], dtype=float)
+        batch = compute_precipitable_water_batch(points[..., 0], points[..., 1], h1, h2, table)
+        for i, total_integral, W_p in zip(members, batch.total_integral.tolist(), batch.W_p.tolist()):
+            outputs[i] = PWOutput(total_integral=total_integral, W_p=W_p)
+        if stats is not None:
+            temps = points[..., 1]
+            stats.levels += temps.size
+            stats.clamps_below += int(np.count_nonzero(temps < lookup.t_min))
+            stats.clamps_above += int(np.count_nonzero(temps > lookup.t_max))
+    if stats is not None:
+        stats.add_time("batch", time.perf_counter() - start)
+        for _ in inputs:
+            stats.finish_call()
+    return outputs
+
+
+def compute_precipitable_water_auto(input_data, detail=False, table=TEMP_VAPOR_TABLE, backend="auto"):
+    """
+    單條剖面的 compute_precipitable_water，依層數選擇 scalar 或 vectorized。
+    預設不產生明細 (與 compute_precipitable_water 不同)；vectorized 不產生每層與每個分段的明細，
+    因此 detail=True 時 auto 一律使用 scalar。
+    """
+    if backend == "auto" and detail:
+        backend = "scalar"
+    backend = choose_backend(len(input_data.data_points), backend=backend)
+    if backend == "parallel":
+        raise ValueError("parallel 後端只用於多條剖面，請改用 compute_precipitable_water_many")
+    if backend == "vectorized":
+        if detail:
+            raise ValueError("vectorized 後端不提供明細，請使用 detail=False")
+        return _vectorized_outputs([input_data], table)[0]
+    return compute_precipitable_water(input_data, detail=detail, table=table)
+
+
+def _choose_many_backend(levels, profiles, backend, workers, table):
+    # 自訂對照表時 auto 不考慮 parallel (視為只有一個核心)
+    custom_table = table is not TEMP_VAPOR_TABLE
+    backend = choose_backend(levels, profiles, 1 if custom_table else workers, backend)
+    if backend == "parallel" and custom_table:
+        raise ValueError("parallel 後端只支援預設的水氣壓對照表")
+    return backend
+
+
+def _iter_backend(inputs, backend, workers, chunksize, table, stats):
+    if backend == "parallel":
+        from 平行批次計算 import DEFAULT_CHUNKSIZE, iter_precipitable_water_parallel
+
+        return iter_precipitable_water_parallel(inputs, workers, chunksize or DEFAULT_CHUNKSIZE, stats)
+    if backend == "vectorized":
+        return iter(_vectorized_outputs(inputs, table, stats))
+    return (compute_precipitable_water(item, detail=False, table=table, stats=stats) for item in inputs)
+
+
+def compute_precipitable_water_many(inputs, backend="auto", workers=None, chunksize=None,
+                                    table=TEMP_VAPOR_TABLE, stats=None):
+    """
+    計算多條剖面 (不含明細)，依輸入順序回傳 PWOutput 列表。
+    auto 依總層數選擇後端；parallel 的子行程使用預設的對照表，因此 table 不是預設值時不會自動選用。
+    stats: 效能統計.ComputeStats，傳入時記錄各後端的統計 (vectorized 的記錄方式見 _vectorized_outputs)
+    """
+    inputs = inputs if isinstance(inputs, list) else list(inputs)
+    if not inputs:
+        return []
+    levels = sum(len(item.data_points) for item in inputs)
+    backend = _choose_many_backend(levels, len(inputs), backend, workers, table)
+    return list(_iter_backend(inputs, backend, workers, chunksize, table, stats))
+
+
+def iter_precipitable_water_many(inputs, backend="auto", workers=None, chunksize=None,
+                                 table=TEMP_VAPOR_TABLE, stats=None, batch_profiles=DEFAULT_BATCH_PROFILES):
+    """
+    compute_precipitable_water_many 的串流版本 (generator)，依輸入順序產生 PWOutput。
+    每次只讀入 batch_profiles 條剖面，逐批選擇後端：
+      - 到目前為止讀入的總層數達到 parallel 門檻時，其餘的串流 (含這一批) 共用一個行程池
+      - 否則依這一批的層數選擇 scalar 或 vectorized
+    因此由大量短剖面組成的長串流也會在累積足夠層數後改用 parallel。
+    """
+    if batch_profiles < 1:
+        raise ValueError("batch_profiles 必須大於 0")
+    inputs = iter(inputs)
+    seen_levels = seen_profiles = 0
+    while True:
+        batch = list(islice(inputs, batch_profiles))
+        if not batch:
+            return
+        levels = sum(len(item.data_points) for item in batch)
+        seen_levels += levels
+        seen_profiles += len(batch)
+        if _choose_many_backend(seen_levels, seen_profiles, backend, workers, table) == "parallel":
+            yield from _iter_backend(chain(batch, inputs), "parallel", workers, chunksize, table, stats)
+            return
+        chosen = _choose_many_backend(levels, len(batch), backend, workers, table)
+        yield from _iter_backend(batch, chosen, workers, chunksize, table, stats)
+
+
+# ---------------------------------------------
+# 校正
+# ---------------------------------------------
+
+def _time_per_call(func, repeat=3, min_time=0.02):
+    """
+    每次呼叫的最短時間 (秒)；單次太快時重複多次再平均。
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def _crossover(sizes, make_inputs, fast, slow):
+    """
+    第一個 fast 比 slow 快的大小；都沒有時回傳 None。
+    """
+    for size in sizes:
+        inputs = make_inputs(size)
+        if _time_per_call(lambda: fast(inputs)) < _time_per_call(lambda: slow(inputs)):
+            return size
+    return None
+
+
+def calibrate(workers=None, save=True, path=None, verbose=False):
+    """
+    以微基準測試量測此機器上各後端的交叉點，回傳門檻 dict (save=True 時一併存檔)。
+      - profile_levels: 單條剖面 vectorized 比 scalar 快的最小層數
+      - batch_levels: 10 層剖面的批次，vectorized 比逐條 scalar 快的最小總層數
+      - parallel_levels: 行程池的啟動成本 / (vectorized 與 parallel 每層成本的差)
+    """
+    from 合成剖面 import synthetic_profiles
+
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    workers = workers or os.cpu_count() or 1
+
+    def scalar(inputs):
+        return [compute_precipitable_water(item, detail=False) for item in inputs]
+
+    def vectorized(inputs):
+        return _vectorized_outputs(inputs, TEMP_VAPOR_TABLE)
+
+    if numpy_available():
+        size = _crossover(
+            [2 ** k for k in range(2, 15)],
+            lambda n: list(synthetic_profiles(1, n)),
+            vectorized, scalar,
+        )
+        thresholds["profile_levels"] = size
+        count = _crossover(
+            [2 ** k for k in range(0, 13)],
+            lambda m: list(synthetic_profiles(m, 10)),
+            vectorized, scalar,
+        )
+        thresholds["batch_levels"] = None if count is None else 10 * count
+    else:
+        thresholds["profile_levels"] = thresholds["batch_levels"] = None
+
+    thresholds["parallel_levels"] = None
+    if workers > 1:
+        from 平行批次計算 import iter_precipitable_water_parallel
+
+        # 啟動與關閉行程池的固定成本 (只送出一條剖面)
+        one = list(synthetic_profiles(1, 10))
+        startup = _time_per_call(lambda: list(iter_precipitable_water_parallel(one, workers)), repeat=3, min_time=0)
+        inputs = list(synthetic_profiles(workers * 1024, 10))
+        n_levels = 10 * len(inputs)
+        per_level = max(
+            _time_per_call(lambda: list(iter_precipitable_water_parallel(inputs, workers)), repeat=2, min_time=0)
+            - startup, 0.0
+        ) / n_levels
+        serial = vectorized if numpy_available() else scalar
+        serial_per_level = _time_per_call(lambda: serial(inputs), repeat=2, min_time=0) / n_levels
+        if serial_per_level > per_level:
+            thresholds["parallel_levels"] = int(startup / (serial_per_level - per_level)) + 1
+
+    if verbose:
+        for name, value in thresholds.items():
+            print(f"{name}: {'不使用' if value is None else value}")
+    if save:
+        saved = save_thresholds(thresholds, path)
+        if verbose:
+            print(f"已寫入 {saved}")
+    return thresholds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="依輸入大小選擇計算後端的門檻校正")
+    parser.add_argument("--calibrate", action="store_true", help="執行微基準測試並存成此機器的門檻檔")
+    parser.add_argument("--workers", type=int, default=None, help="校正 parallel 時的子行程數 (預設為 CPU 核心數)")
+    parser.add_argument("--path", default=None, help="門檻檔路徑 (預設見 thresholds_path)")
+    args = parser.parse_args(argv)
+    if args.calibrate:
+        calibrate(args.workers, path=args.path, verbose=True)
+    else:
+        print(f"門檻檔：{args.path or thresholds_path()}")
+        json.dump(load_thresholds(args.path), sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
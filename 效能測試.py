@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+效能測試.py
+
+可重現的效能測試：以固定亂數種子產生合成剖面，分別量測
+   - lookup: 溫度 -> 飽和水氣壓 (查表內插)
+   - mixing: 水氣壓 -> 比濕度
+   - integrate: [h1, h2] 截斷梯形積分
+   - end_to_end: 從 (p, c) 到 W_p 的完整流程
+   - import: 在新的直譯器中 import 各進入點所需的時間 (以及是否載入了 NumPy)
+涵蓋兩組實作：主要計算程式 / 梯形積分 (scalar)、final_code/計算*.py 的不截斷分段積分 (legacy，
+只量測 integrate 與 end_to_end；其查表與比濕度已直接沿用主程式的實作)，
+以及有 NumPy 時的 向量化計算 (batch、grid，各有 float64 與 float32 兩種精度)。
+
+每個項目回報最佳時間、每秒處理的層數與 tracemalloc 量到的記憶體峰值，
+最後列出 float32 項目相對於 float64 的速度與記憶體比例。
+量測前先以含重複氣壓層、遞增順序等情況的剖面確認各實作的 W_p 一致 (check_parity)。
+結果可存成 JSON 基準檔，之後以 --compare 比較，變慢超過門檻的項目會標示出來。
+
+    python 效能測試.py                                # 預設規模
+    python 效能測試.py --levels 10 1000 100000 --profiles 1 1000
+    python 效能測試.py --save baseline.json
+    python 效能測試.py --compare baseline.json --threshold 1.2
+    python 效能測試.py --check                        # 只檢查各實作的結果是否一致
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from 封裝過後的資料格式 import PWInput
+from 比濕度 import calc_mixing_ratio
+from 查表獲得最近的水氣壓 import interpolate_vapor_pressure
+from 梯形積分 import integrate_Hs_over_p_columns
+import 主要計算程式
+from 合成剖面 import SEED, synthetic_profile, synthetic_profiles
+
+try:
+    import numpy as np
+    import 向量化計算
+except ImportError:  # 沒有 NumPy 時略過 batch 項目
+    np = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_LEVELS = [10, 1000, 100000]
+DEFAULT_PROFILES = [1, 1000]
+# 量測 import 時間的進入點
+IMPORT_TARGETS = ["pw_module", "主要計算程式", "main", "向量化計算"]
+# 每個項目最多處理的總層數，避免 (層數 × 剖面數) 過大的組合跑太久
+DEFAULT_MAX_POINTS = 2_000_000
+
+
+# ---------------------------------------------
+# 結果一致性
+# ---------------------------------------------
+
+def parity_profiles(n_profiles=200, seed=SEED):
+    """
+    結果一致性檢查用的剖面：層數不一、部分為遞增順序、部分含重複氣壓層 (溫度不同)，
+    積分區間隨機 (可能超出剖面範圍，h1 與 h2 的大小也不固定)。
+    """
+    rng = random.Random(seed)
+    duplicated = [(1000.0, 20.0), (850.0, 15.0), (850.0, 5.0), (500.0, 0.0)]
+    profiles = [PWInput(duplicated, 1000.0, 500.0), PWInput(duplicated, 900.0, 600.0)]
+    for _ in range(n_profiles):
+        points = synthetic_profile(rng.randint(2, 40), rng)
+        for _ in range(rng.choice([0, 0, 1, 3])):
+            k = rng.randrange(len(points))
+            p, c = points[k]
+            points.insert(k + rng.randint(0, 1), (p, c + rng.uniform(-10.0, 10.0)))
+        if rng.random() < 0.3:
+            points.reverse()
+        h1, h2 = rng.uniform(5.0, 1100.0), rng.uniform(5.0, 1100.0)
+        profiles.append(PWInput(points, h1, h2))
+    return profiles
+
+
+def check_parity(profiles, tolerance=1e-9):
+    """
+    各實作與 主要計算程式.compute_precipitable_water 的 W_p 比較 (相對誤差，分母至少 1 mm)，
+    有 NumPy 時另外比較批次計算與逐點計算的每層 ∂W_p/∂T，
+    回傳不一致的項目 list of (名稱, 剖面索引, 參考值, 結果)。
+    """
+    from 分層積分索引 import PWProfile
+
+    implementations = [("profile_index", lambda item: PWProfile.from_input(item).W_p(item.h1, item.h2))]
+    if np is not None:
+        def batch(item):
+            p, c = np.array(item.data_points).T
+            return float(向量化計算.compute_precipitable_water_batch(p, c, item.h1, item.h2).W_p)
+
+        def grid(item):
+            p, c = np.array(item.data_points).T
+            return float(向量化計算.compute_precipitable_water_grid(p, c[:, np.newaxis], item.h1, item.h2)[0])
+
+        def scheme(item):
+            # 積分方法.integrate_scheme 的梯形積分 (要求誤差估計時走這條路徑)
+            p, c = np.array(item.data_points).T
+            return float(向量化計算.compute_precipitable_water_batch(p, c, item.h1, item.h2, error=True).W_p)
+
+        from 時間序列計算 import StationSeries
+
+        # 同一個 StationSeries 跨剖面共用分段快取
+        series = StationSeries()
+        implementations += [
+            ("batch", batch), ("grid", grid), ("scheme", scheme),
+            ("series", lambda item: float(series.compute([item])[0])),
+        ]
+
+    mismatches = []
+    for i, item in enumerate(profiles):
+        reference = 主要計算程式.compute_precipitable_water(item, detail=False, gradient=np is not None)
+        expected = reference.W_p
+        for name, func in implementations:
+            got = func(item)
+            if abs(got - expected) > tolerance * max(abs(expected), 1.0):
+                mismatches.append((name, i, expected, got))
+
+        # 每層的 ∂W_p/∂T：列出差距最大的一層
+        if np is not None:
+            p, c = np.array(item.data_points).T
+            got = 向量化計算.compute_precipitable_water_batch(p, c, item.h1, item.h2, gradient=True).dW_dT
+            expected = np.array(reference.dW_dT)
+            k = int(np.argmax(np.abs(got - expected)))
+            if abs(got[k] - expected[k]) > tolerance * max(np.abs(expected).max(), 1.0):
+                mismatches.append((f"batch_dW_dT[{k}]", i, expected[k], got[k]))
+    return mismatches
+
+
+def run_parity():
+    profiles = parity_profiles()
+    mismatches = check_parity(profiles)
+    print(f"===== 結果一致性 ({len(profiles)} 條剖面，含重複氣壓層) =====")
+    for name, i, expected, got in mismatches[:20]:
+        print(f"  {name:20s} 剖面 {i:4d}  預期 {expected:.9f}  得到 {got:.9f}")
+    print(f"  {'全部一致' if not mismatches else f'{len(mismatches)} 項不一致'}")
+    return not mismatches
+
+
+# ---------------------------------------------
+# 量測
+# ---------------------------------------------
+
+def measure(func, repeat):
+    """
+    執行 func 共 repeat 次取最短時間，另外再跑一次以 tracemalloc 量記憶體峰值。
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def measure_import(module, repeat):
+    """
+    在新的直譯器中 import module，回傳 (最短秒數, 是否載入 NumPy, 新載入的模組數)。
+    """
+    code = (
+        "import sys, time\n"
+        "before = set(sys.modules)\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - start\n"
+        "print(elapsed, 'numpy' in sys.modules, len(set(sys.modules) - before))\n"
+    )
+    best = float("inf")
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", code], cwd=HERE, capture_output=True, text=True, check=True
+        ).stdout.split()
+        best = min(best, float(out[0]))
+    return best, out[1] == "True", int(out[2])
+
+
+def run_imports(repeat):
+    results = []
+    for module in IMPORT_TARGETS:
+        try:
+            seconds, numpy_loaded, modules = measure_import(module, repeat)
+        except subprocess.CalledProcessError:
+            print(f"  [略過] 無法 import {module}")
+            continue
+        results.append({
+            "name": f"import/{module}",
+            "levels": 0,
+            "profiles": 0,
+            "seconds": seconds,
+            "numpy_loaded": numpy_loaded,
+            "modules_loaded": modules,
+        })
+        print(f"  {'import/' + module:30s} {seconds * 1e3:10.3f} ms  載入 {modules} 個模組"
+              f"{'，含 NumPy' if numpy_loaded else ''}")
+    return results
+
+
+def load_legacy():
+    """
+    載入 final_code/ 的舊版模組，回傳 (calculate_vapor_pressure, calculate_specific_humidity,
+    calculate_precipitable_water)。只有量測時才把 final_code 加入 sys.path，
+    以免 import 本模組 (例如 --check) 就改變模組搜尋路徑。
+    """
+    legacy_dir = os.path.join(HERE, "final_code")
+    if legacy_dir not in sys.path:
+        sys.path.insert(0, legacy_dir)
+    from 計算蒸氣壓 import calculate_vapor_pressure
+    from 計算比濕度 import calculate_specific_humidity
+    from 計算可降水量 import calculate_precipitable_water
+    return calculate_vapor_pressure, calculate_specific_humidity, calculate_precipitable_water
+
+
+def build_cases(profiles):
+    """
+    針對同一組剖面建立所有量測項目，回傳 list of (名稱, 函式)。
+    """
+    temps = [c for item in profiles for _, c in item.data_points]
+    pressures = [p for item in profiles for p, _ in item.data_points]
+    vapor = [interpolate_vapor_pressure(c) for c in temps]
+    rows = [
+        [(p, calc_mixing_ratio(interpolate_vapor_pressure(c), p)) for p, c in item.data_points]
+        for item in profiles
+    ]
+    legacy_vapor_pressure, legacy_specific_humidity, legacy_precipitable_water = load_legacy()
+
+    def legacy_end_to_end():
+        for item in profiles:
+            p_list = [p for p, _ in item.data_points]
+            c_list = [c for _, c in item.data_points]
+            hs = legacy_specific_humidity(legacy_vapor_pressure(p_list, c_list), p_list)
+            dp = [abs(p_list[i] - p_list[i + 1]) for i in range(len(p_list) - 1)]
+            avg = [(hs[i] + hs[i + 1]) / 2 for i in range(len(hs) - 1)]
+            legacy_precipitable_water(dp, avg)
+
+    def legacy_integrate():
+        for row in rows:
+            dp = [abs(row[i][0] - row[i + 1][0]) for i in range(len(row) - 1)]
+            avg = [(row[i][1] + row[i + 1][1]) / 2 for i in range(len(row) - 1)]
+            legacy_precipitable_water(dp, avg)
+
+    cases = [
+        ("lookup/scalar", lambda: [interpolate_vapor_pressure(c) for c in temps]),
+        ("mixing/scalar", lambda: [calc_mixing_ratio(e, p) for e, p in zip(vapor, pressures)]),
+        ("integrate/scalar", lambda: [integrate_Hs_over_p_columns(row, 1000.0, 300.0, detail=False) for row in rows]),
+        ("integrate/legacy", legacy_integrate),
+        ("end_to_end/scalar", lambda: [主要計算程式.compute_precipitable_water(item) for item in profiles]),
+        ("end_to_end/scalar_no_detail",
+         lambda: [主要計算程式.compute_precipitable_water(item, detail=False) for item in profiles]),
+        ("end_to_end/legacy", legacy_end_to_end),
+        ("end_to_end/stream",
+         lambda: [主要計算程式.stream_precipitable_water(item.data_points, 1000.0, 300.0) for item in profiles]),
+    ]
+
+    if np is not None:
+        # 所有剖面層數相同，可直接組成 (m, n) 陣列
+        p_arr = np.array([[p for p, _ in item.data_points] for item in profiles])
+        c_arr = np.array([[c for _, c in item.data_points] for item in profiles])
+        e_arr = 向量化計算.interpolate_vapor_pressure_array(c_arr)
+        hs_arr = calc_mixing_ratio(e_arr, p_arr)
+        cases += [
+            ("lookup/batch", lambda: 向量化計算.interpolate_vapor_pressure_array(c_arr)),
+            ("mixing/batch", lambda: calc_mixing_ratio(e_arr, p_arr)),
+            ("integrate/batch", lambda: 向量化計算.integrate_Hs_over_p_array(p_arr, hs_arr, 1000.0, 300.0)),
+            ("end_to_end/batch",
+             lambda: 向量化計算.compute_precipitable_water_batch(p_arr, c_arr, 1000.0, 300.0)),
+        ]
+
+        # float32 儲存模式：輸入本身就是 float32 (例如 float32 的剖面庫或模式輸出)
+        p32 = p_arr.astype(np.float32)
+        c32 = c_arr.astype(np.float32)
+        # 模式網格：以第一條剖面的氣壓層為共用層，(層數, 剖面數) 的溫度
+        levels = p_arr[0]
+        grid = np.ascontiguousarray(c_arr.T)
+        grid32 = grid.astype(np.float32)
+        cases += [
+            ("end_to_end/batch_float32",
+             lambda: 向量化計算.compute_precipitable_water_batch(p32, c32, 1000.0, 300.0, precision="float32")),
+            ("grid/batch", lambda: 向量化計算.compute_precipitable_water_grid(levels, grid, 1000.0, 300.0)),
+            ("grid/batch_float32",
+             lambda: 向量化計算.compute_precipitable_water_grid(levels, grid32, 1000.0, 300.0, precision="float32")),
+        ]
+    return cases
+
+
+def run(levels, profiles, repeat, max_points, only=None):
+    """
+    執行所有 (層數, 剖面數) 組合，回傳結果 list of dict。
+    """
+    results = []
+    for n_levels in levels:
+        for n_profiles in profiles:
+            if n_levels * n_profiles > max_points:
+                print(f"  [略過] levels={n_levels} profiles={n_profiles} 超過 --max-points")
+                continue
+            data = list(synthetic_profiles(n_profiles, n_levels))
+            for name, func in build_cases(data):
+                if only and not any(name.startswith(prefix) for prefix in only):
+                    continue
+                seconds, peak = measure(func, repeat)
+                total = n_levels * n_profiles
+                record = {
+                    "name": name,
+                    "levels": n_levels,
+                    "profiles": n_profiles,
+                    "seconds": seconds,
+                    "levels_per_second": total / seconds if seconds > 0 else float("inf"),
+                    "profiles_per_second": n_profiles / seconds if seconds > 0 else float("inf"),
+                    "peak_bytes": peak,
+                }
+                results.append(record)
+                print(
+                    f"  {name:30s} levels={n_levels:>7d} profiles={n_profiles:>7d}"
+                    f"  {seconds * 1e3:10.3f} ms  {record['levels_per_second']:12.0f} levels/s"
+                    f"  peak {peak / 1024:10.1f} KiB"
+                )
+    return results
+
+
+def report_precision_gain(results):
+    """
+    列出每個 *_float32 項目相對於同名 float64 項目的速度與記憶體峰值比例。
+    """
+    base = {(r["name"], r["levels"], r["profiles"]): r for r in results}
+    lines = []
+    for r in results:
+        if not r["name"].endswith("_float32"):
+            continue
+        old = base.get((r["name"][:-len("_float32")], r["levels"], r["profiles"]))
+        if old is None or r["seconds"] <= 0 or r["peak_bytes"] <= 0:
+            continue
+        lines.append(
+            f"  {r['name']:30s} levels={r['levels']:>7d} profiles={r['profiles']:>7d}"
+            f"  速度 x{old['seconds'] / r['seconds']:5.2f}  記憶體峰值 x{r['peak_bytes'] / old['peak_bytes']:5.2f}"
+        )
+    if lines:
+        print("\n===== float32 相對於 float64 =====")
+        print("\n".join(lines))
+
+
+def compare(results, baseline, threshold):
+    """
+    與基準檔比較，回傳變慢超過 threshold 倍的項目數。
+    """
+    base = {(r["name"], r["levels"], r["profiles"]): r for r in baseline["results"]}
+    regressions = 0
+    print("\n===== 與基準比較 (新 / 舊 時間比) =====")
+    for r in results:
+        old = base.get((r["name"], r["levels"], r["profiles"]))
+        if old is None or old["seconds"] <= 0:
+            continue
+        ratio = r["seconds"] / old["seconds"]
+        flag = "  <-- 變慢" if ratio > threshold else ""
+        regressions += ratio > threshold
+        print(f"  {r['name']:30s} levels={r['levels']:>7d} profiles={r['profiles']:>7d}  x{ratio:6.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="可降水量計算的效能測試")
+    parser.add_argument("--levels", type=int, nargs="+", default=DEFAULT_LEVELS, help="每條剖面的層數")
+    parser.add_argument("--profiles", type=int, nargs="+", default=DEFAULT_PROFILES, help="剖面數")
+    parser.add_argument("--repeat", type=int, default=3, help="每個項目重複次數 (取最短時間)")
+    parser.add_argument("--max-points", type=int, default=DEFAULT_MAX_POINTS, help="單一組合最多的總層數")
+    parser.add_argument("--only", nargs="+", default=None, help="只跑名稱以這些字串開頭的項目，例如 lookup end_to_end/batch")
+    parser.add_argument("--save", default=None, help="將結果存成 JSON 基準檔")
+    parser.add_argument("--compare", default=None, help="與 JSON 基準檔比較")
+    parser.add_argument("--threshold", type=float, default=1.25, help="時間比超過此值視為變慢")
+    parser.add_argument("--check", action="store_true", help="只檢查各實作的結果是否一致，不量測時間")
+    args = parser.parse_args(argv)
+
+    print(f"Python {platform.python_version()} / {platform.machine()} / NumPy {np.__version__ if np else '無'}")
+    # 結果不一致時量測時間沒有意義
+    if not run_parity():
+        return 1
+    if args.check:
+        return 0
+    results = []
+    if not args.only or any(prefix.startswith("import") for prefix in args.only):
+        results += run_imports(args.repeat)
+    results += run(args.levels, args.profiles, args.repeat, args.max_points, args.only)
+    report_precision_gain(results)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "numpy": np.__version__ if np else None,
+                "seed": SEED,
+                "results": results,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n已儲存基準到 {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
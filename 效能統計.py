@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+效能統計.py
+
+compute_precipitable_water 與 integrate_Hs_over_p_columns 的選用統計。
+傳入 stats=ComputeStats() 時才會記錄，預設 stats=None 時不做任何計時或計數：
+   - 各階段累計時間：lookup (查表 + 比濕度)、integrate (截斷梯形積分)、package (封裝結果)
+   - 計數：呼叫次數、處理層數、分段數、被 h1/h2 截斷 (需內插) 的分段數、
+     溫度低於 / 高於對照表範圍而取邊界值的次數
+   - callback: 每次 compute_precipitable_water 結束後呼叫 callback(stats)
+
+    stats = ComputeStats()
+    for item in inputs:
+        compute_precipitable_water(item, stats=stats)
+    print(stats.report())
+"""
+STAGES = ("lookup", "integrate", "package")
+
+
+class ComputeStats:
+    """
+    累計的計時與計數。多個行程的結果可用 merge() 合併。
+    """
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.calls = 0
+        self.levels = 0
+        self.segments = 0
+        self.segments_clipped = 0
+        self.clamps_below = 0
+        self.clamps_above = 0
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+
+    def __getstate__(self):
+        # callback 通常無法 pickle，傳給其他行程時不帶過去
+        state = self.__dict__.copy()
+        state["callback"] = None
+        return state
+
+    def add_time(self, stage, seconds):
+        self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+
+    def count_clamps(self, temps, lookup):
+        """
+        計算 temps 中超出對照表範圍 (取邊界值) 的溫度個數。
+        """
+        for c in temps:
+            if c < lookup.t_min:
+                self.clamps_below += 1
+            elif c > lookup.t_max:
+                self.clamps_above += 1
+
+    def finish_call(self):
+        self.calls += 1
+        if self.callback is not None:
+            self.callback(self)
+
+    def merge(self, other):
+        """
+        將另一個 ComputeStats 的計時與計數加到自己身上。
+        """
+        self.calls += other.calls
+        self.levels += other.levels
+        self.segments += other.segments
+        self.segments_clipped += other.segments_clipped
+        self.clamps_below += other.clamps_below
+        self.clamps_above += other.clamps_above
+        for stage, seconds in other.stage_seconds.items():
+            self.add_time(stage, seconds)
+        return self
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "levels": self.levels,
+            "segments": self.segments,
+            "segments_clipped": self.segments_clipped,
+            "clamps_below": self.clamps_below,
+            "clamps_above": self.clamps_above,
+            "stage_seconds": dict(self.stage_seconds),
+        }
+
+    def report(self):
+        """
+        各階段時間與計數的文字報表。
+        """
+        total = sum(self.stage_seconds.values())
+        lines = ["===== 各階段統計 ====="]
+        for stage, seconds in self.stage_seconds.items():
+            share = seconds / total * 100.0 if total > 0 else 0.0
+            per_call = seconds / self.calls * 1e6 if self.calls else 0.0
+            lines.append(f"  {stage:10s} {seconds:12.6f} s  {share:5.1f} %  {per_call:10.2f} µs/次")
+        lines.append(f"  呼叫次數 {self.calls}，層數 {self.levels}，分段數 {self.segments}，"
+                     f"截斷分段 {self.segments_clipped}")
+        lines.append(f"  溫度低於對照表範圍 {self.clamps_below} 次，高於範圍 {self.clamps_above} 次")
+        return "\n".join(lines)
+
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+時間序列計算.py
+
+同一測站數十年的探空序列：相鄰的探空通常使用相同的標準氣壓層，
+因此每組「氣壓層 + 積分區間」的幾何資訊 (排序、Δp、h1/h2 的內插權重)
+只需計算一次，化為每層一個係數 (見 積分方法.level_weights)，之後的探空直接沿用。
+幾何資訊分兩層快取 (皆為 LRU)：
+   - 整組氣壓層：完全相同的層結構直接取用係數
+   - 單一分段：以分段的兩端壓力 (simpson 另含前後各一層) 與截斷後的區間為鍵，
+     只差幾個特性層的探空，只需計算新出現的分段
+
+   - StationSeries: 保留幾何快取的時間序列計算器，可分批送入同一測站的資料
+   - compute_precipitable_water_series: 一次計算整個序列的便利函式
+
+整個序列的溫度會串成一個陣列一次查表，層結構相同的探空再以一次矩陣乘法算出 W_p，
+結果為長度等於探空數的 NumPy 陣列，不產生逐筆的 PWOutput。
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+from 比濕度 import calc_mixing_ratio
+from 查表獲得最近的水氣壓 import TEMP_VAPOR_TABLE, get_vapor_lookup
+from 積分方法 import LINEAR_SCHEMES, check_scheme, level_weights
+
+# 幾何快取最多保留的層結構數與分段數
+DEFAULT_MAX_GEOMETRIES = 1024
+DEFAULT_MAX_SEGMENTS = 65536
+# 各積分方法中，一個分段的權重還會用到分段前後各幾層
+_STENCIL = {"trapezoid": 0, "log_trapezoid": 0, "simpson": 1}
+
+
+class StationSeries:
+    """
+    單一測站的時間序列計算器。
+    - table: 溫度與飽和水氣壓對照表，或已編譯好的查表物件
+    - max_geometries: 層結構快取的容量，超過時淘汰最久沒用到的層結構
+    - max_segments: 分段快取的容量，超過時淘汰最久沒用到的分段
+    - scheme: 可化為每層權重的積分方法 (積分方法.LINEAR_SCHEMES 之一)
+    - geometry_hits / geometry_misses: 沿用與新算的層結構次數
+    - segment_hits / segment_misses: 新的層結構中，沿用與新算的分段數
+    """
+    def __init__(self, table=TEMP_VAPOR_TABLE, max_geometries=DEFAULT_MAX_GEOMETRIES, scheme="trapezoid",
+                 max_segments=DEFAULT_MAX_SEGMENTS):
+        if scheme not in LINEAR_SCHEMES:
+            check_scheme(scheme)
+            raise ValueError(f"{scheme!r} 無法化為每層權重，請改用 compute_precipitable_water_batch")
+        self.lookup = get_vapor_lookup(table)
+        self.scheme = scheme
+        self.max_geometries = max_geometries
+        self.max_segments = max_segments
+        self.geometries = OrderedDict()
+        self.segments = OrderedDict()
+        self.geometry_hits = 0
+        self.geometry_misses = 0
+        self.segment_hits = 0
+        self.segment_misses = 0
+
+    def coefficients(self, pressures, h1, h2):
+        """
+        氣壓層 pressures (tuple) 與 [h1, h2] 對應的係數 coef，使 W_p = coef @ e。
+        """
+        key = (pressures, h1, h2)
+        coef = self.geometries.get(key)
+        if coef is not None:
+            self.geometry_hits += 1
+            self.geometries.move_to_end(key)
+            return coef
+
+        self.geometry_misses += 1
+        coef = self._assemble(pressures, h1, h2)
+        self.geometries[key] = coef
+        if len(self.geometries) > self.max_geometries:
+            self.geometries.popitem(last=False)
+        return coef
+
+    def _assemble(self, pressures, h1, h2):
+        """
+        由各分段的係數組合整組氣壓層的係數，只計算分段快取中沒有的分段。
+        """
+        p_upper = max(h1, h2)
+        p_lower = min(h1, h2)
+        # 由大到小的 stable 順序：重複壓力的相鄰關係與 梯形積分.sort_by_pressure_desc 相同
+        order = np.argsort(-np.array(pressures, dtype=float), kind="stable")
+        levels = [float(pressures[k]) for k in order]
+        n = len(levels)
+        pad = _STENCIL[self.scheme]
+
+        parts = []
+        missing = {}
+        for i in range(n - 1):
+            hi = min(levels[i], p_upper)
+            lo = max(levels[i + 1], p_lower)
+            if not hi > lo:
+                continue
+            start = max(i - pad, 0)
+            key = (tuple(levels[start:i + 2 + pad]), lo, hi)
+            parts.append((start, key))
+            if key in self.segments:
+                self.segment_hits += 1
+                self.segments.move_to_end(key)
+            elif key not in missing:
+                self.segment_misses += 1
+                missing[key] = None
+
+        # 新的分段依窗口長度分組，每組呼叫一次 level_weights；
+        # 窗口只含分段本身 (與前後層)，積分區間縮為此分段截斷後的 [lo, hi]
+        by_length = {}
+        for key in missing:
+            by_length.setdefault(len(key[0]), []).append(key)
+        for keys in by_length.values():
+            window = np.array([key[0] for key in keys])
+            lo = np.array([key[1] for key in keys])
+            hi = np.array([key[2] for key in keys])
+            # W_p = 0.01 * Σ weights_k * 622 * e_k / p_k
+            contrib = 0.01 * calc_mixing_ratio(level_weights(window, lo, hi, self.scheme), window)
+            for key, row in zip(keys, contrib):
+                self.segments[key] = row
+        while len(self.segments) > self.max_segments:
+            self.segments.popitem(last=False)
+
+        coef_sorted = np.zeros(n)
+        for start, key in parts:
+            row = self.segments.get(key)
+            if row is None:
+                # 分段快取容量小於一條剖面的分段數時，已被淘汰的分段直接重算
+                window = np.array(key[0])
+                row = 0.01 * calc_mixing_ratio(level_weights(window, key[1], key[2], self.scheme), window)
+            coef_sorted[start:start + len(row)] += row
+        coef = np.empty(n)
+        coef[order] = coef_sorted
+        return coef
+
+    def compute(self, profiles, h1=None, h2=None):
+        """
+        計算一段探空序列的可降水量。
+
+        參數:
+            profiles: PWInput 的序列 (依時間排列)
+            h1, h2: 積分區間 (hPa)；省略時使用各 PWInput 自己的 h1, h2
+
+        回傳:
+            W_p: 形狀 (len(profiles),) 的 NumPy 陣列 (mm)
+        """
+        profiles = list(profiles)
+        counts = [len(item.data_points) for item in profiles]
+        if any(n < 2 for n in counts):
+            raise ValueError("每條剖面至少需要 2 筆 (p, c) 資料才能進行積分")
+
+        # 1. 整個序列的溫度一次查表
+        temps = np.fromiter((c for item in profiles for _, c in item.data_points), float, sum(counts))
+        e = self.lookup.lookup_array(temps)
+
+        # 2. 依層結構分組：記錄每條剖面在 e 中的起點
+        groups = {}
+        start = 0
+        for i, (item, n) in enumerate(zip(profiles, counts)):
+            key = (
+                tuple(float(p) for p, _ in item.data_points),
+                item.h1 if h1 is None else h1,
+                item.h2 if h2 is None else h2,
+            )
+            groups.setdefault(key, []).append((i, start))
+            start += n
+
+        # 3. 同一組的剖面一起做加權總和
+        W_p = np.empty(len(profiles))
+        for key, members in groups.items():
+            coef = self.coefficients(*key)
+            index = np.array([i for i, _ in members])
+            starts = np.array([s for _, s in members])
+            rows = e[starts[:, np.newaxis] + np.arange(len(coef))]
+            W_p[index] = rows @ coef
+        return W_p
+
+
+def compute_precipitable_water_series(profiles, h1=None, h2=None, table=TEMP_VAPOR_TABLE, scheme="trapezoid"):
+    """
+    一次計算整個探空序列的可降水量，回傳 NumPy 陣列 (mm)。
+    需要分批處理或跨批沿用幾何資訊時請直接使用 StationSeries。
+    """
+    return StationSeries(table, scheme=scheme).compute(profiles, h1, h2)
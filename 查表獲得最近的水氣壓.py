@@ -1,3 +1,6 @@
+from bisect import bisect_right
+from functools import lru_cache
+
 # ---------------------------------------------
 # 模組1：溫度與飽和水氣壓對照表 (可自行增加更細緻數據)
 # ---------------------------------------------
@@ -21,25 +24,133 @@ TEMP_VAPOR_TABLE = [
 ]
 
 # ---------------------------------------------
-# 模組2：依照表計算飽和水氣壓
+# 模組2：將對照表編譯成查表物件 (排序好的斷點 + 預先算好的斜率)
+# ---------------------------------------------
+class VaporPressureLookup:
+    """
+    由溫度與飽和水氣壓對照表編譯而成的查表物件。
+    建立時將表格依溫度排序，並預先算好每一段的斜率 (e2 - e1) / (t2 - t1)，
+    查表時以二分搜尋找出所在區段，每次查詢的成本為 O(log n)。
+    - lookup(temp): 單一溫度查詢
+    - lookup_array(temps): 以 NumPy 陣列一次查詢多個溫度
+    - derivative(temp) / derivative_array(temps): de/dT，即所在區段的斜率
+    超出表格範圍的溫度回傳最接近的邊界值 (導數為 0)。
+    """
+    def __init__(self, table=TEMP_VAPOR_TABLE):
+        rows = sorted(table, key=lambda row: row[0])
+        if len(rows) < 2:
+            raise ValueError("對照表至少需要 2 筆資料")
+        self.temps = [float(t) for t, _ in rows]
+        self.values = [float(e) for _, e in rows]
+        self.slopes = [
+            (e2 - e1) / (t2 - t1)
+            for t1, t2, e1, e2 in zip(self.temps, self.temps[1:], self.values, self.values[1:])
+        ]
+        self.t_min = self.temps[0]
+        self.t_max = self.temps[-1]
+
+    def __len__(self):
+        return len(self.temps)
+
+    def __call__(self, temp):
+        return self.lookup(temp)
+
+    def lookup(self, temp):
+        """
+        根據溫度 temp (°C) 回傳飽和水氣壓 (hPa)。
+        """
+        # 邊界處理
+        if temp <= self.t_min:
+            return self.values[0]
+        if temp >= self.t_max:
+            return self.values[-1]
+
+        # 二分搜尋所在區段後線性內插
+        i = bisect_right(self.temps, temp) - 1
+        return self.values[i] + self.slopes[i] * (temp - self.temps[i])
+
+    def _table_arrays(self, dtype=float):
+        # 第一次使用陣列版查詢時才建立 NumPy 陣列 (每種 dtype 各一份)
+        import numpy as np
+
+        dtype = np.dtype(dtype)
+        if not hasattr(self, "_arrays"):
+            self._arrays = {}
+        if dtype not in self._arrays:
+            self._arrays[dtype] = (
+                np.array(self.temps, dtype=dtype),
+                np.array(self.values, dtype=dtype),
+                np.array(self.slopes, dtype=dtype),
+            )
+        return self._arrays[dtype]
+
+    def lookup_array(self, temps, dtype=float):
+        """
+        陣列版的 lookup，temps 可為任意形狀，回傳相同形狀的 NumPy 陣列。
+        dtype: 計算與回傳的浮點型別 (預設 float64；np.float32 可減少一半的記憶體用量)
+        """
+        import numpy as np
+
+        table_t, table_e, table_slope = self._table_arrays(dtype)
+
+        temps = np.asarray(temps, dtype=dtype)
+        i = np.clip(np.searchsorted(table_t, temps, side="right") - 1, 0, len(table_slope) - 1)
+        e = table_e[i] + table_slope[i] * (temps - table_t[i])
+        e = np.where(temps <= self.t_min, table_e[0], e)
+        e = np.where(temps >= self.t_max, table_e[-1], e)
+        return e
+
+    def derivative(self, temp):
+        """
+        飽和水氣壓對溫度的導數 de/dT (hPa/°C)：所在區段的斜率 (恰好落在斷點時取右側區段，即右導數)，
+        超出表格範圍時為 0。
+        """
+        if temp < self.t_min or temp >= self.t_max:
+            return 0.0
+        return self.slopes[bisect_right(self.temps, temp) - 1]
+
+    def derivative_array(self, temps):
+        """
+        陣列版的 derivative。
+        """
+        import numpy as np
+
+        table_t, _, table_slope = self._table_arrays()
+        temps = np.asarray(temps, dtype=float)
+        i = np.clip(np.searchsorted(table_t, temps, side="right") - 1, 0, len(table_slope) - 1)
+        inside = (temps >= self.t_min) & (temps < self.t_max)
+        return np.where(inside, table_slope[i], 0.0)
+
+
+@lru_cache(maxsize=32)
+def _compile_table(rows):
+    return VaporPressureLookup(rows)
+
+
+DEFAULT_VAPOR_LOOKUP = VaporPressureLookup(TEMP_VAPOR_TABLE)
+
+
+def get_vapor_lookup(table=TEMP_VAPOR_TABLE):
+    """
+    取得 table 對應的查表物件。
+    table 可為對照表 (list of (t, e)) 或已編譯好的查表物件；
+    同一份對照表只會編譯一次。
+    """
+    if hasattr(table, "lookup_array"):
+        return table
+    if table is TEMP_VAPOR_TABLE:
+        return DEFAULT_VAPOR_LOOKUP
+    return _compile_table(tuple((t, e) for t, e in table))
+
+
+# ---------------------------------------------
+# 模組3：依照表計算飽和水氣壓
 # ---------------------------------------------
 
 def interpolate_vapor_pressure(temp, table=TEMP_VAPOR_TABLE):
     """
     根據溫度 temp (°C)，利用線性內插法從對照表中取得飽和水氣壓 (hPa)。
     若 temp 超出表格範圍，則回傳最接近的邊界值。
+    table 可為對照表或由 get_vapor_lookup 編譯好的查表物件。
     """
-    # 邊界處理
-    if temp <= table[0][0]:
-        return table[0][1]
-    if temp >= table[-1][0]:
-        return table[-1][1]
-
-    # 線性內插
-    for i in range(len(table) - 1):
-        t1, e1 = table[i]
-        t2, e2 = table[i + 1]
-        if t1 <= temp <= t2:
-            return e1 + (e2 - e1) / (t2 - t1) * (temp - t1)
-    # 一般情況不會到這裡
-    return table[-1][1]
+    return get_vapor_lookup(table).lookup(temp)
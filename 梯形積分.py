@@ -1,8 +1,32 @@
 from 內插法 import interpolate_point
+from time import perf_counter
+
+from 封裝過後的資料格式 import SegmentColumns
+
+# 壓力視為相同的容許誤差 (hPa)
+P_EPS = 1e-9
+
+
+def sort_by_pressure_desc(data_points):
+    """
+    將 (p, ...) 資料依氣壓從大到小排列。
+    已經是遞減順序時直接回傳原序列；嚴格遞增時直接反轉；
+    其餘情況才進行排序，因此已排序的剖面只需 O(n) 的檢查。
+    """
+    if not isinstance(data_points, (list, tuple)):
+        data_points = list(data_points)
+    n = len(data_points)
+    if all(data_points[i][0] >= data_points[i + 1][0] for i in range(n - 1)):
+        return data_points
+    if all(data_points[i][0] < data_points[i + 1][0] for i in range(n - 1)):
+        return data_points[::-1]
+    return sorted(data_points, key=lambda x: x[0], reverse=True)
+
 
 def integrate_Hs_over_p(data_points, h1, h2):
     """
     利用梯形公式，對在 [h1, h2] 區間的 (p, H_s) 做數值積分。
+    只需走過一次資料，僅在 h1/h2 落在分段內部時才做內插。
     
     參數:
         data_points: 內部元素為 (p, H_s) 的列表，p 單位hPa, H_s 單位g/kg
@@ -12,83 +36,147 @@ def integrate_Hs_over_p(data_points, h1, h2):
         total_integral (float): ∫(H_s dP) 的積分結果
         segment_detail (list of dict): 每分段的詳細資訊
     """
+    total_integral, segments = integrate_Hs_over_p_columns(data_points, h1, h2)
+    return total_integral, segments.to_dicts()
+
+
+def integrate_Hs_over_p_columns(data_points, h1, h2, detail=True, stats=None):
+    """
+    與 integrate_Hs_over_p 相同，但分段資訊以 SegmentColumns (平行陣列) 回傳；
+    detail=False 時不記錄分段資訊，只回傳 (total_integral, None)。
+    stats: 效能統計.ComputeStats，傳入時記錄 integrate 階段的時間與分段計數
+    """
+    if stats is not None:
+        t_start = perf_counter()
+    clipped = 0
+
     # 確保積分上下限的順序，使 p_upper > p_lower
     p_upper = max(h1, h2)
     p_lower = min(h1, h2)
 
-    # 將資料點按氣壓(p)從大到小排序
-    data_sorted = sorted(data_points, key=lambda x: x[0], reverse=True)
+    # 將資料點按氣壓(p)從大到小排列 (已排序時不再排序)
+    data_sorted = sort_by_pressure_desc(data_points)
 
-    # 用於存儲在積分區間內的資料點
-    clipped = []
-    
-    # 處理每一對相鄰的資料點
+    total_integral = 0.0
+    segments = SegmentColumns() if detail else None
+
+    # 處理每一對相鄰的資料點 (p_a >= p_b)
     for i in range(len(data_sorted) - 1):
-        # 取得相鄰兩點的座標
         p_a, hs_a = data_sorted[i]      # 第一點的氣壓和比濕
         p_b, hs_b = data_sorted[i+1]    # 第二點的氣壓和比濕
 
-        # 找出這段線段的氣壓範圍
-        hi_local = max(p_a, p_b)  # 這段的最高氣壓
-        lo_local = min(p_a, p_b)  # 這段的最低氣壓
-
-        # 檢查此線段是否與積分區間有交集
-        if hi_local < p_lower or lo_local > p_upper:
-            # 無交集，跳過此段
+        # 此段已低於積分下限，之後的分段也都低於下限
+        if p_a < p_lower:
+            break
+        # 此段仍高於積分上限，跳過
+        if p_b > p_upper:
             continue
 
         # 計算交集區間的上下限
-        seg_upper = min(hi_local, p_upper)  # 取較小值作為區段上限
-        seg_lower = max(lo_local, p_lower)  # 取較大值作為區段下限
-
-        def get_Hs_at(p_target):
-            """
-            在給定氣壓值處求得比濕值
-            若目標氣壓與已知點重合，直接使用該點的比濕值
-            否則進行線性內插
-            """
-            if abs(p_target - p_a) < 1e-9:     # 使用小數值來比較浮點數
-                return hs_a
-            elif abs(p_target - p_b) < 1e-9:
-                return hs_b
-            else:
-                return interpolate_point(p_target, p_a, p_b, hs_a, hs_b)
-
-        # 計算交集區間端點的比濕值
-        hs_u = get_Hs_at(seg_upper)    # 上限點的比濕
-        hs_l = get_Hs_at(seg_lower)    # 下限點的比濕
+        p1 = min(p_a, p_upper)
+        p2 = max(p_b, p_lower)
+        dp = p1 - p2                    # 氣壓差
+        if dp < P_EPS:
+            # 只在端點相接或壓力重複，沒有面積
+            continue
 
-        # 將交集區間的端點加入列表
-        clipped.append((seg_upper, hs_u))
-        clipped.append((seg_lower, hs_l))
+        # 計算交集區間端點的比濕值：與已知點重合時直接使用，否則線性內插
+        if abs(p1 - p_a) < P_EPS:
+            hs1 = hs_a
+        elif abs(p1 - p_b) < P_EPS:
+            hs1 = hs_b
+        else:
+            hs1 = interpolate_point(p1, p_a, p_b, hs_a, hs_b)
+            clipped += 1
+        if abs(p2 - p_a) < P_EPS:
+            hs2 = hs_a
+        elif abs(p2 - p_b) < P_EPS:
+            hs2 = hs_b
+        else:
+            hs2 = interpolate_point(p2, p_a, p_b, hs_a, hs_b)
+            clipped += 1
 
-    # 去除重複的點
-    clipped = list(set(clipped))
-    # 將點按氣壓從大到小排序
-    clipped_sorted = sorted(clipped, key=lambda x: x[0], reverse=True)
+        mean_hs = (hs1 + hs2) / 2.0     # 平均比濕
+        area = mean_hs * dp             # 計算此區間的積分值
+        total_integral += area          # 累加到總積分
 
-    # 計算數值積分
-    total_integral = 0.0
-    segment_detail = []
-    # 對每一個子區間進行梯形法積分
-    for i in range(len(clipped_sorted) - 1):
-        # 取得區間端點值
-        p1, hs1 = clipped_sorted[i]         # 左端點
-        p2, hs2 = clipped_sorted[i+1]       # 右端點
-        dp = abs(p1 - p2)                   # 氣壓差
-        mean_hs = (hs1 + hs2) / 2.0         # 平均比濕
-        area = mean_hs * dp                 # 計算此區間的積分值
-        total_integral += area              # 累加到總積分
-        
         # 記錄此區間的詳細資訊
-        segment_detail.append({
-            "p1": p1,          # 左端點氣壓
-            "p2": p2,          # 右端點氣壓
-            "H_s1": hs1,       # 左端點比濕
-            "H_s2": hs2,       # 右端點比濕
-            "mean_H_s": mean_hs,  # 平均比濕
-            "Δp": dp,            # 氣壓差
-            "area": area        # 區間積分值
-        })
-
-    return total_integral, segment_detail
\ No newline at end of file
+        if detail:
+            segments.append(p1, p2, hs1, hs2, area)
+
+    if stats is not None:
+        stats.segments += max(len(data_sorted) - 1, 0)
+        stats.segments_clipped += clipped
+        stats.add_time("integrate", perf_counter() - t_start)
+    return total_integral, segments
+
+
+def clipped_segment_area(p_a, hs_a, p_b, hs_b, p_lower, p_upper):
+    """
+    單一分段 (p_a >= p_b) 落在 [p_lower, p_upper] 內的梯形面積，
+    計算方式與 integrate_Hs_over_p_columns 中的每一段完全相同；沒有交集時回傳 0.0。
+    """
+    if p_a < p_lower or p_b > p_upper:
+        return 0.0
+    p1 = min(p_a, p_upper)
+    p2 = max(p_b, p_lower)
+    dp = p1 - p2
+    if dp < P_EPS:
+        return 0.0
+
+    if abs(p1 - p_a) < P_EPS:
+        hs1 = hs_a
+    elif abs(p1 - p_b) < P_EPS:
+        hs1 = hs_b
+    else:
+        hs1 = interpolate_point(p1, p_a, p_b, hs_a, hs_b)
+    if abs(p2 - p_a) < P_EPS:
+        hs2 = hs_a
+    elif abs(p2 - p_b) < P_EPS:
+        hs2 = hs_b
+    else:
+        hs2 = interpolate_point(p2, p_a, p_b, hs_a, hs_b)
+    return (hs1 + hs2) / 2.0 * dp
+
+
+def trapezoid_level_weights(pressures, h1, h2):
+    """
+    integrate_Hs_over_p 的每層權重：對任意比濕度 H_s，
+    ∫(H_s dP) == Σ weights[k] * H_s[k] (只差捨入誤差)。
+    各分段的截斷與內插方式與 integrate_Hs_over_p_columns 完全相同。
+
+    參數:
+        pressures: 各層壓力 (hPa)，順序與輸入資料相同
+        h1, h2: 積分區間的上下界限 (hPa)
+
+    回傳:
+        weights (list): 與 pressures 相同順序的權重 (hPa)
+    """
+    p_upper = max(h1, h2)
+    p_lower = min(h1, h2)
+    # 以 (p, 原始位置) 排序，重複壓力的順序與 sort_by_pressure_desc 相同
+    order = sort_by_pressure_desc([(p, k) for k, p in enumerate(pressures)])
+    weights = [0.0] * len(order)
+
+    for (p_a, a), (p_b, b) in zip(order, order[1:]):
+        if p_a < p_lower:
+            break
+        if p_b > p_upper:
+            continue
+        p1 = min(p_a, p_upper)
+        p2 = max(p_b, p_lower)
+        dp = p1 - p2
+        if dp < P_EPS:
+            continue
+
+        # 交集端點 x 的比濕度 = hs_a * t + hs_b * (1 - t)
+        for x in (p1, p2):
+            if abs(x - p_a) < P_EPS:
+                t = 1.0
+            elif abs(x - p_b) < P_EPS:
+                t = 0.0
+            else:
+                t = 1.0 - (x - p_a) / (p_b - p_a)
+            weights[a] += t * dp / 2.0
+            weights[b] += (1.0 - t) * dp / 2.0
+    return weights
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+積分方法.py
+
+可依呼叫選擇的積分方法 (皆為陣列版，輸入形狀 (n,) 或 (m, n)，與 向量化計算 共用同一條路徑)：
+   - "trapezoid":     H_s 對 p 線性的梯形積分 (與 integrate_Hs_over_p 相同)
+   - "log_trapezoid": H_s 對 ln p 線性的梯形積分
+   - "simpson":       不等間距的二次 (Simpson) 內插：每段取左右兩組三點二次式的平均，
+                      資料不足三點的分段退回梯形
+   - "exact_e":       假設溫度在相鄰兩層間對 p 線性，依對照表把 e(T) 切成線性小段，
+                      逐段精確積分 622 * e / p (與溫度表的斷點完全一致)
+
+前三種都是 H_s 的線性組合，可化為每層一個權重 (level_weights)；
+誤差估計在每兩層之間插入中點 (溫度對 p 線性，與 exact_e 的假設相同)，以同一方法重算一次，
+再做 Richardson 外插：
+    error ≈ |I(原始層) - I(加密層)| * 2^REFINEMENT_ORDER / (2^REFINEMENT_ORDER - 1)
+溫度只是分段線性，H_s 在原始層上有折點，因此加密時各方法 (包含 simpson) 都只有二階收斂；
+exact_e 在此假設下是精確值，加密前後相同，誤差估計約為 0。
+"""
+import numpy as np
+
+from 比濕度 import calc_mixing_ratio
+from 查表獲得最近的水氣壓 import TEMP_VAPOR_TABLE, get_vapor_lookup
+
+SCHEMES = ("trapezoid", "log_trapezoid", "simpson", "exact_e")
+# 插入中點加密時的收斂階數 (誤差估計用)
+REFINEMENT_ORDER = 2
+# 可化為每層權重的方法
+LINEAR_SCHEMES = ("trapezoid", "log_trapezoid", "simpson")
+
+# 兩點 Gauss-Legendre 節點 (對三次以下的多項式精確)
+_GAUSS_OFFSET = 0.5 / np.sqrt(3.0)
+# exact_e 一次展開的小段數上限：超過時分批處理，記憶體用量不隨溫度跨度與剖面數增加
+EXACT_E_MAX_PIECES = 1 << 20
+
+
+def check_scheme(scheme):
+    if scheme not in SCHEMES:
+        raise ValueError(f"未知的積分方法：{scheme!r}，可用的方法為 {', '.join(SCHEMES)}")
+
+
+# ---------------------------------------------
+# 每層權重 (p 已由小到大排序，形狀 (..., n))
+# ---------------------------------------------
+
+def _clip_segments(p, p_lower, p_upper):
+    """
+    每段 [p_a, p_b] 與 [p_lower, p_upper] 的交集 [lo, hi] 及長度 dp (無交集時 dp = 0)。
+    """
+    p_a, p_b = p[..., :-1], p[..., 1:]
+    lo = np.maximum(p_a, p_lower)
+    hi = np.minimum(p_b, p_upper)
+    dp = np.where(hi > lo, hi - lo, 0.0)
+    hi = np.where(dp > 0, hi, lo)
+    return p_a, p_b, lo, hi, dp
+
+
+def _trapezoid_segment_weights(p_a, p_b, lo, hi, dp):
+    width = p_b - p_a
+    t_l = np.divide(lo - p_a, width, out=np.zeros_like(width), where=width != 0)
+    t_u = np.divide(hi - p_a, width, out=np.zeros_like(width), where=width != 0)
+    w_b = dp * (t_l + t_u) / 2.0
+    return dp - w_b, w_b
+
+
+def _trapezoid_weights_sorted(p, p_lower, p_upper):
+    p_a, p_b, lo, hi, dp = _clip_segments(p, p_lower, p_upper)
+    w_a, w_b = _trapezoid_segment_weights(p_a, p_b, lo, hi, dp)
+    weights = np.zeros(w_a.shape[:-1] + (p.shape[-1],))
+    weights[..., :-1] += w_a
+    weights[..., 1:] += w_b
+    return weights
+
+
+def _log_trapezoid_weights_sorted(p, p_lower, p_upper):
+    p_a, p_b, lo, hi, dp = _clip_segments(p, p_lower, p_upper)
+    # H_s = H_a + (H_b - H_a) * ln(x / p_a) / ln(p_b / p_a)
+    # ∫_lo^hi ln(x / p_a) dx = hi ln(hi / p_a) - lo ln(lo / p_a) - (hi - lo)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_width = np.log(p_b / p_a)
+        integral = hi * np.log(hi / p_a) - lo * np.log(lo / p_a) - dp
+        w_b = np.where((dp > 0) & (log_width != 0), integral / log_width, 0.0)
+    weights = np.zeros(w_b.shape[:-1] + (p.shape[-1],))
+    weights[..., :-1] += dp - w_b
+    weights[..., 1:] += w_b
+    return weights
+
+
+def _quadratic_basis_integral(x0, x1, x2, lo, hi):
+    """
+    ∫_lo^hi L_k(x) dx，L_k 為通過 x0, x1, x2 的 Lagrange 基底 (兩點 Gauss 積分，精確)。
+    三點有重複或不存在 (NaN) 時 valid 為 False。
+    """
+    half = (hi - lo) / 2.0
+    mid = (hi + lo) / 2.0
+    nodes = (mid - 2.0 * half * _GAUSS_OFFSET, mid + 2.0 * half * _GAUSS_OFFSET)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d0 = (x0 - x1) * (x0 - x2)
+        d1 = (x1 - x0) * (x1 - x2)
+        d2 = (x2 - x0) * (x2 - x1)
+        valid = np.isfinite(d0 + d1 + d2) & (d0 != 0) & (d1 != 0) & (d2 != 0)
+        c0 = sum((x - x1) * (x - x2) for x in nodes) * half / d0
+        c1 = sum((x - x0) * (x - x2) for x in nodes) * half / d1
+        c2 = sum((x - x0) * (x - x1) for x in nodes) * half / d2
+    return valid, c0, c1, c2
+
+
+def _simpson_weights_sorted(p, p_lower, p_upper):
+    n = p.shape[-1]
+    p_a, p_b, lo, hi, dp = _clip_segments(p, p_lower, p_upper)
+    lead = lo.shape[:-1]
+    p = np.broadcast_to(p, lead + (n,))
+
+    # 前後各補一個 NaN，p_pad[..., k + 1] = p[..., k]
+    pad = np.full(lead + (1,), np.nan)
+    p_pad = np.concatenate([pad, p, pad], axis=-1)
+    # 第 j 段：左二次式通過 (j-1, j, j+1)，右二次式通過 (j, j+1, j+2)
+    left = _quadratic_basis_integral(p_pad[..., 0:n - 1], p_pad[..., 1:n], p_pad[..., 2:n + 1], lo, hi)
+    right = _quadratic_basis_integral(p_pad[..., 1:n], p_pad[..., 2:n + 1], p_pad[..., 3:n + 2], lo, hi)
+    use_left = left[0] & (dp > 0)
+    use_right = right[0] & (dp > 0)
+    share = np.where(use_left & use_right, 0.5, 1.0)
+
+    w_pad = np.zeros(lead + (n + 2,))
+    for offset, (valid, *coefs) in ((0, (use_left,) + left[1:]), (1, (use_right,) + right[1:])):
+        for k, coef in enumerate(coefs):
+            w_pad[..., offset + k:offset + k + n - 1] += np.where(valid, share * coef, 0.0)
+
+    # 沒有可用二次式的分段 (例如只有兩層) 退回梯形
+    fallback = ~(use_left | use_right)
+    w_a, w_b = _trapezoid_segment_weights(p_a, p_b, lo, hi, dp)
+    w_pad[..., 1:n] += np.where(fallback, w_a, 0.0)
+    w_pad[..., 2:n + 1] += np.where(fallback, w_b, 0.0)
+    return w_pad[..., 1:n + 1]
+
+
+_WEIGHT_FUNCTIONS = {
+    "trapezoid": _trapezoid_weights_sorted,
+    "log_trapezoid": _log_trapezoid_weights_sorted,
+    "simpson": _simpson_weights_sorted,
+}
+
+
+def level_weights(pressures, h1, h2, scheme="trapezoid"):
+    """
+    線性積分方法的每層權重：∫(H_s dP) ≈ Σ weights * H_s。
+
+    參數:
+        pressures: 壓力 (hPa)，形狀 (n,) 或 (m, n)，不需事先排序
+        h1, h2: 積分區間的上下界限 (hPa)，可為純量或長度 m 的陣列
+        scheme: "trapezoid"、"log_trapezoid" 或 "simpson"
+
+    回傳:
+        weights: 形狀與 pressures 相同 (h1, h2 為陣列時為 (m, n))，順序與 pressures 相同
+    """
+    check_scheme(scheme)
+    if scheme not in LINEAR_SCHEMES:
+        raise ValueError(f"{scheme!r} 無法化為每層權重")
+    p = np.asarray(pressures, dtype=float)
+    p_upper = np.maximum(h1, h2)[..., np.newaxis]
+    p_lower = np.minimum(h1, h2)[..., np.newaxis]
+
+    # 由大到小 stable 排序後反轉：重複壓力的相鄰關係與 梯形積分.sort_by_pressure_desc 相同
+    order = np.argsort(-p, axis=-1, kind="stable")[..., ::-1]
+    p_sorted = np.take_along_axis(p, order, axis=-1)
+    weights_sorted = _WEIGHT_FUNCTIONS[scheme](p_sorted, p_lower, p_upper)
+
+    weights = np.empty_like(weights_sorted)
+    np.put_along_axis(weights, np.broadcast_to(order, weights.shape), weights_sorted, axis=-1)
+    return weights
+
+
+# ---------------------------------------------
+# 依對照表精確積分 (p, c 已由小到大排序，形狀 (..., n))
+# ---------------------------------------------
+
+def _table_knots(lookup):
+    """
+    查表物件的溫度斷點 (VaporPressureLookup 或 UniformVaporPressureLookup)。
+    """
+    if not hasattr(lookup, "_knots"):
+        if hasattr(lookup, "temps"):
+            lookup._knots = np.array(lookup.temps)
+        else:
+            lookup._knots = lookup.t_min + lookup.step * np.arange(len(lookup.values))
+    return lookup._knots
+
+
+def _exact_e_sorted(p, c, p_lower, p_upper, lookup):
+    p_a, p_b, lo, hi, dp = _clip_segments(p, p_lower, p_upper)
+    shape = dp.shape
+    c_a = np.broadcast_to(c[..., :-1], shape)
+    c_b = np.broadcast_to(c[..., 1:], shape)
+    p_a = np.broadcast_to(p_a, shape)
+    p_b = np.broadcast_to(p_b, shape)
+    overlap = dp > 0
+    area = np.zeros(shape)
+    if not overlap.any():
+        return area.sum(axis=-1)
+
+    # 只處理有交集的分段 (攤平成一維)
+    q1, q2 = lo[overlap], hi[overlap]
+    pa, ca = p_a[overlap], c_a[overlap]
+    slope = (c_b[overlap] - ca) / (p_b[overlap] - pa)
+    t1 = ca + slope * (q1 - pa)
+    t2 = ca + slope * (q2 - pa)
+
+    # 每段溫度範圍內部 (不含端點) 的對照表斷點數
+    knots = _table_knots(lookup)
+    start = np.searchsorted(knots, np.minimum(t1, t2), side="right")
+    stop = np.searchsorted(knots, np.maximum(t1, t2), side="left")
+    count = np.maximum(stop - start, 0)
+
+    # 依展開後的小段數分批，每批最多約 EXACT_E_MAX_PIECES 個斷點 (單一分段不再切開)
+    integrals = np.empty(len(count))
+    ends = np.cumsum(count + 2)
+    i = 0
+    while i < len(count):
+        limit = (ends[i - 1] if i else 0) + EXACT_E_MAX_PIECES
+        j = max(int(np.searchsorted(ends, limit, side="right")), i + 1)
+        integrals[i:j] = _exact_e_pieces(
+            q1[i:j], q2[i:j], t1[i:j], t2[i:j], start[i:j], stop[i:j], count[i:j], knots, lookup
+        )
+        i = j
+    area[overlap] = calc_mixing_ratio(integrals, 1.0)
+    return area.sum(axis=-1)
+
+
+def _exact_e_pieces(q1, q2, t1, t2, start, stop, count, knots, lookup):
+    """
+    各分段 [q1, q2] (溫度 t1 -> t2) 在對照表斷點切開後，∫ e / p dp 的總和。
+    """
+    ascending = t2 >= t1
+
+    # 每段的斷點依 t1 -> t2 的方向排列：t1, 內部斷點..., t2
+    size = count + 2
+    base = np.cumsum(size) - size
+    temps = np.empty(size.sum())
+    temps[base] = t1
+    temps[base + size - 1] = t2
+    seg = np.repeat(np.arange(len(count)), count)
+    k = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+    knot_index = np.where(ascending[seg], start[seg] + k, stop[seg] - 1 - k)
+    temps[base[seg] + 1 + k] = knots[knot_index]
+
+    # 斷點對應的壓力 (溫度對 p 線性)；端點直接使用 q1, q2
+    all_seg = np.repeat(np.arange(len(count)), size)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frac = (temps - t1[all_seg]) / (t2 - t1)[all_seg]
+    pressures = q1[all_seg] + np.nan_to_num(frac) * (q2 - q1)[all_seg]
+    pressures[base] = q1
+    pressures[base + size - 1] = q2
+    e = lookup.lookup_array(temps)
+
+    # 每小段 e 對 p 線性：∫ e / p dp = (e_A p_B - e_B p_A) / Δp * ln(p_B / p_A) + (e_B - e_A)
+    is_last = np.zeros(len(temps), dtype=bool)
+    is_last[base + size - 1] = True
+    first = np.flatnonzero(~is_last)
+    pA, pB = pressures[first], pressures[first + 1]
+    eA, eB = e[first], e[first + 1]
+    width = pB - pA
+    with np.errstate(divide="ignore", invalid="ignore"):
+        piece = np.where(width > 0, (eA * pB - eB * pA) / width * np.log(pB / pA) + (eB - eA), 0.0)
+
+    return np.bincount(all_seg[first], weights=piece, minlength=len(count))
+
+
+# ---------------------------------------------
+# 共用的批次積分
+# ---------------------------------------------
+
+def _integrate_sorted(p, c, hs, p_lower, p_upper, scheme, lookup):
+    if scheme == "exact_e":
+        return _exact_e_sorted(p, c, p_lower, p_upper, lookup)
+    return (_WEIGHT_FUNCTIONS[scheme](p, p_lower, p_upper) * hs).sum(axis=-1)
+
+
+def integrate_scheme(pressures, temperatures, h1, h2, scheme="trapezoid", table=TEMP_VAPOR_TABLE,
+                     error=False, hs=None):
+    """
+    以指定的積分方法計算 ∫(H_s dP)。
+
+    參數:
+        pressures: 壓力 (hPa)，形狀 (n,) 或 (m, n)；(n,) 時由所有剖面共用
+        temperatures: 溫度 (°C)，形狀 (n,) 或 (m, n)
+        h1, h2: 積分區間的上下界限 (hPa)，可為純量或長度 m 的陣列
+        scheme: SCHEMES 之一
+        table: 溫度與飽和水氣壓對照表，或已編譯好的查表物件
+        error: 是否一併回傳誤差估計
+        hs: 已算好的比濕度 (與 temperatures 同形狀)，省略時由溫度查表計算
+
+    回傳:
+        (total_integral, error_estimate)；error 為 False 時 error_estimate 為 None
+    """
+    check_scheme(scheme)
+    lookup = get_vapor_lookup(table)
+    c = np.asarray(temperatures, dtype=float)
+    p = np.broadcast_to(np.asarray(pressures, dtype=float), c.shape)
+    n = p.shape[-1]
+    if n < 2:
+        raise ValueError("至少需要 2 筆 (p, c) 資料才能進行積分")
+    if hs is None and scheme != "exact_e":
+        hs = calc_mixing_ratio(lookup.lookup_array(c), p)
+
+    p_upper = np.maximum(h1, h2)[..., np.newaxis]
+    p_lower = np.minimum(h1, h2)[..., np.newaxis]
+
+    # 依壓力由小到大排序 (重複壓力的相鄰關係與 梯形積分.sort_by_pressure_desc 相同)
+    order = np.argsort(-p, axis=-1, kind="stable")[..., ::-1]
+    p = np.take_along_axis(p, order, axis=-1)
+    c = np.take_along_axis(c, order, axis=-1)
+    if hs is not None:
+        hs = np.take_along_axis(np.asarray(hs, dtype=float), order, axis=-1)
+
+    total = _integrate_sorted(p, c, hs, p_lower, p_upper, scheme, lookup)
+    if not error:
+        return total, None
+
+    # 加密網格：每兩層之間插入中點，溫度與壓力皆取平均
+    p_fine = _interleave(p, (p[..., :-1] + p[..., 1:]) / 2.0)
+    c_fine = _interleave(c, (c[..., :-1] + c[..., 1:]) / 2.0)
+    hs_fine = None
+    if hs is not None:
+        p_mid = p_fine[..., 1::2]
+        hs_fine = _interleave(hs, calc_mixing_ratio(lookup.lookup_array(c_fine[..., 1::2]), p_mid))
+    total_fine = _integrate_sorted(p_fine, c_fine, hs_fine, p_lower, p_upper, scheme, lookup)
+    gain = 2 ** REFINEMENT_ORDER
+    estimate = np.abs(total - total_fine) * gain / (gain - 1)
+    return total, estimate
+
+
+def _interleave(levels, midpoints):
+    """
+    levels[..., 0], midpoints[..., 0], levels[..., 1], ... 交錯排列。
+    """
+    out = np.empty(levels.shape[:-1] + (2 * levels.shape[-1] - 1,))
+    out[..., ::2] = levels
+    out[..., 1::2] = midpoints
+    return out
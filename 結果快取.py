@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+結果快取.py
+
+同一條剖面經常被重複送進來計算 (重跑、時間視窗重疊、GUI 在資料未變時再按一次計算)。
+ResultCache 以「資料點 + h1, h2 + 水氣壓對照表」的雜湊值為鍵，記住先前的 PWOutput：
+   - 記憶體層：容量固定的 LRU，超過 maxsize 時淘汰最久沒用到的結果
+   - 磁碟層 (選用)：指定 cache_dir 時將結果以 pickle 存檔，重新啟動後仍可使用
+   - hits / disk_hits / misses 計數，可用 stats() 查看快取是否有效
+
+快取是選用的，compute_precipitable_water 本身不受影響：
+
+    cache = ResultCache(maxsize=4096, cache_dir="~/.cache/precipitable_water/results")
+    result = cache.compute(input_data)
+
+快取回傳的 PWOutput 會被之後的查詢共用，取得後請勿修改。
+"""
+import hashlib
+import os
+import pickle
+import threading
+from array import array
+from collections import OrderedDict
+
+from 主要計算程式 import compute_precipitable_water
+from 查表獲得最近的水氣壓 import TEMP_VAPOR_TABLE, get_vapor_lookup
+
+
+def table_fingerprint(table=TEMP_VAPOR_TABLE):
+    """
+    對照表 (或查表物件) 內容的雜湊值；同一個查表物件只計算一次。
+    """
+    lookup = get_vapor_lookup(table)
+    fingerprint = getattr(lookup, "_fingerprint", None)
+    if fingerprint is None:
+        h = hashlib.sha256(type(lookup).__name__.encode())
+        if hasattr(lookup, "temps"):
+            h.update(array("d", lookup.temps).tobytes())
+        else:
+            h.update(array("d", (lookup.t_min, lookup.step)).tobytes())
+        h.update(array("d", lookup.values).tobytes())
+        fingerprint = lookup._fingerprint = h.hexdigest()
+    return fingerprint
+
+
+def profile_key(input_data, table=TEMP_VAPOR_TABLE):
+    """
+    由 PWInput 的資料點、h1, h2 與對照表產生快取鍵 (sha256 十六進位字串)。
+    """
+    h = hashlib.sha256(table_fingerprint(table).encode())
+    h.update(array("d", (input_data.h1, input_data.h2)).tobytes())
+    h.update(array("d", (v for point in input_data.data_points for v in point)).tobytes())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    可降水量計算結果的快取。
+    - maxsize: 記憶體層最多保留的結果數
+    - cache_dir: 磁碟層目錄，None 表示不使用磁碟層
+    """
+    def __init__(self, maxsize=1024, cache_dir=None):
+        if maxsize < 1:
+            raise ValueError("maxsize 必須大於 0")
+        self.maxsize = maxsize
+        self.cache_dir = os.path.expanduser(cache_dir) if cache_dir else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """
+        回傳命中與未命中的統計。
+        """
+        total = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "hit_rate": (self.hits + self.disk_hits) / total if total else 0.0,
+        }
+
+    def clear(self):
+        """
+        清除記憶體層與統計 (磁碟層保留)。
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def compute(self, input_data, detail=True, table=TEMP_VAPOR_TABLE):
+        """
+        與 compute_precipitable_water 相同，但先查快取。
+        只存有 W_p 的結果 (detail=False 算出的) 不能滿足 detail=True 的查詢，會重新計算。
+        """
+        key = profile_key(input_data, table)
+
+        result = self._get(key)
+        if result is not None and (not detail or result.segments is not None):
+            self.hits += 1
+            return result
+
+        result = self._load(key)
+        if result is not None and (not detail or result.segments is not None):
+            self.disk_hits += 1
+            self._put(key, result)
+            return result
+
+        self.misses += 1
+        result = compute_precipitable_water(input_data, detail=detail, table=table)
+        self._put(key, result)
+        self._store(key, result)
+        return result
+
+    # ---------------------------------------------
+    # 記憶體層 (LRU)
+    # ---------------------------------------------
+
+    def _get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+            return result
+
+    def _put(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    # ---------------------------------------------
+    # 磁碟層
+    # ---------------------------------------------
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.pkl")
+
+    def _load(self, key):
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def _store(self, key, result):
+        if self.cache_dir is None:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先寫暫存檔再改名，避免其他行程讀到一半的檔案
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError:
+            # 快取目錄無法寫入時只使用記憶體層
+            pass
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+結果輸出.py
+
+大量剖面的結果輸出。結果先依欄位累積在 array('d') 中，每 chunk_rows 條剖面才整批寫出一次，
+不再為每一條剖面、每一層各格式化一行字串。
+
+輸出的三個表格：
+   - profiles: key, total_integral, W_p (每條剖面一列)
+   - levels (levels=True):     profile, p, c, e, H_s (每層一列，profile 為剖面的序號)
+   - segments (segments=True): profile, p1, p2, H_s1, H_s2, area (每個積分分段一列)
+
+格式 (open_result_sink 依副檔名判斷，也可用 format 指定)：
+   - "csv":      *.csv；levels / segments 另存為 <主檔名>_levels.csv、<主檔名>_segments.csv
+   - "columnar": 本模組的二進位欄位格式 (*.pwr)，三個表格寫在同一個檔案，以 read_columnar_results 讀回
+   - "parquet":  *.parquet，每批寫成一個 row group (需要 pyarrow)；levels / segments 另存檔案
+
+    with open_result_sink("out.csv", levels=True) as sink:
+        sink.write_all(iter_store_results("soundings.pws", workers=4))
+"""
+import json
+import os
+import struct
+from abc import ABC, abstractmethod
+from array import array
+
+DEFAULT_CHUNK_ROWS = 65536
+FORMATS = ("csv", "columnar", "parquet")
+EXTENSIONS = {".csv": "csv", ".parquet": "parquet", ".pwr": "columnar"}
+
+# 各表格的數值欄位 (profiles 另有 key 欄位)
+PROFILE_COLUMNS = ("total_integral", "W_p")
+LEVEL_COLUMNS = ("p", "c", "e", "H_s")
+SEGMENT_COLUMNS = ("p1", "p2", "H_s1", "H_s2", "area")
+
+# 二進位欄位格式：檔頭之後是一連串的 chunk，
+# 每個 chunk 為 uint64 的 JSON 長度 + JSON ({"table", "rows", "columns": [[名稱, 型態, bytes], ...]})
+# + 依序排列的欄位資料 (各欄對齊 8 bytes)；型態 "d" = float64、"q" = int64、"json" = UTF-8 JSON 列表
+MAGIC = b"PWRESLT1"
+VERSION = 1
+HEADER = struct.Struct("<8sI")
+CHUNK_HEADER = struct.Struct("<Q")
+
+
+def format_key(key):
+    """
+    剖面鍵值轉成字串：tuple 以逗號串接 (與 main.py 的輸出相同)。
+    """
+    return ",".join(map(str, key)) if isinstance(key, (tuple, list)) else str(key)
+
+
+class ResultSink(ABC):
+    """
+    依欄位緩衝結果、整批寫出的基底類別；子類別實作 _write_table 與 _close。
+    - levels, segments: 是否一併輸出每層 / 每個分段的明細 (需要以 detail=True 計算的 PWOutput)
+    - chunk_rows: 每個表格累積多少列才寫出一次 (各表格分別計算，長剖面的明細不會無限制累積)
+    - rows: 目前已接收的剖面數
+    """
+    def __init__(self, levels=False, segments=False, chunk_rows=DEFAULT_CHUNK_ROWS):
+        if chunk_rows < 1:
+            raise ValueError("chunk_rows 必須大於 0")
+        self.levels = levels
+        self.segments = segments
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self.closed = False
+        self._reset_profiles()
+        self._reset_levels()
+        self._reset_segments()
+
+    def _reset_profiles(self):
+        self.keys = []
+        self.profile_columns = {name: array("d") for name in PROFILE_COLUMNS}
+
+    def _reset_levels(self):
+        self.level_columns = {name: array("d") for name in LEVEL_COLUMNS} if self.levels else None
+        self.level_profile = array("q")
+
+    def _reset_segments(self):
+        self.segment_columns = {name: array("d") for name in SEGMENT_COLUMNS} if self.segments else None
+        self.segment_profile = array("q")
+
+    def _flush_profiles(self):
+        if self.keys:
+            self._write_table("profiles", {"key": self.keys, **self.profile_columns})
+        self._reset_profiles()
+
+    def _flush_levels(self):
+        if self.levels and self.level_profile:
+            self._write_table("levels", {"profile": self.level_profile, **self.level_columns})
+        self._reset_levels()
+
+    def _flush_segments(self):
+        if self.segments and self.segment_profile:
+            self._write_table("segments", {"profile": self.segment_profile, **self.segment_columns})
+        self._reset_segments()
+
+    def write(self, key, result):
+        """
+        加入一條剖面的結果 (PWOutput)；key 為 None 時以剖面序號代替。
+        """
+        index = self.rows
+        self.keys.append(format_key(index if key is None else key))
+        self.profile_columns["total_integral"].append(result.total_integral)
+        self.profile_columns["W_p"].append(result.W_p)
+
+        if self.levels and result.levels is not None:
+            levels = result.levels
+            for name in LEVEL_COLUMNS:
+                self.level_columns[name].extend(getattr(levels, name))
+            self.level_profile.extend([index] * len(levels.p))
+            if len(self.level_profile) >= self.chunk_rows:
+                self._flush_levels()
+        if self.segments and result.segments is not None:
+            segments = result.segments
+            for name in SEGMENT_COLUMNS:
+                self.segment_columns[name].extend(getattr(segments, name))
+            self.segment_profile.extend([index] * len(segments.p1))
+            if len(self.segment_profile) >= self.chunk_rows:
+                self._flush_segments()
+
+        self.rows += 1
+        if len(self.keys) >= self.chunk_rows:
+            self._flush_profiles()
+
+    def write_all(self, results):
+        """
+        寫入結果串流：元素可為 (key, PWOutput) 或單純的 PWOutput
+        (例如 iter_store_results 或 iter_precipitable_water_parallel 的輸出)。
+        回傳寫入的剖面數。
+        """
+        count = 0
+        for item in results:
+            if isinstance(item, tuple):
+                self.write(*item)
+            else:
+                self.write(None, item)
+            count += 1
+        return count
+
+    def write_batch(self, batch, keys=None):
+        """
+        寫入 向量化計算 的 PWBatchOutput (只有 profiles 表格)；keys 省略時以剖面序號代替。
+        """
+        W_p = array("d", _as_floats(batch.W_p))
+        total = array("d", _as_floats(batch.total_integral))
+        start = 0
+        while start < len(W_p):
+            stop = min(start + self.chunk_rows - len(self.keys), len(W_p))
+            if keys is None:
+                self.keys.extend(map(str, range(self.rows, self.rows + stop - start)))
+            else:
+                self.keys.extend(format_key(key) for key in keys[start:stop])
+            self.profile_columns["W_p"].extend(W_p[start:stop])
+            self.profile_columns["total_integral"].extend(total[start:stop])
+            self.rows += stop - start
+            start = stop
+            if len(self.keys) >= self.chunk_rows:
+                self._flush_profiles()
+
+    def flush(self):
+        """
+        將所有表格目前緩衝的結果寫出。
+        """
+        self._flush_profiles()
+        self._flush_levels()
+        self._flush_segments()
+
+    def close(self):
+        if not self.closed:
+            self.flush()
+            self._close()
+            self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @abstractmethod
+    def _write_table(self, table, columns):
+        """
+        寫出一個表格的一批資料；columns 為 {欄位名稱: array 或 list}，各欄長度相同。
+        """
+
+    @abstractmethod
+    def _close(self):
+        """
+        關閉輸出的檔案 (flush 之後呼叫)。
+        """
+
+
+def _as_floats(values):
+    # NumPy 陣列或純量 -> 可迭代的 float
+    if hasattr(values, "ravel"):
+        return values.ravel().tolist()
+    return values if isinstance(values, (list, tuple, array)) else [values]
+
+
+def _table_path(path, table):
+    # profiles 寫在 path，其他表格寫在 <主檔名>_<表格><副檔名>
+    if table == "profiles":
+        return path
+    stem, ext = os.path.splitext(path)
+    return f"{stem}_{table}{ext}"
+
+
+# ---------------------------------------------
+# CSV
+# ---------------------------------------------
+
+def _csv_field(text):
+    if any(ch in text for ch in ',"\n\r'):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+class CsvResultSink(ResultSink):
+    """
+    串流 CSV 輸出：每批以單一 writelines 寫出，數值以 repr 輸出 (可完整還原)。
+    """
+    def __init__(self, path, levels=False, segments=False, chunk_rows=DEFAULT_CHUNK_ROWS):
+        super().__init__(levels, segments, chunk_rows)
+        self.path = path
+        self.files = {}
+
+    def _file(self, table, names):
+        f = self.files.get(table)
+        if f is None:
+            f = open(_table_path(self.path, table), "w", encoding="utf-8", newline="")
+            f.write(",".join(names) + "\n")
+            self.files[table] = f
+        return f
+
+    def _write_table(self, table, columns):
+        names = list(columns)
+        f = self._file(table, names)
+        values = list(columns.values())
+        if table == "profiles":
+            values[0] = map(_csv_field, values[0])
+        line = ",".join(["{}"] + ["{!r}"] * (len(names) - 1)) + "\n"
+        f.writelines(map(line.format, *values))
+
+    def _close(self):
+        # 沒有任何結果時仍輸出只有欄位名稱的 profiles 檔
+        self._file("profiles", ("key",) + PROFILE_COLUMNS)
+        for f in self.files.values():
+            f.close()
+
+
+# ---------------------------------------------
+# 二進位欄位格式
+# ---------------------------------------------
+
+class ColumnarResultSink(ResultSink):
+    """
+    二進位欄位格式：每批每個表格寫成一個 chunk，數值欄位直接寫出 array 的內容。
+    """
+    def __init__(self, path, levels=False, segments=False, chunk_rows=DEFAULT_CHUNK_ROWS):
+        super().__init__(levels, segments, chunk_rows)
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION))
+
+    def _write_table(self, table, columns):
+        blobs = []
+        specs = []
+        for name, values in columns.items():
+            if isinstance(values, array):
+                kind, blob = values.typecode, values.tobytes()
+            else:
+                kind, blob = "json", json.dumps(values, ensure_ascii=False).encode("utf-8")
+            specs.append([name, kind, len(blob)])
+            blobs.append(blob + b"\0" * (-len(blob) % 8))
+        rows = len(next(iter(columns.values())))
+        header = json.dumps({"table": table, "rows": rows, "columns": specs}).encode("utf-8")
+        header += b" " * (-len(header) % 8)
+        self.file.write(CHUNK_HEADER.pack(len(header)))
+        self.file.write(header)
+        self.file.writelines(blobs)
+
+    def _close(self):
+        self.file.close()
+
+
+def iter_columnar_chunks(path):
+    """
+    逐一讀出二進位欄位格式的 chunk，產生 (表格名稱, {欄位名稱: array 或 list})。
+    """
+    with open(path, "rb") as f:
+        magic, version = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} 不是結果檔")
+        if version != VERSION:
+            raise ValueError(f"不支援的結果檔版本：{version}")
+        while True:
+            head = f.read(CHUNK_HEADER.size)
+            if not head:
+                return
+            (length,) = CHUNK_HEADER.unpack(head)
+            spec = json.loads(f.read(length))
+            columns = {}
+            for name, kind, size in spec["columns"]:
+                blob = f.read(size)
+                f.read(-size % 8)
+                if kind == "json":
+                    columns[name] = json.loads(blob)
+                else:
+                    values = array(kind)
+                    values.frombytes(blob)
+                    columns[name] = values
+            yield spec["table"], columns
+
+
+def read_columnar_results(path):
+    """
+    讀回整個二進位欄位格式的結果檔，回傳 {表格名稱: {欄位名稱: array 或 list}}。
+    """
+    tables = {}
+    for table, columns in iter_columnar_chunks(path):
+        merged = tables.setdefault(table, {})
+        for name, values in columns.items():
+            if name in merged:
+                merged[name].extend(values)
+            else:
+                merged[name] = values
+    return tables
+
+
+# ---------------------------------------------
+# Parquet (需要 pyarrow)
+# ---------------------------------------------
+
+class ParquetResultSink(ResultSink):
+    """
+    Parquet 輸出：每批每個表格寫成一個 row group。
+    """
+    def __init__(self, path, levels=False, segments=False, chunk_rows=DEFAULT_CHUNK_ROWS):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as exc:
+            raise ImportError("輸出 Parquet 需要安裝 pyarrow (pip install pyarrow)") from exc
+        super().__init__(levels, segments, chunk_rows)
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        self.writers = {}
+
+    def _write_table(self, table, columns):
+        pa = self.pa
+        arrays = []
+        for values in columns.values():
+            if isinstance(values, array):
+                kind = pa.float64() if values.typecode == "d" else pa.int64()
+                arrays.append(pa.array(memoryview(values), type=kind))
+            else:
+                arrays.append(pa.array(values, type=pa.string()))
+        batch = pa.Table.from_arrays(arrays, names=list(columns))
+        writer = self.writers.get(table)
+        if writer is None:
+            writer = self.pq.ParquetWriter(_table_path(self.path, table), batch.schema)
+            self.writers[table] = writer
+        writer.write_table(batch)
+
+    def _close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+
+_SINKS = {"csv": CsvResultSink, "columnar": ColumnarResultSink, "parquet": ParquetResultSink}
+
+
+def open_result_sink(path, format=None, levels=False, segments=False, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    建立結果輸出；format 省略時依副檔名判斷 (.csv / .parquet，其餘為二進位欄位格式)。
+    """
+    if format is None:
+        format = EXTENSIONS.get(os.path.splitext(path)[1].lower(), "columnar")
+    if format not in _SINKS:
+        raise ValueError(f"未知的輸出格式：{format}，可用的格式為 {', '.join(FORMATS)}")
+    return _SINKS[format](path, levels=levels, segments=segments, chunk_rows=chunk_rows)
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+計算服務.py
+
+常駐的本機 HTTP/JSON 計算服務，省去每次呼叫 python main.py 的直譯器啟動時間。
+前端以 asyncio 同時接受多個連線，計算交給預先啟動 (warm) 的行程池，
+只使用標準函式庫，預設只監聽 127.0.0.1，可完全離線使用。
+
+端點 (request / response 皆為 JSON)：
+   - POST /compute  {"data_points": [[p, c], ...], "h1": 1000, "h2": 500, "detail": false}
+                    -> {"W_p": ..., "total_integral": ..., (detail 時另有 data_details, segment_details)}
+   - POST /batch    {"profiles": [{"data_points": ..., "h1": ..., "h2": ...}, ...]}
+                    -> {"W_p": [...], "total_integral": [...]}
+   - POST /layers   {"data_points": ..., "bounds": [1000, 850, 700, 500]} 或 "layers": [[h1, h2], ...]
+                    -> {"W_p": [...]}  (以 分層積分索引.PWProfile 計算)
+   - GET  /stats    -> 各端點的請求數與延遲百分位數 (毫秒)
+   - GET  /health   -> {"status": "ok"}
+
+    python main.py serve --port 8765 --workers 4
+"""
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from 封裝過後的資料格式 import PWInput
+from 主要計算程式 import compute_precipitable_water
+from 分層積分索引 import PWProfile
+
+# 每個端點保留最近幾筆延遲紀錄來算百分位數
+LATENCY_WINDOW = 10000
+# request body 的上限 (bytes)
+MAX_BODY_SIZE = 64 * 1024 * 1024
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+# ---------------------------------------------
+# 在子行程中執行的工作 (需為模組層級函式才能 pickle)
+# ---------------------------------------------
+
+def _parse_profile(record):
+    data_points = [(float(p), float(c)) for p, c in record["data_points"]]
+    if len(data_points) < 2:
+        raise ValueError("至少需要 2 筆 (p, c) 資料才能進行積分")
+    return data_points
+
+
+def _compute_one(record):
+    input_data = PWInput(_parse_profile(record), float(record["h1"]), float(record["h2"]))
+    detail = bool(record.get("detail", False))
+    result = compute_precipitable_water(input_data, detail=detail)
+    response = {"W_p": result.W_p, "total_integral": result.total_integral}
+    if detail:
+        response["data_details"] = result.data_details
+        response["segment_details"] = result.segment_details
+    return response
+
+
+def _compute_batch(chunk):
+    results = []
+    for data_points, h1, h2 in chunk:
+        out = compute_precipitable_water(PWInput(data_points, h1, h2), detail=False)
+        results.append((out.total_integral, out.W_p))
+    return results
+
+
+def _compute_layers(record):
+    profile = PWProfile(_parse_profile(record))
+    if "bounds" in record:
+        return {"W_p": profile.layers([float(p) for p in record["bounds"]])}
+    return {"W_p": [profile.W_p(float(h1), float(h2)) for h1, h2 in record["layers"]]}
+
+
+def _warm_up():
+    # 讓子行程先載入模組與對照表
+    return os.getpid()
+
+
+def percentiles(samples, points=(50, 90, 99)):
+    """
+    以最近鄰法計算百分位數，samples 為秒，回傳毫秒。
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return {f"p{q}": None for q in points}
+    return {
+        f"p{q}": ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))] * 1e3
+        for q in points
+    }
+
+
+class ComputeService:
+    """
+    HTTP/JSON 計算服務。
+    - host, port: 監聽位址 (預設只接受本機連線)
+    - workers: 行程池大小，預設為 CPU 核心數
+    - chunksize: /batch 每個子工作的剖面數
+    """
+    def __init__(self, host="127.0.0.1", port=8765, workers=None, chunksize=256):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self.pool = None
+        self.server = None
+        self.latencies = {}
+        self.counts = {}
+
+    # ---------------------------------------------
+    # 啟動與關閉
+    # ---------------------------------------------
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.pool = ProcessPoolExecutor(self.workers)
+        await asyncio.gather(*(loop.run_in_executor(self.pool, _warm_up) for _ in range(self.workers)))
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"計算服務已啟動：http://{self.host}:{self.port} (workers={self.workers})", flush=True)
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.close()
+
+    # ---------------------------------------------
+    # 路由
+    # ---------------------------------------------
+
+    async def dispatch(self, method, path, body):
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/stats":
+            return 200, self.stats()
+
+        handlers = {
+            "/compute": self.handle_compute,
+            "/batch": self.handle_batch,
+            "/layers": self.handle_layers,
+        }
+        if path not in handlers:
+            return 404, {"error": f"未知的路徑：{path}"}
+        if method != "POST":
+            return 405, {"error": "請使用 POST"}
+        return 200, await handlers[path](json.loads(body or b"{}"))
+
+    async def handle_compute(self, record):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, _compute_one, record)
+
+    async def handle_layers(self, record):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, _compute_layers, record)
+
+    async def handle_batch(self, record):
+        chunk = [
+            (_parse_profile(item), float(item["h1"]), float(item["h2"]))
+            for item in record["profiles"]
+        ]
+        loop = asyncio.get_running_loop()
+        chunks = [chunk[i:i + self.chunksize] for i in range(0, len(chunk), self.chunksize)]
+        done = await asyncio.gather(*(loop.run_in_executor(self.pool, _compute_batch, c) for c in chunks))
+        pairs = [pair for results in done for pair in results]
+        return {
+            "W_p": [W_p for _, W_p in pairs],
+            "total_integral": [total for total, _ in pairs],
+        }
+
+    def record_latency(self, path, seconds):
+        self.counts[path] = self.counts.get(path, 0) + 1
+        self.latencies.setdefault(path, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def stats(self):
+        return {
+            path: {"requests": self.counts[path], **percentiles(samples)}
+            for path, samples in self.latencies.items()
+        }
+
+    # ---------------------------------------------
+    # HTTP/1.1 (只處理本服務需要的部分：Content-Length 與 keep-alive)
+    # ---------------------------------------------
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self.respond(writer, 400, {"error": "無法解析的請求"}, False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = (
+                    headers.get("connection", "").lower() != "close"
+                    and version.upper() == "HTTP/1.1"
+                )
+                try:
+                    length = int(headers.get("content-length") or 0)
+                    if length < 0:
+                        raise ValueError
+                except ValueError:
+                    # 長度不明時無法確定 body 結束的位置，回應後關閉連線
+                    await self.respond(writer, 400, {"error": "Content-Length 格式錯誤"}, False)
+                    break
+                if length > MAX_BODY_SIZE:
+                    await self.respond(writer, 413, {"error": "request 太大"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                path = target.split("?", 1)[0]
+                start = time.perf_counter()
+                try:
+                    status, payload = await self.dispatch(method.upper(), path, body)
+                except (ValueError, KeyError, TypeError) as exc:
+                    status, payload = 400, {"error": f"{type(exc).__name__}: {exc}"}
+                except Exception as exc:
+                    status, payload = 500, {"error": f"{type(exc).__name__}: {exc}"}
+                if path in ("/compute", "/batch", "/layers"):
+                    self.record_latency(path, time.perf_counter() - start)
+
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            # 等待連線真正關閉，避免關閉服務時仍有 transport 在背景關閉；用戶端已斷線時忽略錯誤
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def respond(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+def serve(host="127.0.0.1", port=8765, workers=None, chunksize=256):
+    """
+    啟動服務直到被中斷 (Ctrl+C)。
+    """
+    try:
+        asyncio.run(ComputeService(host, port, workers, chunksize).serve_forever())
+    except KeyboardInterrupt:
+        pass
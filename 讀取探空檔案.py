@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+讀取探空檔案.py
+
+逐行串流讀取探空資料檔 (CSV 或以空白分隔)，以 generator 逐條產生 PWInput，
+不論檔案多大，記憶體中都只保留目前這一條剖面。
+
+支援的格式：
+   - 每行 "p c" 或 "p,c"；以 # 開頭的行視為註解
+   - 多條剖面之間以空白行或只含 - / = 的分隔行隔開
+   - 每行多於兩欄時，最後兩欄為 p, c，前面各欄 (例如 測站, 時間) 視為剖面的鍵值，
+     鍵值改變時即開始新的剖面
+   - 每條剖面開頭可以有一行標題 (例如 station,time,p,c)，會自動略過
+"""
+from 封裝過後的資料格式 import PWInput
+
+# 只由這些字元組成的行視為剖面分隔行
+SEPARATOR_CHARS = set("-=")
+
+
+def _split_fields(line, delimiter):
+    if delimiter is None:
+        delimiter = "," if "," in line else None
+    return [field.strip() for field in line.split(delimiter)]
+
+
+def iter_sounding_records(source, h1=None, h2=None, delimiter=None):
+    """
+    逐條讀取探空資料，產生 (key, PWInput)。
+
+    參數:
+        source: 檔案路徑或已開啟的文字檔物件
+        h1, h2: 積分區間 (hPa)；省略時使用該剖面本身的最大與最小壓力
+        delimiter: 欄位分隔字元，預設自動判斷 (有逗號時用逗號，否則用空白)
+
+    回傳 (generator):
+        key: 有鍵值欄位時為鍵值 tuple，否則為剖面的序號 (從 0 開始)
+        PWInput: 該剖面的資料
+    """
+    if isinstance(source, (str, bytes)) or hasattr(source, "__fspath__"):
+        with open(source, encoding="utf-8") as f:
+            yield from iter_sounding_records(f, h1, h2, delimiter)
+        return
+
+    index = 0
+    key = None
+    data_points = []
+
+    def finish():
+        p_values = [p for p, _ in data_points]
+        return (
+            key if key is not None else index,
+            PWInput(
+                data_points=data_points,
+                h1=h1 if h1 is not None else max(p_values),
+                h2=h2 if h2 is not None else min(p_values),
+            ),
+        )
+
+    for lineno, line in enumerate(source, 1):
+        line = line.strip()
+        if line.startswith("#"):
+            continue
+
+        # 空白行或分隔行：結束目前的剖面
+        if not line or set(line) <= SEPARATOR_CHARS:
+            if data_points:
+                yield finish()
+                index += 1
+                key = None
+                data_points = []
+            continue
+
+        fields = _split_fields(line, delimiter)
+        if len(fields) < 2:
+            raise ValueError(f"第 {lineno} 行格式錯誤：{line!r}")
+        try:
+            p_val = float(fields[-2])
+            c_val = float(fields[-1])
+        except ValueError:
+            # 剖面開頭的標題行
+            if not data_points:
+                continue
+            raise ValueError(f"第 {lineno} 行格式錯誤：{line!r}") from None
+
+        row_key = tuple(fields[:-2]) or None
+        if data_points and row_key != key:
+            yield finish()
+            index += 1
+            data_points = []
+        key = row_key
+        data_points.append((p_val, c_val))
+
+    if data_points:
+        yield finish()
+
+
+def read_soundings(source, h1=None, h2=None, delimiter=None):
+    """
+    與 iter_sounding_records 相同，但只產生 PWInput。
+    """
+    for _, input_data in iter_sounding_records(source, h1, h2, delimiter):
+        yield input_data
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+逐層更新剖面.py
+
+探空氣球上升時資料是一層一層送進來的；每收到一層就重新呼叫
+compute_precipitable_water 等於每次都從頭計算整條剖面。
+IncrementalProfile 保留目前的剖面與 [h1, h2] 間的積分值，
+新增、移除或取代一層時，只重新計算該層的比濕度與相鄰的 (最多兩個) 梯形分段，
+以二分搜尋找出位置，並以差額更新累計的 total_integral 與 W_p。
+
+複雜度：定位 O(log n)、重新計算的比濕度與面積 O(1)；但各層存放在依壓力排序的 list 中，
+insert / remove 時 list.insert / del 需要搬移其後的元素，因此每次更新整體為 O(n)
+(只是 C 層級的指標搬移，數千層的探空仍遠快於從頭計算；replace 不搬移，為 O(log n))。
+
+每層以壓力識別 (同一條剖面中不可有重複壓力)；結果與從頭計算相同
+(累加順序不同，只差浮點數捨入誤差，可用 recompute() 重新從頭加總)。
+"""
+from bisect import bisect_left
+
+from 封裝過後的資料格式 import PWInput, PWOutput
+from 比濕度 import calc_mixing_ratio
+from 查表獲得最近的水氣壓 import TEMP_VAPOR_TABLE, get_vapor_lookup
+from 梯形積分 import clipped_segment_area, integrate_Hs_over_p_columns
+
+
+class IncrementalProfile:
+    """
+    可逐層更新的剖面。
+    - pressures, temperatures, e, H_s: 依壓力由小到大排列的各層資料
+    - h1, h2: 積分區間 (hPa)
+    - total_integral: 目前 [h1, h2] 間的 ∫(H_s dP)
+    """
+    def __init__(self, h1, h2, data_points=(), table=TEMP_VAPOR_TABLE):
+        self.lookup = get_vapor_lookup(table)
+        self.pressures = []
+        self.temperatures = []
+        self.e = []
+        self.H_s = []
+        self.total_integral = 0.0
+        self.set_bounds(h1, h2)
+        for p, c in data_points:
+            self.insert(p, c)
+
+    def __len__(self):
+        return len(self.pressures)
+
+    def __contains__(self, p):
+        i = bisect_left(self.pressures, p)
+        return i < len(self.pressures) and self.pressures[i] == p
+
+    @property
+    def W_p(self):
+        return 0.01 * self.total_integral
+
+    def _segment_area(self, i):
+        # 第 i 段為 pressures[i] 與 pressures[i + 1] 之間 (p_a >= p_b)
+        return clipped_segment_area(
+            self.pressures[i + 1], self.H_s[i + 1],
+            self.pressures[i], self.H_s[i],
+            self.p_lower, self.p_upper,
+        )
+
+    def _window_area(self, lo, hi):
+        # 第 lo ~ hi-1 段的面積總和 (超出範圍的分段略過)
+        lo = max(lo, 0)
+        hi = min(hi, len(self.pressures) - 1)
+        return sum(self._segment_area(i) for i in range(lo, hi))
+
+    def _index(self, p):
+        i = bisect_left(self.pressures, p)
+        if i == len(self.pressures) or self.pressures[i] != p:
+            raise KeyError(f"剖面中沒有壓力 {p} hPa 的資料")
+        return i
+
+    def insert(self, p, c):
+        """
+        新增一層 (p, c)；剖面中已有相同壓力時引發 ValueError。
+        list.insert 需搬移其後的元素，成本 O(n)。
+        """
+        i = bisect_left(self.pressures, p)
+        if i < len(self.pressures) and self.pressures[i] == p:
+            raise ValueError(f"剖面中已有壓力 {p} hPa 的資料")
+        # 新的一層會把原本的第 i-1 段拆成第 i-1、i 兩段
+        before = self._window_area(i - 1, i)
+        e = self.lookup.lookup(c)
+        self.pressures.insert(i, p)
+        self.temperatures.insert(i, c)
+        self.e.insert(i, e)
+        self.H_s.insert(i, calc_mixing_ratio(e, p))
+        self.total_integral += self._window_area(i - 1, i + 1) - before
+
+    def remove(self, p):
+        """
+        移除壓力為 p 的一層；找不到時引發 KeyError。
+        del 需搬移其後的元素，成本 O(n)。
+        """
+        i = self._index(p)
+        before = self._window_area(i - 1, i + 1)
+        del self.pressures[i]
+        del self.temperatures[i]
+        del self.e[i]
+        del self.H_s[i]
+        self.total_integral += self._window_area(i - 1, i) - before
+
+    def replace(self, p, c):
+        """
+        將壓力為 p 的一層溫度改為 c；找不到時引發 KeyError。
+        """
+        i = self._index(p)
+        before = self._window_area(i - 1, i + 1)
+        e = self.lookup.lookup(c)
+        self.temperatures[i] = c
+        self.e[i] = e
+        self.H_s[i] = calc_mixing_ratio(e, p)
+        self.total_integral += self._window_area(i - 1, i + 1) - before
+
+    def set(self, p, c):
+        """
+        壓力 p 已存在時取代，否則新增。
+        """
+        if p in self:
+            self.replace(p, c)
+        else:
+            self.insert(p, c)
+
+    def set_bounds(self, h1, h2):
+        """
+        改變積分區間；需要重新加總所有分段。
+        """
+        self.h1 = h1
+        self.h2 = h2
+        self.p_upper = max(h1, h2)
+        self.p_lower = min(h1, h2)
+        self.recompute()
+
+    def recompute(self):
+        """
+        從頭重新加總所有分段的面積，消除累積的捨入誤差。
+        """
+        self.total_integral = self._window_area(0, len(self.pressures) - 1)
+        return self.total_integral
+
+    def to_input(self):
+        """
+        目前的剖面轉成 PWInput (壓力由大到小)。
+        """
+        return PWInput(
+            data_points=list(zip(reversed(self.pressures), reversed(self.temperatures))),
+            h1=self.h1,
+            h2=self.h2,
+        )
+
+    def to_output(self):
+        """
+        以目前的剖面產生含明細的 PWOutput (需走過整條剖面，成本 O(n))。
+        """
+        rows = list(zip(reversed(self.pressures), reversed(self.H_s)))
+        total_integral, segments = integrate_Hs_over_p_columns(rows, self.h1, self.h2)
+        output = PWOutput(total_integral=total_integral, W_p=0.01 * total_integral, segments=segments)
+        output.data_details = list(zip(
+            reversed(self.pressures), reversed(self.temperatures), reversed(self.e), reversed(self.H_s)
+        ))
+        return output